@@ -1,51 +1,204 @@
-from flask import Flask, request, jsonify
+import json
+import os
+import tempfile
+import threading
+import time
+
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
-from enigma.enigma import Enigma
+from flask_sock import Sock
+from simple_websocket import ConnectionClosed
+from enigma import metrics
+from enigma.jobs import JobQueue, QueueLocked
+from enigma.service import EnigmaService, UNKNOWN_SESSION, encode_keys
+from enigma.sessions import DEFAULT_MAX_SESSIONS, DEFAULT_TTL, SessionRegistry
 
 app = Flask(__name__)
 CORS(app)
+sock = Sock(app)
 
-enigma_machine = None
+sessions = SessionRegistry(
+    max_sessions=int(os.environ.get("ENIGMA_MAX_SESSIONS", DEFAULT_MAX_SESSIONS)),
+    ttl=float(os.environ.get("ENIGMA_SESSION_TTL", DEFAULT_TTL)),
+)
+service = EnigmaService(sessions)
+jobs = None
+jobs_lock = threading.Lock()
 
+if os.environ.get("ENIGMA_METRICS", "1") != "0":
+    metrics.enable()
+metrics.register_gauge("enigma_sessions", "Live machine sessions.", lambda: len(sessions))
 
-@app.route('/init', methods=['POST'])
-def initialize_enigma():
-    global enigma_machine
+MAX_COALESCED_FRAMES = 256
+POLICY_VIOLATION = 1008
+PROFILE_HEADER = "X-Enigma-Profile"
+
+
+def handle(handler):
+    """
+    Runs ``handler`` on the JSON body of the request. While metrics are enabled, the parse, handler and serialize
+    phases are timed, and a request carrying the ``X-Enigma-Profile`` header is profiled, the report being returned
+    in the ``profile`` field of the response.
+    """
+    if not metrics.enabled:
+        payload, status = handler(request.json)
+        return jsonify(payload), status
+
+    start = time.perf_counter()
     data = request.json
-    rotor_names = data.get('rotors', ['I', 'II', 'III'])
-    reflector = data.get('reflector', 'B')
-    positions = data.get('positions', 'AAA')
-    plugboard_pairs = data.get('plugboard', [])
+    parsed = time.perf_counter()
+    metrics.observe("parse", parsed - start)
 
-    enigma_machine = Enigma(rotor_names, reflector)
-    enigma_machine.rotor_positions(positions)
+    if request.headers.get(PROFILE_HEADER):
+        (payload, status), report = metrics.profile(handler, data)
+        payload = {**payload, "profile": report}
+    else:
+        payload, status = handler(data)
 
-    for pair in plugboard_pairs:
-        enigma_machine.plugboard.add(pair)
+    handled = time.perf_counter()
+    response = jsonify(payload)
+    end = time.perf_counter()
+    metrics.observe("serialize", end - handled)
+    metrics.observe("request", end - start)
+    return response, status
 
-    return jsonify({"status": "initialized"})
+
+@app.route('/init', methods=['POST'])
+def initialize_enigma():
+    return handle(service.initialize)
 
 
 @app.route('/encode', methods=['POST'])
 def encode_character():
-    global enigma_machine
-    data = request.json
-    char = data['character'].upper()
+    return handle(service.encode)
+
+
+@sock.route('/keystrokes')
+def keystrokes(ws):
+    """
+    Keystroke channel bound to the session given by the ``session_id`` query parameter.
+
+    Every text frame holds one or more keystrokes. Frames that arrive while a batch is being encoded are coalesced
+    into the next batch, and each batch is answered with a single ``{input, output, rotorPositions}`` frame.
+    Non-letters are echoed unchanged without stepping the rotors. Unknown or expired sessions close the channel
+    with status 1008.
+    """
+    session_id = request.args.get('session_id')
+    try:
+        with sessions.use(session_id):
+            pass
+    except KeyError:
+        ws.close(reason=POLICY_VIOLATION, message=UNKNOWN_SESSION)
+        return
+
+    try:
+        while True:
+            keys = [ws.receive()]
+            while len(keys) < MAX_COALESCED_FRAMES:
+                frame = ws.receive(timeout=0)
+                if frame is None:
+                    break
+                keys.append(frame)
+            keys = "".join(key.decode() if isinstance(key, bytes) else key for key in keys)
+
+            try:
+                with sessions.use(session_id) as enigma_machine:
+                    frame = {"input": keys, "output": encode_keys(enigma_machine, keys),
+                             "rotorPositions": list(enigma_machine.position_letters)}
+            except KeyError:
+                ws.close(reason=POLICY_VIOLATION, message=UNKNOWN_SESSION)
+                return
+            ws.send(json.dumps(frame))
+    except ConnectionClosed:
+        pass
+
+
+@app.route('/sessions', methods=['GET'])
+def session_stats():
+    return jsonify(service.session_stats())
+
+
+def job_queue():
+    """
+    The background job queue, opened on the first job request so that importing this module, or the reloader's
+    parent process, neither starts a process pool nor resumes jobs.
+
+    The queue runs in a single process: it locks ``ENIGMA_JOBS_DIR``, and other processes serving this app (the
+    workers of a multi-process server) answer the job routes with 503.
+    """
+    global jobs
+    with jobs_lock:
+        if jobs is None:
+            jobs = JobQueue(
+                os.environ.get("ENIGMA_JOBS_DIR", os.path.join(tempfile.gettempdir(), "enigma-jobs")),
+                workers=int(os.environ.get("ENIGMA_JOB_WORKERS", 0)) or None,
+            )
+        return jobs
+
+
+@app.errorhandler(QueueLocked)
+def queue_locked(error):
+    return jsonify({"error": str(error)}), 503
+
+
+def client_id():
+    return request.headers.get("X-Client-Id") or request.remote_addr or "anonymous"
+
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    try:
+        return jsonify(job_queue().submit(request.json, client_id())), 202
+    except ValueError as error:
+        return jsonify({"error": str(error)}), 400
+
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    try:
+        return jsonify(job_queue().status(job_id))
+    except KeyError:
+        return jsonify({"error": "Unknown job"}), 404
+
+
+@app.route('/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    try:
+        return jsonify(job_queue().cancel(job_id))
+    except KeyError:
+        return jsonify({"error": "Unknown job"}), 404
+
+
+@app.route('/jobs/<job_id>/results', methods=['GET'])
+def job_results(job_id):
+    """
+    Results from ``cursor`` (see :meth:`JobQueue.results`). With ``stream=1``, new results are streamed as
+    newline-delimited JSON until the job finishes.
+    """
+    cursor = request.args.get('cursor', 0, type=int)
+    try:
+        queue = job_queue()
+        payload = queue.results(job_id, cursor)
+    except KeyError:
+        return jsonify({"error": "Unknown job"}), 404
+    if not request.args.get('stream'):
+        return jsonify(payload)
 
-    if not enigma_machine:
-        return jsonify({"error": "Enigma machine not initialized"}), 400
+    def events(payload):
+        while True:
+            yield json.dumps(payload) + "\n"
+            if payload["finished"]:
+                return
+            queue.wait(job_id, payload["version"])
+            payload = queue.results(job_id, payload["next"])
 
-    result = enigma_machine.encode_character(char)
+    return Response(stream_with_context(events(payload)), mimetype="application/x-ndjson")
 
-    # Get the current state of the machine
-    rotor_positions = [rotor.position_letter for rotor in enigma_machine.rotors]
 
-    return jsonify({
-        "input": char,
-        "output": result,
-        "rotorPositions": rotor_positions
-    })
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
 
 
 if __name__ == '__main__':
-    app.run(debug=True)
\ No newline at end of file
+    app.run(debug=True)
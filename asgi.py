@@ -0,0 +1,240 @@
+"""
+Async (ASGI) server mode for the Enigma API.
+
+Serves the machine routes of ``app.py`` (``/init``, ``/encode``, ``/sessions``, ``/metrics`` and the ``/keystrokes``
+WebSocket) on any ASGI server; the background ``/jobs`` routes are only served by ``app.py``. ``/encode`` requests
+are not handled one by one: they are queued and a single batcher task collects them into micro-batches of up to
+``max_batch_size`` requests, waiting at most ``max_batch_delay`` seconds after the first one. Each batch is encoded
+in a worker thread with :meth:`EnigmaService.encode_batch`, which fuses the requests of each session into one
+vectorized pass, and the results are fanned back out to the waiting callers.
+
+Keystrokes skip the batcher so they never wait for a batch: like in ``app.py``, the frames a client sent while its
+previous keystrokes were being encoded are coalesced and answered with a single frame.
+
+Run with ``python asgi.py`` (needs uvicorn) or ``uvicorn asgi:app``.
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from urllib.parse import parse_qs
+
+from enigma import metrics
+from enigma.service import EnigmaService, UNKNOWN_SESSION
+from enigma.sessions import DEFAULT_MAX_SESSIONS, DEFAULT_TTL, SessionRegistry
+
+DEFAULT_MAX_BATCH_SIZE = 256
+DEFAULT_MAX_BATCH_DELAY = 0.002
+MAX_COALESCED_FRAMES = 256
+POLICY_VIOLATION = 1008
+
+CORS_HEADERS = [
+    (b"access-control-allow-origin", b"*"),
+    (b"access-control-allow-headers", b"content-type"),
+    (b"access-control-allow-methods", b"GET, POST, OPTIONS"),
+]
+
+
+class MicroBatcher:
+    """
+    Collects ``/encode`` requests into batches and runs them through ``service.encode_batch``.
+
+    :ivar max_batch_size: Maximum number of requests per batch.
+    :type max_batch_size: int
+    :ivar max_batch_delay: Longest time in seconds a request waits for others to join its batch.
+    :type max_batch_delay: float
+    """
+    def __init__(self, service: EnigmaService, max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+                 max_batch_delay: float = DEFAULT_MAX_BATCH_DELAY):
+        self.service = service
+        self.max_batch_size = max_batch_size
+        self.max_batch_delay = max_batch_delay
+        self.queue = None
+        self.task = None
+        self.stats = {"batches": 0, "requests": 0, "largest_batch": 0}
+
+    async def submit(self, data):
+        """Queues one request and waits for its ``(payload, status)``."""
+        if self.task is None:
+            self.queue = asyncio.Queue()
+            self.task = asyncio.get_running_loop().create_task(self.run())
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((data, future))
+        return await future
+
+    async def collect(self):
+        batch = [await self.queue.get()]
+        deadline = asyncio.get_running_loop().time() + self.max_batch_delay
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - asyncio.get_running_loop().time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def run(self):
+        # One batch at a time: requests of a session must be encoded in arrival order, and whatever arrives while
+        # a batch is running simply makes the next batch bigger
+        while True:
+            batch = await self.collect()
+            try:
+                results = await asyncio.to_thread(self.service.encode_batch, [data for data, _ in batch])
+            except Exception as error:
+                results = [({"error": f"Internal error: {error}"}, 500)] * len(batch)
+            self.stats["batches"] += 1
+            self.stats["requests"] += len(batch)
+            self.stats["largest_batch"] = max(self.stats["largest_batch"], len(batch))
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+    async def close(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+
+class EnigmaASGI:
+    """
+    Minimal ASGI application exposing :class:`EnigmaService`.
+    """
+    def __init__(self, service: EnigmaService, max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+                 max_batch_delay: float = DEFAULT_MAX_BATCH_DELAY):
+        self.service = service
+        self.batcher = MicroBatcher(service, max_batch_size, max_batch_delay)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            await self.http(scope, receive, send)
+        elif scope["type"] == "websocket":
+            await self.websocket(scope, receive, send)
+        elif scope["type"] == "lifespan":
+            await self.lifespan(receive, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.batcher.close()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    @staticmethod
+    async def read_json(receive):
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+        return json.loads(body or b"{}")
+
+    @staticmethod
+    async def respond(send, payload, status=200, content_type=b"application/json"):
+        if isinstance(payload, str):
+            body = payload.encode()
+        else:
+            body = json.dumps(payload).encode() if payload is not None else b""
+        await send({"type": "http.response.start", "status": status,
+                    "headers": [(b"content-type", content_type),
+                                (b"content-length", str(len(body)).encode()), *CORS_HEADERS]})
+        await send({"type": "http.response.body", "body": body})
+
+    async def http(self, scope, receive, send):
+        route = (scope["method"], scope["path"])
+        if scope["method"] == "OPTIONS":
+            return await self.respond(send, None, 204)
+        if route == ("GET", "/sessions"):
+            return await self.respond(send, {**self.service.session_stats(), "batching": self.batcher.stats})
+        if route == ("GET", "/metrics"):
+            return await self.respond(send, metrics.render(), content_type=b"text/plain; version=0.0.4")
+        if route not in (("POST", "/init"), ("POST", "/encode")):
+            return await self.respond(send, {"error": "Not found"}, 404)
+
+        start = time.perf_counter()
+        try:
+            data = await self.read_json(receive)
+        except ValueError:
+            return await self.respond(send, {"error": "Invalid JSON"}, 400)
+        if route == ("POST", "/init"):
+            payload, status = await asyncio.to_thread(self.service.initialize, data)
+        else:
+            payload, status = await self.batcher.submit(data)
+        await self.respond(send, payload, status)
+        if metrics.enabled:
+            metrics.observe("request", time.perf_counter() - start)
+
+    async def websocket(self, scope, receive, send):
+        if scope["path"] != "/keystrokes":
+            return await send({"type": "websocket.close", "code": POLICY_VIOLATION})
+        session_id = parse_qs(scope["query_string"].decode()).get("session_id", [None])[0]
+
+        await receive()  # websocket.connect
+        await send({"type": "websocket.accept"})
+
+        # ASGI has no non-blocking receive, so a reader task queues the frames and each round drains the queue
+        frames = asyncio.Queue()
+
+        async def read():
+            while True:
+                message = await receive()
+                await frames.put(message)
+                if message["type"] == "websocket.disconnect":
+                    return
+
+        reader = asyncio.get_running_loop().create_task(read())
+        try:
+            while True:
+                messages = [await frames.get()]
+                while len(messages) < MAX_COALESCED_FRAMES and not frames.empty():
+                    messages.append(frames.get_nowait())
+                keys = "".join(message.get("text") or (message.get("bytes") or b"").decode()
+                               for message in messages if message["type"] == "websocket.receive")
+                if keys:
+                    request = {"session_id": session_id, "text": keys}
+                    (payload, status), = await asyncio.to_thread(self.service.encode_batch, [request])
+                    if status == 404:
+                        return await send({"type": "websocket.close", "code": POLICY_VIOLATION,
+                                           "reason": UNKNOWN_SESSION})
+                    await send({"type": "websocket.send", "text": json.dumps(payload)})
+                if messages[-1]["type"] == "websocket.disconnect":
+                    return
+        finally:
+            reader.cancel()
+
+
+def create_app(max_batch_size: int = None, max_batch_delay: float = None):
+    sessions = SessionRegistry(
+        max_sessions=int(os.environ.get("ENIGMA_MAX_SESSIONS", DEFAULT_MAX_SESSIONS)),
+        ttl=float(os.environ.get("ENIGMA_SESSION_TTL", DEFAULT_TTL)),
+    )
+    if max_batch_size is None:
+        max_batch_size = int(os.environ.get("ENIGMA_MAX_BATCH_SIZE", DEFAULT_MAX_BATCH_SIZE))
+    if max_batch_delay is None:
+        max_batch_delay = float(os.environ.get("ENIGMA_MAX_BATCH_DELAY", DEFAULT_MAX_BATCH_DELAY))
+    if os.environ.get("ENIGMA_METRICS", "1") != "0":
+        metrics.enable()
+    metrics.register_gauge("enigma_sessions", "Live machine sessions.", lambda: len(sessions))
+    return EnigmaASGI(EnigmaService(sessions), max_batch_size, max_batch_delay)
+
+
+app = create_app()
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Serve the Enigma API on an ASGI server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--max-batch-size", type=int, default=DEFAULT_MAX_BATCH_SIZE)
+    parser.add_argument("--max-batch-delay", type=float, default=DEFAULT_MAX_BATCH_DELAY,
+                        help="seconds a request waits for others to join its batch")
+    args = parser.parse_args()
+    uvicorn.run(create_app(args.max_batch_size, args.max_batch_delay), host=args.host, port=args.port)
@@ -0,0 +1,207 @@
+"""
+Performance benchmarks for the engine, the bulk paths and the HTTP endpoints.
+
+Each benchmark reports the best (minimum) time per operation over several repeats, which is the most repeatable
+figure on a shared machine. Results are written as JSON and can be compared against a previous run; any benchmark
+slower than the baseline by more than the tolerance fails the run with exit status 1.
+
+Usage::
+
+    python -m benchmarks.bench --output baseline.json
+    python -m benchmarks.bench --baseline baseline.json --tolerance 0.2
+    python -m benchmarks.bench --quick -k plugboard
+"""
+import argparse
+import json
+import platform
+import random
+import string
+import sys
+import threading
+import time
+import timeit
+from functools import lru_cache
+
+import numpy as np
+
+from enigma import cache, metrics, vectorized
+from enigma.enigma import Enigma
+
+REPEAT = 5
+MIN_TIME = 0.2
+
+CONFIGURATIONS = {
+    "3-rotor": dict(rotor_sequence=["I", "II", "III"], reflector="B", ring_setting=[1, 1, 1],
+                    initial_positions="AAZ"),
+    "4-rotor-beta": dict(rotor_sequence=["IV", "V", "Beta", "I"], reflector="A", ring_setting=[18, 24, 3, 5],
+                         initial_positions="EZGP"),
+    "4-rotor-gamma": dict(rotor_sequence=["Gamma", "II", "IV", "I"], reflector="C", ring_setting=[3, 1, 26, 7],
+                          initial_positions="MQDP"),
+}
+PLUG_LEADS = ["AB", "CD", "EF", "GH", "IJ", "KL", "MN", "OP", "QR", "ST", "UV", "WX", "YZ"]
+
+
+def measure(function, operations=1):
+    """
+    Best time per operation of ``function``, which performs ``operations`` operations per call.
+    """
+    timer = timeit.Timer(function)
+    number, _ = timer.autorange()
+    number = max(1, int(number * MIN_TIME / 0.2))
+    best = min(timer.repeat(repeat=REPEAT, number=number)) / number
+    return {"seconds_per_op": best / operations, "ops_per_second": operations / best}
+
+
+@lru_cache(maxsize=None)
+def random_message(length, seed=15):
+    rng = random.Random(seed)
+    return "".join(rng.choice(string.ascii_uppercase) for _ in range(length))
+
+
+def encode_from_start(machine, message):
+    machine.reset()
+    return machine.encode(message)
+
+
+# Every suite yields (name, benchmark) pairs; the benchmark only runs if its name is selected
+
+
+def engine_benchmarks(quick):
+    sizes = [100, 1000] if quick else [100, 1000, 10000]
+    bulk_sizes = [10000] if quick else [10000, 1000000]
+    for name, configuration in CONFIGURATIONS.items():
+        machine = Enigma(**configuration)
+        yield f"encode_character/{name}", lambda: measure(lambda: machine.encode_character("A"))
+        yield f"construct/{name}", lambda: measure(lambda: Enigma(**configuration))
+        for size in sizes:
+            # Construction has its own benchmark: reuse one machine, rewound before every message
+            yield f"encode/{name}/{size}", lambda: measure(lambda: encode_from_start(machine, random_message(size)),
+                                                           size)
+        for size in bulk_sizes:
+            tables = vectorized.MachineTables(machine)
+            yield (f"vectorized/{name}/{size}",
+                   lambda: measure(lambda: vectorized.encode(machine, random_message(size), tables), size))
+            # The first call builds the keystream; the best of the repeats only measures lookups
+            keystreams = cache.KeystreamCache()
+            yield (f"keystream_cache/{name}/{size}",
+                   lambda: measure(lambda: cache.encode(machine, random_message(size), keystreams), size))
+
+
+def plugboard_benchmarks(quick):
+    for leads in range(0, len(PLUG_LEADS) + 1, 4 if quick else 1):
+        machine = Enigma(**CONFIGURATIONS["3-rotor"], plug_combinations=PLUG_LEADS[:leads])
+        yield f"plugboard/{leads}-leads", lambda: measure(lambda: machine.encode_character("A"))
+
+
+def http_load(payload, threads, requests_per_thread):
+    """
+    Runs ``threads`` concurrent clients that each open a session and send ``requests_per_thread`` requests.
+
+    The server is measured as deployed, so metrics are on during the run (unless ``ENIGMA_METRICS=0``), which the
+    result records under ``metrics``. Importing ``app`` turns them on for the whole process, so the previous state
+    is restored afterwards and the other suites are not affected. No job is submitted, so the job queue is never
+    opened.
+    """
+    was_enabled = metrics.enabled
+    from app import app
+
+    configuration = CONFIGURATIONS["3-rotor"]
+    init = {"rotors": configuration["rotor_sequence"], "reflector": configuration["reflector"],
+            "rings": configuration["ring_setting"], "positions": configuration["initial_positions"]}
+
+    def load():
+        client = app.test_client()
+        session_id = client.post("/init", json=init).get_json()["session_id"]
+        for _ in range(requests_per_thread):
+            client.post("/encode", json={"session_id": session_id, **payload})
+
+    workers = [threading.Thread(target=load) for _ in range(threads)]
+    server_metrics = metrics.enabled
+    try:
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - start
+    finally:
+        (metrics.enable if was_enabled else metrics.disable)()
+    operations = threads * (requests_per_thread + 1)
+    return {"seconds_per_op": elapsed / operations, "ops_per_second": operations / elapsed,
+            "metrics": server_metrics}
+
+
+def http_benchmarks(quick):
+    threads = 4
+    requests_per_thread = 50 if quick else 500
+    payloads = {"character": {"character": "A"}, "text-1k": {"text": random_message(1000)}}
+    for name, payload in payloads.items():
+        yield (f"http/init+encode/{name}/{threads}-threads",
+               lambda: http_load(payload, threads, requests_per_thread))
+
+
+SUITES = [engine_benchmarks, plugboard_benchmarks, http_benchmarks]
+
+
+def run(quick=False, pattern=None):
+    engine_metrics = metrics.enabled
+    results = {}
+    for suite in SUITES:
+        for name, benchmark in suite(quick):
+            if pattern and pattern not in name:
+                continue
+            results[name] = result = benchmark()
+            print(f"{name:55s} {result['seconds_per_op'] * 1e6:12.3f} us/op {result['ops_per_second']:14.0f} op/s",
+                  file=sys.stderr)
+    return {
+        "meta": {"python": platform.python_version(), "numpy": np.__version__, "platform": platform.platform(),
+                 "quick": quick, "metrics": engine_metrics},
+        "results": results,
+    }
+
+
+def compare(results, baseline, tolerance):
+    """
+    Compares two result sets.
+
+    :returns: ``(name, ratio)`` for every benchmark whose time per operation grew by more than ``tolerance``
+        (0.2 = 20%) over the baseline.
+    :rtype: list[tuple[str, float]]
+    """
+    regressions = []
+    for name, result in results["results"].items():
+        reference = baseline["results"].get(name)
+        if reference is None:
+            continue
+        ratio = result["seconds_per_op"] / reference["seconds_per_op"]
+        if ratio > 1 + tolerance:
+            regressions.append((name, ratio))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.bench", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="compare against the results in this JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown, 0.2 = 20%%")
+    parser.add_argument("--quick", action="store_true", help="smaller sizes and fewer requests")
+    parser.add_argument("-k", dest="pattern", help="only run benchmarks whose name contains this")
+    args = parser.parse_args(argv)
+
+    results = run(args.quick, args.pattern)
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(results, output, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as baseline:
+            regressions = compare(results, json.load(baseline), args.tolerance)
+        for name, ratio in regressions:
+            print(f"REGRESSION {name}: {ratio:.2f}x slower than baseline", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
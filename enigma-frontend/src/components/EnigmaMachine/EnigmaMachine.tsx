@@ -1,83 +1,69 @@
-import React, { useState } from 'react';
+import React, { useEffect, useRef, useState } from 'react';
 import { Container, Paper, Typography, TextField, Button, Grid } from '@mui/material';
 import { Rotor } from '../Rotor/Rotor.tsx';
-
-// Define the rotor wirings based on historical Enigma machines
-const ROTOR_WIRINGS = [
-    'EKMFLGDQVZNTOWYHXUSPAIBRCJ', // Rotor I
-    'AJDKSIRUXBLHWTMCQGZNPYFVOE', // Rotor II
-    'BDFHJLCPRTXVZNYEIWGAKMUSQO'  // Rotor III
-];
+import { enigmaService } from '../../services/enigmaService';
+import { KeystrokeChannel } from '../../services/keystrokeChannel';
 
 const ALPHABET = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ';
 
 export const EnigmaMachine: React.FC = () => {
     const [input, setInput] = useState('');
     const [output, setOutput] = useState('');
-    const [rotorPositions, setRotorPositions] = useState([0, 0, 0]);
-
-    const handleRotorChange = (index: number, value: number) => {
-        const newPositions = [...rotorPositions];
-        newPositions[index] = value;
-        setRotorPositions(newPositions);
-    };
-
-    const rotateRotors = (positions: number[]): number[] => {
-        const newPositions = [...positions];
-        newPositions[0] = (newPositions[0] + 1) % 26;
-
-        if (newPositions[0] === 0) {
-            newPositions[1] = (newPositions[1] + 1) % 26;
-            if (newPositions[1] === 0) {
-                newPositions[2] = (newPositions[2] + 1) % 26;
-            }
+    const [error, setError] = useState('');
+    // Start positions set by the user and the current positions of the server's rotors, leftmost rotor first
+    const [startPositions, setStartPositions] = useState(['A', 'A', 'A']);
+    const [rotorPositions, setRotorPositions] = useState(['A', 'A', 'A']);
+    const channel = useRef<KeystrokeChannel | null>(null);
+    const generation = useRef(0);
+
+    useEffect(() => () => channel.current?.close(), []);
+
+    // Starts a new session from the start positions and types ``text`` into it over the keystroke channel
+    const restart = async (text: string, positions: string[] = startPositions) => {
+        const current = ++generation.current;
+        channel.current?.close();
+        channel.current = null;
+        enigmaService.reset();
+        setOutput('');
+        setError('');
+        setRotorPositions(positions);
+
+        try {
+            const sessionId = await enigmaService.session({ rotors: positions.map(position => ({ position })) });
+            if (current !== generation.current) return;
+            channel.current = new KeystrokeChannel(
+                sessionId,
+                (frame) => {
+                    setOutput(previous => previous + frame.output);
+                    setRotorPositions(frame.rotorPositions);
+                },
+                (reason) => {
+                    if (reason && current === generation.current) setError(reason);
+                }
+            );
+            if (text) channel.current.send(text);
+        } catch {
+            if (current === generation.current) setError('Could not reach the Enigma server');
         }
-        return newPositions;
     };
 
-    const encryptLetter = (letter: string, positions: number[]): string => {
-        if (!ALPHABET.includes(letter)) return letter;
-
-        let charIndex = ALPHABET.indexOf(letter);
-
-        // Forward through rotors
-        for (let i = 0; i < 3; i++) {
-            const offset = positions[i];
-            const rotor = ROTOR_WIRINGS[i];
-            charIndex = (charIndex + offset) % 26;
-            charIndex = ALPHABET.indexOf(rotor[charIndex]);
-            charIndex = (charIndex - offset + 26) % 26;
+    const handleInputChange = (value: string) => {
+        value = value.toUpperCase();
+        if (channel.current && value.startsWith(input)) {
+            // Only the new keys go over the channel; the server answers with their encoding
+            channel.current.send(value.slice(input.length));
+        } else {
+            restart(value);
         }
-
-        // Reflector (simple reflection)
-        charIndex = 25 - charIndex;
-
-        // Backward through rotors
-        for (let i = 2; i >= 0; i--) {
-            const offset = positions[i];
-            const rotor = ROTOR_WIRINGS[i];
-            charIndex = (charIndex + offset) % 26;
-            charIndex = rotor.indexOf(ALPHABET[charIndex]);
-            charIndex = (charIndex - offset + 26) % 26;
-        }
-
-        return ALPHABET[charIndex];
+        setInput(value);
     };
 
-    const handleEncrypt = () => {
-        let currentPositions = [...rotorPositions];
-        let result = '';
-
-        for (const char of input.toUpperCase()) {
-            if (ALPHABET.includes(char)) {
-                result += encryptLetter(char, currentPositions);
-                currentPositions = rotateRotors(currentPositions);
-            } else {
-                result += char;
-            }
-        }
-
-        setOutput(result);
+    const handleRotorChange = (index: number, value: string) => {
+        if (!ALPHABET.includes(value) || value.length !== 1) return;
+        const newPositions = [...startPositions];
+        newPositions[index] = value;
+        setStartPositions(newPositions);
+        restart(input, newPositions);
     };
 
     return (
@@ -100,7 +86,7 @@ export const EnigmaMachine: React.FC = () => {
                 <TextField
                     label="Input"
                     value={input}
-                    onChange={(e) => setInput(e.target.value.toUpperCase())}
+                    onChange={(e) => handleInputChange(e.target.value)}
                     multiline
                     rows={4}
                     fullWidth
@@ -111,7 +97,7 @@ export const EnigmaMachine: React.FC = () => {
                 <Button
                     variant="contained"
                     color="primary"
-                    onClick={handleEncrypt}
+                    onClick={() => restart(input)}
                     fullWidth
                     style={{ margin: '1rem 0' }}
                 >
@@ -128,7 +114,9 @@ export const EnigmaMachine: React.FC = () => {
                     margin="normal"
                     InputProps={{ readOnly: true }}
                 />
+
+                {error && <Typography color="error">{error}</Typography>}
             </Paper>
         </Container>
     );
-};
\ No newline at end of file
+};
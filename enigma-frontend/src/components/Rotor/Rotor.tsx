@@ -3,7 +3,7 @@ import { TextField, Paper, Typography } from '@mui/material';
 import './Rotor.css';
 
 interface RotorProps {
-    position: number;
+    position: string;
     index: number;
     onChange: (value: string) => void;
 }
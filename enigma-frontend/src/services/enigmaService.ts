@@ -1,21 +1,58 @@
 import axios from 'axios';
 import { EnigmaConfig, EnigmaResponse } from '../types';
 
-const API_URL = process.env.REACT_APP_API_URL || 'http://localhost:5000';
+export const API_URL = import.meta.env.VITE_API_URL ?? 'http://localhost:5000';
+
+const ringSetting = (value?: string): number =>
+    value && /^[A-Z]$/i.test(value) ? value.toUpperCase().charCodeAt(0) - 64 : Number(value || 1);
+
+// Server session of the last configuration, reused until the configuration changes or the session expires
+let current: { config: string; sessionId: string } | null = null;
 
 export const enigmaService = {
+    init: async (config: EnigmaConfig): Promise<string> => {
+        const response = await axios.post(`${API_URL}/init`, {
+            positions: config.rotors.map(r => r.position).join(''),
+            rings: config.rotors.map(r => ringSetting(r.ring_setting)),
+            plugboard: config.plugboard
+        });
+        return response.data.session_id;
+    },
+
+    session: async (config: EnigmaConfig): Promise<string> => {
+        const key = JSON.stringify(config);
+        if (!current || current.config !== key) {
+            current = { config: key, sessionId: await enigmaService.init(config) };
+        }
+        return current.sessionId;
+    },
+
+    reset: () => {
+        current = null;
+    },
+
+    // Encrypts on the session of the configuration: like typing on the machine, each call continues from the
+    // rotor positions the previous one left, and a new configuration (or reset) starts again from its positions
     encrypt: async (text: string, config: EnigmaConfig): Promise<EnigmaResponse> => {
         try {
-            const response = await axios.post(`${API_URL}/encode`, {
-                text,
-                rotor_settings: config.rotors.map(r => r.position).join(''),
-                ring_settings: config.rotors.map(r => r.ring_setting).join(''),
-                plugboard: config.plugboard
-            });
-            return response.data;
+            const sessionId = await enigmaService.session(config);
+            try {
+                const response = await axios.post(`${API_URL}/encode`, { session_id: sessionId, text });
+                return response.data;
+            } catch (error) {
+                if (!axios.isAxiosError(error) || error.response?.status !== 404) {
+                    throw error;
+                }
+                // The session expired or was evicted: start a new one
+                enigmaService.reset();
+                const response = await axios.post(`${API_URL}/encode`, {
+                    session_id: await enigmaService.session(config), text
+                });
+                return response.data;
+            }
         } catch (error) {
             console.error('Encryption error:', error);
             throw error;
         }
     }
-};
\ No newline at end of file
+};
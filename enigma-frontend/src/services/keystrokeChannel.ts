@@ -0,0 +1,28 @@
+import { EnigmaResponse } from '../types';
+import { API_URL } from './enigmaService';
+
+const WS_URL = API_URL.replace(/^http/, 'ws');
+
+// Persistent keystroke stream bound to one machine session (see /keystrokes in app.py).
+// Keys typed while a frame is in flight are batched by the server, so one response may cover several keys.
+export class KeystrokeChannel {
+    private socket: WebSocket;
+
+    constructor(sessionId: string, onFrame: (frame: EnigmaResponse) => void, onClose?: (reason: string) => void) {
+        this.socket = new WebSocket(`${WS_URL}/keystrokes?session_id=${encodeURIComponent(sessionId)}`);
+        this.socket.onmessage = (event) => onFrame(JSON.parse(event.data));
+        this.socket.onclose = (event) => onClose?.(event.reason);
+    }
+
+    send(keys: string) {
+        if (this.socket.readyState === WebSocket.OPEN) {
+            this.socket.send(keys);
+        } else {
+            this.socket.addEventListener('open', () => this.socket.send(keys), { once: true });
+        }
+    }
+
+    close() {
+        this.socket.close();
+    }
+}
@@ -9,6 +9,8 @@ export interface EnigmaConfig {
 }
 
 export interface EnigmaResponse {
-  result: string;
-  rotor_positions?: string[];
-}
\ No newline at end of file
+  input: string;
+  output: string;
+  rotorPositions: string[];
+  trace?: string[];
+}
@@ -0,0 +1,54 @@
+"""
+Command line entry point: encodes a file or standard input with a configured machine.
+
+Example::
+
+    python -m enigma --rotors I II III --reflector B --rings 1 1 1 --positions AAZ --plugs HL MO \\
+        message.txt ciphertext.txt
+"""
+import argparse
+import sys
+
+from enigma.enigma import Enigma
+from enigma.stream import DEFAULT_CHUNK_SIZE, encode_file, encode_stream
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m enigma", description="Encode or decode a file with Enigma.")
+    parser.add_argument("input", nargs="?", default="-", help="input file, '-' for standard input")
+    parser.add_argument("output", nargs="?", default="-", help="output file, '-' for standard output")
+    parser.add_argument("--rotors", nargs="+", default=["I", "II", "III"], help="rotor order, left to right")
+    parser.add_argument("--reflector", default="B")
+    parser.add_argument("--rings", nargs="+", type=int, default=None, help="ring settings, 1-26")
+    parser.add_argument("--positions", default=None, help="initial rotor positions, e.g. AAZ")
+    parser.add_argument("--plugs", nargs="*", default=None, help="plug leads, e.g. HL MO AJ")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--skip-non-letters", action="store_true",
+                        help="leave out anything that isn't a letter instead of copying it through")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    machine = Enigma(
+        rotor_sequence=args.rotors,
+        reflector=args.reflector,
+        ring_setting=args.rings or [1] * len(args.rotors),
+        initial_positions=args.positions or "A" * len(args.rotors),
+        plug_combinations=args.plugs,
+    )
+    non_letters = "skip" if args.skip_non_letters else "passthrough"
+
+    output = sys.stdout.buffer if args.output == "-" else open(args.output, "wb")
+    try:
+        if args.input == "-":
+            encode_stream(machine, sys.stdin.buffer, output, args.chunk_size, non_letters)
+        else:
+            encode_file(machine, args.input, output, args.chunk_size, non_letters)
+    finally:
+        if output is not sys.stdout.buffer:
+            output.close()
+
+
+if __name__ == "__main__":
+    main()
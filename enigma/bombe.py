@@ -0,0 +1,188 @@
+"""
+Turing-Welchman Bombe.
+
+A crib aligned with the ciphertext gives a *menu*: a graph whose nodes are letters and whose edges link each crib
+letter to its ciphertext letter, labelled with the key press at which they were enciphered. With a plugboard ``S``
+and the scrambler ``A_t`` (rotors and reflector) at key press ``t``, each edge ``(a, b, t)`` states that
+``S(b) = A_t(S(a))``.
+
+For every start position of a rotor order, the Bombe assumes a stecker for the most connected menu letter (the
+*test register*) and propagates everything it implies along the menu edges and through the diagonal board
+(``S(a) = v`` implies ``S(v) = a``). A wrong assumption usually ends up implying every value for the test letter and
+the position is dropped; otherwise the position is a *stop*. All start positions are propagated at once as a
+``(positions, 26, 26)`` array of implied steckers, with positions dropped as soon as they are refuted.
+
+Stops are then checked like on the checking machine: the implied steckers must be consistent and must decrypt the
+crib through :class:`enigma.enigma.Plugboard` and :meth:`Enigma.encode`.
+
+:class:`Bombe` shards the search like :class:`enigma.search.KnownPlaintextSearch` (one shard per rotor order,
+reflector and ring setting, ring settings at 1 by default), so :meth:`Bombe.run` spreads rotor orders over a process
+pool.
+"""
+from collections import Counter
+
+import numpy as np
+
+from enigma.enigma import ALPHABET, ALPHABET_SIZE, Enigma, Plugboard
+from enigma.search import DEFAULT_REFLECTORS, DEFAULT_ROTORS, KnownPlaintextSearch
+from enigma.vectorized import MachineTables, to_indices
+
+
+def possible_offsets(ciphertext: str, crib: str):
+    """
+    Offsets at which ``crib`` can lie in ``ciphertext``: those where no letter would be enciphered to itself.
+    """
+    ciphertext, crib = to_indices(ciphertext), to_indices(crib)
+    return [offset for offset in range(ciphertext.size - crib.size + 1)
+            if not np.any(ciphertext[offset:offset + crib.size] == crib)]
+
+
+def menu(ciphertext: str, crib: str, crib_offset: int = 0):
+    """
+    Builds the menu of a crib at ``crib_offset``.
+
+    :returns: Edges ``(crib letter, ciphertext letter, key press)``, letters as indices and key presses counted
+        from 1 at the start of the message.
+    :rtype: list[tuple[int, int, int]]
+    :raises ValueError: If the crib doesn't fit the ciphertext or a letter would be enciphered to itself.
+    """
+    ciphertext, crib = to_indices(ciphertext), to_indices(crib)
+    if not crib.size or crib_offset < 0 or crib_offset + crib.size > ciphertext.size:
+        raise ValueError("The crib must be non-empty and lie within the ciphertext.")
+    cipher = ciphertext[crib_offset:crib_offset + crib.size]
+    if np.any(cipher == crib):
+        raise ValueError(f"Invalid crib offset: {crib_offset}. Enigma never enciphers a letter to itself.")
+    return [(int(plain), int(encoded), crib_offset + index + 1)
+            for index, (plain, encoded) in enumerate(zip(crib.tolist(), cipher.tolist()))]
+
+
+def propagate(live, edges, scramblers, test_letter: int):
+    """
+    Propagates implied steckers to a fixed point.
+
+    :param live: ``(positions, 26, 26)`` boolean array, ``live[n, a, v]`` meaning that ``S(a) = v`` is implied at
+        position ``n``. Updated in place.
+    :param edges: Menu edges, see :func:`menu`.
+    :param scramblers: Key press to ``(positions, 26)`` scrambler permutations.
+    :param test_letter: The test register. Positions where every value of it is implied are not propagated further.
+    :returns: ``live`` and the indices of the positions that were not refuted.
+    :rtype: tuple
+    """
+    active = np.arange(len(live))
+    current = live
+    while True:
+        before = np.count_nonzero(current)
+        for a, b, press in edges:
+            scrambler = scramblers[press][active]
+            current[:, b] |= np.take_along_axis(current[:, a], scrambler, axis=1)
+            current[:, a] |= np.take_along_axis(current[:, b], scrambler, axis=1)
+        # Diagonal board
+        current |= current.transpose(0, 2, 1)
+
+        refuted = current[:, test_letter].all(axis=1)
+        if np.count_nonzero(current) == before or refuted.all():
+            live[active] = current
+            return live, active[~refuted]
+        if refuted.any():
+            active = active[~refuted]
+            current = current[~refuted]
+
+
+class Bombe(KnownPlaintextSearch):
+    """
+    Bombe run of a crib over rotor orders, reflectors and ring settings, with an unknown plugboard.
+
+    :ivar menu: Menu edges, see :func:`menu`.
+    :type menu: list[tuple[int, int, int]]
+    :ivar test_letter: The most connected menu letter, used as test register.
+    :type test_letter: int
+    """
+    def __init__(self, ciphertext: str, crib: str, crib_offset: int = 0, rotors=DEFAULT_ROTORS, slots: int = 3,
+                 rotor_orders=None, reflectors=DEFAULT_REFLECTORS, ring_settings=None):
+        if ring_settings is None:
+            ring_settings = [(1,) * (len(rotor_orders[0]) if rotor_orders else slots)]
+        super().__init__(ciphertext, crib, crib_offset, rotors, slots, rotor_orders, reflectors, ring_settings)
+        self.menu = menu(ciphertext, crib, crib_offset)
+        self.test_letter = Counter(letter for a, b, _ in self.menu for letter in (a, b)).most_common(1)[0][0]
+
+    def stops(self, index: int):
+        """
+        Runs one shard.
+
+        :param index: The shard number.
+        :returns: One dict per stop with the ``key`` (keyword arguments for :class:`Enigma`, the plugboard holding
+            the implied steckers), the implied ``steckers`` (letter to letter, self-steckered letters included) and
+            whether the stop was ``verified``.
+        :rtype: list[dict]
+        """
+        rotor_order, reflector, ring_setting = self.shard(index)
+        slots = len(rotor_order)
+        machine = Enigma(rotor_sequence=list(rotor_order), reflector=reflector, ring_setting=list(ring_setting),
+                         initial_positions="A" * slots)
+        tables = MachineTables(machine)
+        starts = [start[:, None] for start in np.indices((ALPHABET_SIZE,) * slots).reshape(slots, -1)]
+        pins = np.arange(ALPHABET_SIZE, dtype=np.uint8)[None, :]
+        scramblers = {press: tables.encode(pins, tables.positions([*starts, 0], press))
+                      for press in sorted({press for _, _, press in self.menu})}
+
+        # Assume S(test letter) = A everywhere
+        live = np.zeros((len(starts[0]), ALPHABET_SIZE, ALPHABET_SIZE), dtype=bool)
+        live[:, self.test_letter, 0] = live[:, 0, self.test_letter] = True
+        live, survivors = propagate(live, self.menu, scramblers, self.test_letter)
+
+        stops = []
+        for position in survivors.tolist():
+            implied = live[position]
+            lit = implied[self.test_letter]
+            if np.count_nonzero(lit) == ALPHABET_SIZE - 1:
+                # Every value but one was refuted: that one is the stecker of the test letter
+                implied = np.zeros((1, ALPHABET_SIZE, ALPHABET_SIZE), dtype=bool)
+                value = int(np.flatnonzero(~lit)[0])
+                implied[0, self.test_letter, value] = implied[0, value, self.test_letter] = True
+                single = {press: scrambler[position:position + 1] for press, scrambler in scramblers.items()}
+                implied = propagate(implied, self.menu, single, self.test_letter)[0][0]
+
+            start = [int(start[position, 0]) for start in starts]
+            stops.append(self.check({
+                "rotor_sequence": list(rotor_order),
+                "reflector": reflector,
+                "ring_setting": list(ring_setting),
+                "initial_positions": "".join(ALPHABET[letter] for letter in reversed(start)),
+                "plug_combinations": None,
+            }, implied))
+        return stops
+
+    def check(self, key: dict, implied):
+        """
+        Checks a stop: each letter must have at most one implied stecker, the steckers must make a valid
+        :class:`Plugboard`, and every crib letter whose steckers are known must encrypt to its ciphertext letter.
+        """
+        stop = {"key": key, "steckers": {}, "verified": False}
+        counts = implied.sum(axis=1)
+        if np.any(counts > 1):
+            return stop
+        steckers = {ALPHABET[letter]: ALPHABET[int(np.argmax(implied[letter]))]
+                    for letter in np.flatnonzero(counts == 1).tolist()}
+        stop["steckers"] = steckers
+
+        pairs = sorted({"".join(sorted(pair)) for pair in steckers.items() if pair[0] != pair[1]})
+        try:
+            Plugboard(pairs)
+        except ValueError:
+            return stop
+        key["plug_combinations"] = pairs
+
+        machine = Enigma(**key)
+        decrypt = machine.decode(ALPHABET[0] * self.crib_offset + "".join(ALPHABET[b] for _, b, _ in self.menu))
+        stop["verified"] = all(decrypt[press - 1] == ALPHABET[a] for a, b, press in self.menu
+                               if ALPHABET[a] in steckers and ALPHABET[b] in steckers)
+        return stop
+
+    def search_shard(self, index: int):
+        """
+        Runs one shard and keeps its verified stops.
+
+        :returns: The keys of the verified stops, as keyword arguments for :class:`Enigma`.
+        :rtype: list[dict]
+        """
+        return [stop["key"] for stop in self.stops(index) if stop["verified"]]
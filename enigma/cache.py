@@ -0,0 +1,199 @@
+"""
+Full-period keystream cache.
+
+For a fixed rotor order, reflector, ring settings and plugboard, the substitution used at each key press only
+depends on the positions of the rotors that move, and those run through one fixed cycle of ``26 ** k`` states
+(``k`` being the number of rotors in the carry chain starting at the fast rotor). A :class:`Keystream` materialises
+the 26-letter permutation of every state of that cycle once, in cycle order, so a message starting anywhere in the
+cycle is encoded by indexing rows ``start + 1, start + 2, ...``.
+
+:class:`KeystreamCache` keeps keystreams keyed by a hash of the compiled configuration, evicting the least recently
+used ones beyond a memory budget. With a ``directory`` the tables are also written to disk and memory-mapped
+read-only, so worker processes using the same directory share one copy through the page cache.
+"""
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from enigma import metrics
+from enigma.enigma import ALPHABET_SIZE, Enigma
+from enigma.vectorized import MachineTables, to_indices, to_message
+
+DEFAULT_MAX_BYTES = 256 << 20
+
+
+def carry_chain(machine: Enigma):
+    """
+    Number of rotors, from the fast one, that ever move: the fast rotor and every rotor a moving rotor carries into.
+    """
+    length = 0
+    for rotor in machine.rotors:
+        if not rotor.can_rotate:
+            break
+        length += 1
+        if rotor.carry_notch is None:
+            break
+    return length
+
+
+def configuration_key(machine: Enigma):
+    """
+    Canonical hash of everything a keystream depends on: the compiled wiring and stepping of every rotor, the
+    plugboard permutation and the positions of the rotors that never move.
+    """
+    digest = hashlib.sha256()
+    chain = carry_chain(machine)
+    for index, rotor in enumerate(machine.rotors):
+        digest.update(bytes(rotor.forward))
+        digest.update(bytes([rotor.can_rotate, ALPHABET_SIZE if rotor.carry_notch is None else rotor.carry_notch,
+                             rotor.position if index >= chain else ALPHABET_SIZE]))
+    digest.update(bytes(machine.plugboard.permutation))
+    return digest.hexdigest()
+
+
+class Keystream:
+    """
+    Every substitution of one machine configuration, in stepping order.
+
+    :ivar table: ``(period, 26)`` array; row ``j`` is the full substitution (plugboard included) used ``j`` steps
+        into the cycle.
+    :type table: numpy.ndarray
+    :ivar rank: Position in the cycle of each state of the carry chain, indexed by the chain positions as a base-26
+        number with the fast rotor as the least significant digit.
+    :type rank: numpy.ndarray
+    :ivar chain: Number of rotors in the carry chain.
+    :type chain: int
+    """
+    def __init__(self, table, rank, chain: int):
+        self.table = table
+        self.rank = rank
+        self.chain = chain
+
+    @property
+    def period(self):
+        return len(self.table)
+
+    @property
+    def nbytes(self):
+        return self.table.nbytes + self.rank.nbytes
+
+    @classmethod
+    def build(cls, machine: Enigma):
+        tables = MachineTables(machine)
+        chain = carry_chain(machine)
+        period = ALPHABET_SIZE ** chain
+        positions = list(machine.rotor_positions)
+        zeros = [0] * chain + positions[chain:]
+
+        # Walk the cycle once from the all-zero state to find the order of the states
+        cycle = [np.asarray(position) for position in tables.positions(zeros, np.arange(period, dtype=np.int32))]
+        states = sum(cycle[index] * ALPHABET_SIZE ** index for index in range(chain))
+        rank = np.empty(period, dtype=np.uint32)
+        rank[states] = np.arange(period, dtype=np.uint32)
+
+        rows = [position[:, None] for position in cycle[:chain]] + positions[chain:]
+        table = tables.encode(np.arange(ALPHABET_SIZE, dtype=np.uint8)[None, :], rows)
+        return cls(np.ascontiguousarray(table, dtype=np.uint8), rank, chain)
+
+    def start(self, positions):
+        """Cycle position of the given rotor positions (as in :attr:`Enigma.rotor_positions`)."""
+        return int(self.rank[sum(positions[index] * ALPHABET_SIZE ** index for index in range(self.chain))])
+
+    def encode(self, letters, positions):
+        """
+        Encodes letter indices from the given rotor positions by table lookup.
+        """
+        letters = np.asarray(letters, dtype=np.uint8)
+        rows = (self.start(positions) + 1 + np.arange(letters.size, dtype=np.int64)) % self.period
+        return self.table[rows, letters]
+
+
+class KeystreamCache:
+    """
+    Thread-safe LRU cache of :class:`Keystream` objects bounded by ``max_bytes``.
+
+    :ivar directory: Where tables are persisted and memory-mapped from, or None to keep them in memory only.
+    :type directory: str
+    """
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES, directory: str = None):
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.entries = OrderedDict()
+        self.nbytes = 0
+        self.lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "evictions": 0}
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def paths(self, key):
+        return (os.path.join(self.directory, f"{key}.table.npy"), os.path.join(self.directory, f"{key}.rank.npy"))
+
+    def load(self, key, machine):
+        if self.directory:
+            table_path, rank_path = self.paths(key)
+            if os.path.exists(table_path) and os.path.exists(rank_path):
+                return Keystream(np.load(table_path, mmap_mode="r"), np.load(rank_path, mmap_mode="r"),
+                                 carry_chain(machine))
+
+        keystream = Keystream.build(machine)
+        if self.directory:
+            for path, array in zip(self.paths(key), (keystream.table, keystream.rank)):
+                # Write to a temporary file and rename, so other processes never map a half-written table
+                handle, temporary = tempfile.mkstemp(dir=self.directory, suffix=".npy")
+                with os.fdopen(handle, "wb") as output:
+                    np.save(output, array)
+                os.replace(temporary, path)
+            return self.load(key, machine)
+        return keystream
+
+    def get(self, machine: Enigma):
+        """
+        The keystream of the machine's configuration, built (or loaded from the directory) on first use.
+        """
+        key = configuration_key(machine)
+        with self.lock:
+            keystream = self.entries.get(key)
+            if keystream is not None:
+                self.entries.move_to_end(key)
+                self.counters["hits"] += 1
+                return keystream
+            self.counters["misses"] += 1
+
+        keystream = self.load(key, machine)
+        with self.lock:
+            if key not in self.entries:
+                self.entries[key] = keystream
+                self.nbytes += keystream.nbytes
+            while self.nbytes > self.max_bytes and len(self.entries) > 1:
+                _, evicted = self.entries.popitem(last=False)
+                self.nbytes -= evicted.nbytes
+                self.counters["evictions"] += 1
+        return keystream
+
+    def stats(self):
+        with self.lock:
+            return {"entries": len(self.entries), "bytes": self.nbytes, "max_bytes": self.max_bytes, **self.counters}
+
+
+default_cache = KeystreamCache()
+
+
+@metrics.timed("encode")
+def encode(machine: Enigma, message: str, cache: KeystreamCache = None):
+    """
+    Equivalent of :meth:`Enigma.encode` using the cached keystream of the machine's configuration. The machine is
+    advanced past the message.
+    """
+    letters = to_indices(message)
+    if metrics.enabled:
+        metrics.record_encode(machine, letters.size)
+    start_positions = machine.rotor_positions
+    encoded = (cache or default_cache).get(machine).encode(letters, start_positions)
+    for rotor, position in zip(machine.rotors, machine.advance(start_positions, letters.size)):
+        rotor.position = position
+    machine.offset += letters.size
+    return to_message(encoded)
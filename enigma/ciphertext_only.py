@@ -0,0 +1,232 @@
+"""
+Ciphertext-only attack.
+
+The attack runs in two stages, following the classic approach of scoring without the plugboard first:
+
+1. For every rotor order and reflector, all start positions are scored by the index of coincidence of their decrypt
+   without plugboard (ring settings at 1). Each decrypt is a table gather from :mod:`enigma.vectorized`.
+2. The best candidates are hill-climbed: first the ring settings of the fast and middle rotors (with the start
+   positions moved to keep the wiring aligned), then plugboard pairs, scored with an n-gram model.
+
+In the second stage the rotor stack is reduced to one 26-letter scrambler permutation per position, so a decrypt
+under any plugboard is two gathers, and the scores of all single plug changes are updated incrementally from the
+current decrypt with :meth:`NgramScorer.rescore`.
+"""
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from enigma.enigma import ALPHABET, ALPHABET_SIZE, Enigma
+from enigma.ngrams import NgramScorer, index_of_coincidence
+from enigma.search import DEFAULT_REFLECTORS, DEFAULT_ROTORS
+from enigma.vectorized import MachineTables, to_indices, to_message
+
+BLOCK_SIZE = 1024
+MAX_PLUGS = 10
+
+
+def scrambler(key: dict, length: int):
+    """
+    The scrambler permutation (rotors and reflector, without plugboard) for each of the first ``length`` key
+    presses of ``key``.
+
+    :returns: Array of shape ``(length, 26)``.
+    :rtype: numpy.ndarray
+    """
+    machine = Enigma(**{**key, "plug_combinations": None})
+    tables = MachineTables(machine)
+    steps = np.arange(1, length + 1, dtype=np.int32)[:, None]
+    return tables.encode(np.arange(ALPHABET_SIZE, dtype=np.uint8)[None, :],
+                         tables.positions(machine.rotor_positions, steps))
+
+
+def plug_combinations(permutation):
+    """Turns a plugboard permutation back into plug lead strings."""
+    return [ALPHABET[x] + ALPHABET[y] for x, y in enumerate(permutation) if x < y]
+
+
+class CiphertextOnlyAttack:
+    """
+    Recovers keys from ciphertext alone.
+
+    :ivar ciphertext: Ciphertext letter indices.
+    :type ciphertext: numpy.ndarray
+    :ivar scorer: N-gram model used to climb the plugboard, or None to use the index of coincidence throughout.
+    :type scorer: NgramScorer
+    :ivar rotor_orders: Rotor orders to try, leftmost rotor first.
+    :type rotor_orders: list[tuple[str, ...]]
+    :ivar reflectors: Reflectors to try.
+    :type reflectors: list[str]
+    """
+    def __init__(self, ciphertext: str, scorer: NgramScorer = None, rotors=DEFAULT_ROTORS, slots: int = 3,
+                 rotor_orders=None, reflectors=DEFAULT_REFLECTORS, max_plugs: int = MAX_PLUGS):
+        self.ciphertext = to_indices(ciphertext)
+        self.scorer = scorer
+        self.rotor_orders = [tuple(order) for order in rotor_orders or itertools.permutations(rotors, slots)]
+        self.reflectors = list(reflectors)
+        self.max_plugs = max_plugs
+
+    def fitness(self, letters):
+        return self.scorer.score(letters) if self.scorer else index_of_coincidence(letters)
+
+    def rank_start_positions(self, rotor_order, reflector, top: int = 10):
+        """
+        Stage 1: scores every start position of one rotor order and reflector (rings at 1, no plugboard) by the
+        index of coincidence of its decrypt.
+
+        :returns: The ``top`` best candidates as ``(score, key)``, best first.
+        :rtype: list[tuple[float, dict]]
+        """
+        slots = len(rotor_order)
+        machine = Enigma(rotor_sequence=list(rotor_order), reflector=reflector, ring_setting=[1] * slots,
+                         initial_positions="A" * slots)
+        tables = MachineTables(machine)
+        starts = np.indices((ALPHABET_SIZE,) * slots).reshape(slots, -1)
+        steps = np.arange(1, self.ciphertext.size + 1, dtype=np.int32)[None, :]
+
+        scores = np.empty(starts.shape[1])
+        for block in range(0, starts.shape[1], BLOCK_SIZE):
+            rows = [start[block:block + BLOCK_SIZE, None] for start in starts]
+            decrypts = tables.encode(self.ciphertext[None, :], tables.positions([*rows, 0], steps))
+            scores[block:block + BLOCK_SIZE] = index_of_coincidence(decrypts)
+
+        best = np.argsort(scores)[::-1][:top]
+        return [(float(scores[index]), {
+            "rotor_sequence": list(rotor_order),
+            "reflector": reflector,
+            "ring_setting": [1] * slots,
+            "initial_positions": "".join(ALPHABET[position] for position in reversed(starts[:, index])),
+            "plug_combinations": None,
+        }) for index in best]
+
+    def decrypt(self, scramble, permutations):
+        """Decrypts the ciphertext through ``scramble`` under one or more plugboard permutations."""
+        permutations = np.atleast_2d(permutations)
+        plugged = np.take_along_axis(permutations, np.broadcast_to(self.ciphertext, (len(permutations),
+                                                                                     self.ciphertext.size)), axis=1)
+        scrambled = scramble[np.arange(self.ciphertext.size)[None, :], plugged]
+        return np.take_along_axis(permutations, scrambled, axis=1)
+
+    def climb_rings(self, key: dict, permutation):
+        """
+        Tries every ring setting of the fast and then the middle rotor, moving the start position with the ring
+        so the wiring stays aligned and only the turnover point changes.
+        """
+        best_key, best_score = key, self.fitness(self.decrypt(scrambler(key, self.ciphertext.size), permutation))[0]
+        for slot in (-1, -2):
+            current = best_key
+            for ring in range(1, ALPHABET_SIZE + 1):
+                rings = list(current["ring_setting"])
+                positions = list(current["initial_positions"])
+                shift = ring - rings[slot]
+                rings[slot] = ring
+                positions[slot] = ALPHABET[(ALPHABET.index(positions[slot]) + shift) % ALPHABET_SIZE]
+                candidate = {**current, "ring_setting": rings, "initial_positions": "".join(positions)}
+                decrypt = self.decrypt(scrambler(candidate, self.ciphertext.size), permutation)
+                score = self.fitness(decrypt)[0]
+                if score > best_score:
+                    best_key, best_score = candidate, score
+        return best_key
+
+    def plug_moves(self, permutation):
+        """Every plugboard reachable by connecting (or disconnecting) one pair of letters."""
+        plugs = sum(1 for x, y in enumerate(permutation) if x < y)
+        moves = []
+        for a, b in itertools.combinations(range(ALPHABET_SIZE), 2):
+            move = permutation.copy()
+            connected = move[a] == b
+            for letter in (a, b):
+                partner = move[letter]
+                move[letter], move[partner] = letter, partner
+            if not connected:
+                if plugs - (permutation[a] != a) - (permutation[b] != b) >= self.max_plugs:
+                    continue
+                move[a], move[b] = b, a
+            moves.append(move)
+        return np.array(moves)
+
+    def climb_plugboard(self, key: dict, report=None):
+        """
+        Greedily applies the single plug change that improves the score most, until none does.
+
+        :returns: ``(score, permutation)`` of the best plugboard found.
+        """
+        scramble = scrambler(key, self.ciphertext.size)
+        permutation = np.arange(ALPHABET_SIZE)
+        decrypt = self.decrypt(scramble, permutation)[0]
+        score = self.fitness(decrypt)
+
+        while True:
+            moves = self.plug_moves(permutation)
+            decrypts = self.decrypt(scramble, moves)
+            if self.scorer:
+                scores = self.scorer.rescore(score, decrypt, decrypts)
+            else:
+                scores = index_of_coincidence(decrypts)
+            best = int(np.argmax(scores))
+            if scores[best] <= score:
+                return float(score), permutation
+            permutation, decrypt, score = moves[best], decrypts[best], scores[best]
+            if report:
+                report(self.candidate(key, permutation, score, decrypt))
+
+    def candidate(self, key, permutation, score, decrypt):
+        return {
+            "key": {**key, "plug_combinations": plug_combinations(permutation)},
+            "score": float(score),
+            "plaintext": to_message(decrypt),
+        }
+
+    def climb(self, key: dict, report=None):
+        """
+        Stage 2 for one candidate: rings, then plugboard, then the rings again with the plugboard in place.
+
+        :returns: The best candidate found, as a dict with ``key``, ``score`` and ``plaintext``.
+        :rtype: dict
+        """
+        identity = np.arange(ALPHABET_SIZE)
+        key = self.climb_rings(key, identity)
+        score, permutation = self.climb_plugboard(key, report)
+        key = self.climb_rings(key, permutation)
+        decrypt = self.decrypt(scrambler(key, self.ciphertext.size), permutation)[0]
+        return self.candidate(key, permutation, self.fitness(decrypt), decrypt)
+
+    def run(self, workers: int = None, top: int = 10, report=None, cancel=None):
+        """
+        Runs both stages over a process pool.
+
+        :param workers: Number of worker processes, defaults to the number of CPUs.
+        :param top: Number of stage 1 candidates kept per rotor order and reflector, and climbed in stage 2.
+        :param report: Called with each candidate (see :meth:`climb`) that beats the best one so far.
+        :param cancel: Object with an ``is_set()`` method; when set, the attack returns what it has so far.
+        :returns: The climbed candidates, best first.
+        :rtype: list[dict]
+        """
+        workers = workers or os.cpu_count() or 1
+        ranked = []
+        results = []
+        with ProcessPoolExecutor(workers) as pool:
+            futures = [pool.submit(self.rank_start_positions, order, reflector, top)
+                       for order in self.rotor_orders for reflector in self.reflectors]
+            for future in as_completed(futures):
+                if cancel is not None and cancel.is_set():
+                    pool.shutdown(cancel_futures=True)
+                    return results
+                ranked.extend(future.result())
+
+            ranked.sort(key=lambda candidate: candidate[0], reverse=True)
+            best_score = None
+            futures = [pool.submit(self.climb, key) for _, key in ranked[:top]]
+            for future in as_completed(futures):
+                if cancel is not None and cancel.is_set():
+                    pool.shutdown(cancel_futures=True)
+                    break
+                result = future.result()
+                results.append(result)
+                if report and (best_score is None or result["score"] > best_score):
+                    best_score = result["score"]
+                    report(result)
+
+        return sorted(results, key=lambda result: result["score"], reverse=True)
@@ -0,0 +1,319 @@
+"""
+Catalogue of Rejewski characteristics.
+
+When the message key is enciphered twice at the start of each message (the indicator), the first and fourth
+letters of every indicator are linked by the permutation ``A4 A1``, where ``Ai`` is the scrambler at the i-th key
+press, and likewise for ``A5 A2`` and ``A6 A3``. Each ``Ai`` is a fixed-point-free involution, so the cycles of these
+products come in pairs of equal length, and the plugboard only conjugates them, which leaves the cycle lengths
+unchanged. The three cycle structures, each a partition of 13 (the lengths of one cycle of every pair), are the
+*characteristic* of the day's rotor order, reflector and start position.
+
+:func:`build_index` computes the characteristic of every start position of every rotor order and reflector (ring
+settings at 1, no plugboard) and writes them to a binary file, sorted by characteristic:
+
+- ``MAGIC``, then the length of a JSON header and the header itself (version, number of entries, rotor slots and,
+  for each rotor order and reflector, its :func:`enigma.cache.configuration_key`), padded to 8 bytes
+- one ``uint32`` key per entry (:func:`characteristic_key`), sorted
+- one record per entry (:data:`RECORD`): the group (rotor order and reflector) and the start position
+
+:class:`CycleIndex` memory-maps the file and finds the entries of a characteristic with a binary search. Rebuilding
+an existing file only recomputes the groups that are new or whose wiring hash changed.
+
+Command line::
+
+    python -m enigma.cycles cycles.bin --rotors I II III IV V --reflectors B C
+"""
+import argparse
+import itertools
+import json
+import os
+import struct
+import tempfile
+
+import numpy as np
+
+from enigma.cache import configuration_key
+from enigma.enigma import ALPHABET, ALPHABET_SIZE, Enigma
+from enigma.search import DEFAULT_REFLECTORS, DEFAULT_ROTORS
+from enigma.vectorized import MachineTables, to_indices
+
+MAGIC = b"ENIGCYCL"
+VERSION = 1
+RECORD = np.dtype([("group", "<u2"), ("position", "<u4")])
+PAIRS = ALPHABET_SIZE // 2
+
+
+def partitions(total: int, largest: int = None):
+    """All partitions of ``total`` as tuples of parts in descending order, in reverse lexicographic order."""
+    largest = total if largest is None else largest
+    if not total:
+        return [()]
+    return [(part, *rest) for part in range(min(total, largest), 0, -1) for rest in partitions(total - part, part)]
+
+
+PARTITIONS = tuple(partitions(PAIRS))
+PARTITION_IDS = {partition: index for index, partition in enumerate(PARTITIONS)}
+
+# Each partition as the number of parts of each length 1-13, read as a base-14 number
+_RADIX = (PAIRS + 1) ** np.arange(PAIRS, dtype=np.int64)
+_CODES = np.array([sum(int(_RADIX[part - 1]) for part in partition) for partition in PARTITIONS], dtype=np.int64)
+_ORDER = np.argsort(_CODES)
+
+
+def cycle_lengths(permutations):
+    """
+    Length of the cycle through each element of each permutation.
+
+    :param permutations: Array of permutations of 0-25 along the last axis.
+    :rtype: numpy.ndarray
+    """
+    permutations = np.asarray(permutations, dtype=np.intp)
+    identity = np.arange(permutations.shape[-1])
+    current = permutations
+    lengths = np.ones(permutations.shape, dtype=np.int64)
+    done = current == identity
+    for length in range(2, permutations.shape[-1] + 1):
+        if done.all():
+            break
+        current = np.take_along_axis(permutations, current, axis=-1)
+        found = ~done & (current == identity)
+        lengths[found] = length
+        done |= found
+    return lengths
+
+
+def partition_ids(permutations):
+    """
+    Index in :data:`PARTITIONS` of the paired cycle structure of each permutation.
+
+    :param permutations: Array of shape ``(n, 26)`` of products of two fixed-point-free involutions.
+    :rtype: numpy.ndarray
+    :raises ValueError: If a permutation's cycles don't come in pairs of equal length.
+    """
+    lengths = cycle_lengths(permutations)
+    rows = np.arange(len(lengths))[:, None] * (ALPHABET_SIZE + 1)
+    elements = np.bincount((rows + lengths).ravel(), minlength=len(lengths) * (ALPHABET_SIZE + 1))
+    elements = elements.reshape(len(lengths), ALPHABET_SIZE + 1)
+
+    sizes = np.arange(1, PAIRS + 1)
+    pairs, remainder = np.divmod(elements[:, 1:PAIRS + 1], 2 * sizes)
+    if remainder.any() or elements[:, PAIRS + 1:].any():
+        raise ValueError("Not a product of two fixed-point-free involutions: the cycles are not paired.")
+    codes = pairs @ _RADIX
+    return _ORDER[np.searchsorted(_CODES[_ORDER], codes)]
+
+
+def characteristic_key(characteristic):
+    """
+    Packs a characteristic, three partitions of 13 (e.g. ``((13,), (10, 3), (6, 6, 1))``), into one int.
+    """
+    first, second, third = (PARTITION_IDS[tuple(sorted(partition, reverse=True))] for partition in characteristic)
+    return (first * len(PARTITIONS) + second) * len(PARTITIONS) + third
+
+
+def characteristic_from_indicators(indicators):
+    """
+    Reconstructs the characteristic of a day from its doubled, enciphered message keys.
+
+    :param indicators: Six-letter indicators, each the encryption of a three-letter key typed twice.
+    :returns: Three partitions of 13: the paired cycle lengths of ``A4 A1``, ``A5 A2`` and ``A6 A3``.
+    :rtype: tuple
+    :raises ValueError: If the indicators are inconsistent or don't cover all 26 letters of each product.
+    """
+    products = np.full((3, ALPHABET_SIZE), -1, dtype=np.int64)
+    for indicator in indicators:
+        letters = to_indices(indicator)
+        if letters.size != 6:
+            raise ValueError(f"Invalid indicator: {indicator}. Must be 6 letters.")
+        for product, (source, target) in enumerate(zip(letters[:3], letters[3:])):
+            if products[product, source] not in (-1, target):
+                raise ValueError(f"Inconsistent indicators: {ALPHABET[source]} maps to both "
+                                 f"{ALPHABET[products[product, source]]} and {ALPHABET[target]}.")
+            products[product, source] = target
+
+    for product in products:
+        if (product < 0).any() or np.unique(product).size != ALPHABET_SIZE:
+            raise ValueError("The indicators don't determine the permutations: more indicators are needed.")
+    return tuple(PARTITIONS[index] for index in partition_ids(products))
+
+
+def characteristics(rotor_order, reflector: str):
+    """
+    Characteristic keys of every start position of one rotor order and reflector (ring settings at 1).
+
+    :returns: One key per start position, indexed like ``np.indices((26,) * len(rotor_order))`` flattened with the
+        fast rotor first (see :func:`position_letters`).
+    :rtype: numpy.ndarray
+    """
+    slots = len(rotor_order)
+    machine = Enigma(rotor_sequence=list(rotor_order), reflector=reflector, ring_setting=[1] * slots,
+                     initial_positions="A" * slots)
+    tables = MachineTables(machine)
+    starts = [start[:, None] for start in np.indices((ALPHABET_SIZE,) * slots).reshape(slots, -1)]
+    pins = np.arange(ALPHABET_SIZE, dtype=np.uint8)[None, :]
+    scramblers = [tables.encode(pins, tables.positions([*starts, 0], press)).astype(np.intp)
+                  for press in range(1, 7)]
+
+    key = np.zeros(len(starts[0]), dtype=np.int64)
+    for first, fourth in zip(scramblers[:3], scramblers[3:]):
+        key = key * len(PARTITIONS) + partition_ids(np.take_along_axis(fourth, first, axis=-1))
+    return key.astype(np.uint32)
+
+
+def position_letters(position: int, slots: int):
+    """Start position number from :func:`characteristics` as ``initial_positions`` (leftmost rotor first)."""
+    return "".join(ALPHABET[index] for index in reversed(np.unravel_index(position, (ALPHABET_SIZE,) * slots)))
+
+
+def read_header(mapped):
+    if bytes(mapped[:len(MAGIC)]) != MAGIC:
+        raise ValueError("Not a cycle index file.")
+    (length,) = struct.unpack_from("<I", mapped, len(MAGIC))
+    start = len(MAGIC) + 4
+    header = json.loads(bytes(mapped[start:start + length]))
+    if header["version"] != VERSION:
+        raise ValueError(f"Unsupported cycle index version: {header['version']}.")
+    return header, -(-(start + length) // 8) * 8
+
+
+class CycleIndex:
+    """
+    Read-only, memory-mapped view of a file written by :func:`build_index`.
+
+    :ivar groups: The indexed rotor orders and reflectors, as header entries with ``rotors``, ``reflector`` and
+        ``hash``.
+    :type groups: list[dict]
+    :ivar keys: Sorted characteristic keys.
+    :type keys: numpy.memmap
+    :ivar records: Group and start position of each key.
+    :type records: numpy.memmap
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as index_file:
+            header, offset = read_header(index_file.read(1 << 20))
+        self.slots = header["slots"]
+        self.groups = header["groups"]
+        count = header["count"]
+        self.keys = np.memmap(path, dtype="<u4", mode="r", offset=offset, shape=(count,)) if count else \
+            np.empty(0, dtype="<u4")
+        self.records = np.memmap(path, dtype=RECORD, mode="r", offset=offset + 4 * count, shape=(count,)) if count \
+            else np.empty(0, dtype=RECORD)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def span(self, characteristic):
+        key = characteristic if isinstance(characteristic, (int, np.integer)) else characteristic_key(characteristic)
+        return np.searchsorted(self.keys, key, "left"), np.searchsorted(self.keys, key, "right")
+
+    def count(self, characteristic):
+        """Number of start positions with ``characteristic`` (a key or three partitions)."""
+        start, end = self.span(characteristic)
+        return int(end - start)
+
+    def lookup(self, characteristic):
+        """
+        Every indexed setting with ``characteristic`` (a key or three partitions).
+
+        :returns: The settings, as keyword arguments for :class:`Enigma` (ring settings at 1, no plugboard).
+        :rtype: list[dict]
+        """
+        start, end = self.span(characteristic)
+        keys = []
+        for group, position in self.records[start:end].tolist():
+            rotors, reflector = self.groups[group]["rotors"], self.groups[group]["reflector"]
+            keys.append({
+                "rotor_sequence": list(rotors),
+                "reflector": reflector,
+                "ring_setting": [1] * self.slots,
+                "initial_positions": position_letters(position, self.slots),
+                "plug_combinations": None,
+            })
+        return keys
+
+
+def build_index(path, rotors=DEFAULT_ROTORS, reflectors=DEFAULT_REFLECTORS, slots: int = 3, rotor_orders=None):
+    """
+    Writes (or updates) the characteristic catalogue of the given rotor orders and reflectors at ``path``.
+
+    Groups already in an existing file with the same slots and wiring hash are copied over instead of being
+    recomputed, and groups that are no longer requested are dropped. The file is replaced atomically.
+
+    :param rotor_orders: Rotor orders to index, leftmost rotor first. Defaults to every ordered choice of ``slots``
+        of ``rotors``.
+    :returns: ``{"groups": ..., "built": ..., "reused": ..., "entries": ...}``.
+    :rtype: dict
+    """
+    rotor_orders = [list(order) for order in rotor_orders or itertools.permutations(rotors, slots)]
+    slots = len(rotor_orders[0])
+    groups = []
+    for rotor_order, reflector in itertools.product(rotor_orders, reflectors):
+        machine = Enigma(rotor_sequence=rotor_order, reflector=reflector, ring_setting=[1] * slots,
+                         initial_positions="A" * slots)
+        groups.append({"rotors": rotor_order, "reflector": reflector, "hash": configuration_key(machine)})
+
+    previous = {}
+    if os.path.exists(path):
+        try:
+            existing = CycleIndex(path)
+        except (ValueError, KeyError):
+            existing = None
+        if existing is not None and existing.slots == slots:
+            for number, group in enumerate(existing.groups):
+                previous[(tuple(group["rotors"]), group["reflector"], group["hash"])] = (existing, number)
+
+    keys, records, built = [], [], 0
+    for number, group in enumerate(groups):
+        source = previous.get((tuple(group["rotors"]), group["reflector"], group["hash"]))
+        if source is not None:
+            existing, old_number = source
+            selected = existing.records["group"] == old_number
+            group_keys = np.array(existing.keys[selected])
+            positions = np.array(existing.records["position"][selected])
+        else:
+            group_keys = characteristics(group["rotors"], group["reflector"])
+            positions = np.arange(group_keys.size, dtype=np.uint32)
+            built += 1
+        keys.append(group_keys)
+        group_records = np.empty(group_keys.size, dtype=RECORD)
+        group_records["group"] = number
+        group_records["position"] = positions
+        records.append(group_records)
+
+    keys = np.concatenate(keys)
+    records = np.concatenate(records)
+    order = np.lexsort((records["position"], records["group"], keys))
+    keys, records = keys[order], records[order]
+
+    header = json.dumps({"version": VERSION, "count": int(keys.size), "slots": slots, "groups": groups}).encode()
+    prefix = MAGIC + struct.pack("<I", len(header)) + header
+    prefix += b"\0" * (-len(prefix) % 8)
+
+    directory = os.path.dirname(os.path.abspath(path))
+    handle, temporary = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(handle, "wb") as output:
+            output.write(prefix)
+            output.write(keys.astype("<u4").tobytes())
+            output.write(records.tobytes())
+        os.replace(temporary, path)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+    return {"groups": len(groups), "built": built, "reused": len(groups) - built, "entries": int(keys.size)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m enigma.cycles",
+                                     description="Build or update a catalogue of Rejewski characteristics.")
+    parser.add_argument("path", help="index file to write")
+    parser.add_argument("--rotors", nargs="+", default=list(DEFAULT_ROTORS))
+    parser.add_argument("--reflectors", nargs="+", default=list(DEFAULT_REFLECTORS))
+    parser.add_argument("--slots", type=int, default=3)
+    args = parser.parse_args(argv)
+    print(json.dumps(build_index(args.path, args.rotors, args.reflectors, args.slots)))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,9 @@
 import string
+from functools import lru_cache
 from typing import Any
 
+from enigma import metrics
+
 mappings = {
     "Beta": "LEYJVCNIXWPBQMDRTAKZGFUHOS",
     "Gamma": "FSOKANUERHMBTIYCWLQPZXVGJD",
@@ -28,7 +31,75 @@ notch_map = {
     "V": "Z"
 }
 
+ALPHABET = string.ascii_uppercase
 ALPHABET_SIZE = 26
+ALPHABET_INDEX = {character: index for index, character in enumerate(ALPHABET)}
+IDENTITY = bytes(range(ALPHABET_SIZE))
+
+
+@lru_cache(maxsize=None)
+def compile_wiring(wiring, ring_setting=1):
+    """
+    Compiles a wiring string into forward and inverse integer tables with the ring setting folded in.
+
+    With ``r = ring_setting - 1`` the forward table satisfies
+    ``forward[x] == (wiring[(x - r) % 26] + r) % 26``, so a rotor at ``position`` maps
+    ``pin -> (forward[(pin + position) % 26] - position) % 26``. The inverse table is built the same way
+    from the inverse wiring. The tables are immutable and cached, so all rotors with the same wiring and ring
+    setting share them.
+
+    :param wiring: 26 letter permutation of the alphabet.
+    :param ring_setting: The 1-based ring setting (Ringstellung).
+    :returns: A tuple of two 26 entry tuples ``(forward, inverse)``.
+    :rtype: tuple[tuple[int, ...], tuple[int, ...]]
+    """
+    offset = ring_setting - 1
+    wired = [ALPHABET_INDEX[character] for character in wiring]
+    inverse_wired = [0] * ALPHABET_SIZE
+    for pin, contact in enumerate(wired):
+        inverse_wired[contact] = pin
+
+    forward = tuple((wired[(x - offset) % ALPHABET_SIZE] + offset) % ALPHABET_SIZE for x in range(ALPHABET_SIZE))
+    inverse = tuple((inverse_wired[(x - offset) % ALPHABET_SIZE] + offset) % ALPHABET_SIZE
+                    for x in range(ALPHABET_SIZE))
+    return forward, inverse
+
+
+def notch_passes(start, steps, notch):
+    """
+    Counts how often a rotor starting at ``start`` leaves its ``notch`` position during ``steps`` steps.
+
+    Works element-wise on NumPy arrays as well as on ints, since it only uses ``+``, ``-``, ``%`` and ``//``.
+    """
+    return (steps - (notch - start) % ALPHABET_SIZE + ALPHABET_SIZE - 1) // ALPHABET_SIZE
+
+
+def advance_positions(positions, steps, rotating, notches):
+    """
+    Closed form of ``steps`` calls to :meth:`Enigma.rotate`, starting from ``positions``.
+
+    The fast rotor steps on every key press and every rotor carries into the next one each time it steps
+    away from its notch, so the number of steps of each rotor is the number of notch passes of the rotor
+    before it. The double-step branch of :meth:`Enigma.rotate` looks at ``input_ring.prev_rotor``, which
+    :meth:`Enigma.connect_rotors` never sets for the fast rotor, so carrying is the only stepping rule.
+    ``positions`` and ``steps`` may be ints or broadcastable NumPy arrays.
+
+    :param positions: Start position of each rotor, fast rotor first (reflector included).
+    :param steps: Number of key presses to advance.
+    :param rotating: For each rotor, whether it moves at all (see :attr:`Rotor.can_rotate`).
+    :param notches: For each rotor, the notch position that carries into the next rotor, or None.
+    :returns: The positions after ``steps`` key presses.
+    :rtype: list
+    """
+    result = []
+    for position, can_rotate, notch in zip(positions, rotating, notches):
+        if not can_rotate:
+            result.append(position)
+            steps = 0
+            continue
+        result.append((position + steps) % ALPHABET_SIZE)
+        steps = notch_passes(position, steps, notch) if notch is not None else 0
+    return result
 
 
 class PlugLead:
@@ -42,10 +113,12 @@ class PlugLead:
         characters.
     :type map_dict: dict
     """
+    __slots__ = ("map_dict",)
 
     def __init__(self, mapping):
-        if len(mapping.split()) > 2:
-            raise ValueError("Plug mapping should only contain 2 characters")
+        mapping = mapping.upper()
+        if len(mapping) != 2 or mapping[0] == mapping[1] or any(c not in ALPHABET_INDEX for c in mapping):
+            raise ValueError(f"Invalid plug mapping: {mapping}. Must be 2 different English letters.")
         self.map_dict = {x: y for x, y in zip(mapping, reversed(mapping))}
 
     def encode(self, character):
@@ -57,24 +130,48 @@ class Plugboard:
     Represents a plugboard component in an Enigma machine.
 
     It allows the dynamic addition of plug leads and provides character encoding
-    functionality by routing each character through all plug leads.
+    functionality. The leads are folded into a single 26 entry permutation whenever one is added,
+    so encoding is one lookup regardless of the number of leads. The permutation is the only state kept:
+    the leads and the translation table used by :meth:`encode` are derived from it on demand, the latter
+    being shared by every plugboard with the same leads.
 
-    :ivar plugs: List of plug leads added to the plugboard.
-    :type plugs: list[PlugLead]
+    :ivar permutation: Letter index each letter index is swapped with (itself if unplugged).
+    :type permutation: bytes
     """
+    __slots__ = ("permutation",)
+
     def __init__(self, plug_combinations=None):
-        self.plugs = []
+        self.permutation = IDENTITY
         if plug_combinations:
             for plug_combination in plug_combinations:
                 self.add(PlugLead(plug_combination))
 
+    @property
+    def plugs(self):
+        """The plug leads, rebuilt from the permutation."""
+        return [PlugLead(ALPHABET[x] + ALPHABET[y]) for x, y in enumerate(self.permutation) if x < y]
+
     def add(self, plug):
-        self.plugs.append(plug)
+        for character in plug.map_dict:
+            if self.permutation[ALPHABET_INDEX[character]] != ALPHABET_INDEX[character]:
+                raise ValueError(f"Invalid plug lead: {character} is already plugged.")
+
+        permutation = bytearray(self.permutation)
+        for x, y in plug.map_dict.items():
+            permutation[ALPHABET_INDEX[x]] = ALPHABET_INDEX[y]
+        self.permutation = bytes(permutation)
+
+    def encode_index(self, index):
+        return self.permutation[index]
 
     def encode(self, character):
-        for plug in self.plugs:
-            character = plug.encode(character)
-        return character
+        return character.translate(translation_table(self.permutation))
+
+
+@lru_cache(maxsize=1024)
+def translation_table(permutation: bytes):
+    """:meth:`str.translate` table of a plugboard permutation."""
+    return {ord(ALPHABET[x]): ord(ALPHABET[y]) for x, y in enumerate(permutation) if x != y}
 
 
 class Notch:
@@ -87,6 +184,8 @@ class Notch:
     :ivar position: The numeric index (0-based) of the position_letter in the alphabet.
     :type position: int
     """
+    __slots__ = ("position_letter", "position")
+
     def __init__(self, position_letter: str = "A"):
         self.position_letter = position_letter
         self.position = string.ascii_uppercase.index(position_letter)
@@ -103,7 +202,14 @@ class Rotor:
     the rotation of the next rotor when crossing specific positions.
 
     Reflectors within the Enigma machine are also of class Rotor.
+
+    The wiring is compiled once on construction into the integer tables ``forward`` and ``inverse``
+    (see :func:`compile_wiring`), so the ``encode_index_*`` methods used on the hot path only do list
+    lookups and modular arithmetic on 0-25 ints.
     """
+    __slots__ = ("name", "location", "ring_setting", "notch", "position", "initial_position", "forward", "inverse",
+                 "next_rotor", "prev_rotor")
+
     def __init__(self, name, location=0, ring_setting=1, initial_position="A"):
         self.name = name
         self.location = location
@@ -111,6 +217,7 @@ class Rotor:
         self.notch = Notch(notch_map[name]) if name in notch_map else None
         self.position: int = string.ascii_uppercase.index(initial_position)
         self.initial_position = string.ascii_uppercase.index(initial_position)
+        self.forward, self.inverse = compile_wiring(self.mapping, ring_setting)
 
         self.next_rotor = None
         self.prev_rotor = None
@@ -127,6 +234,20 @@ class Rotor:
     def is_at_notch(self):
         return self.notch.position == self.position
 
+    @property
+    def can_rotate(self):
+        # Rotors I-V and the Beta/Gamma rotors move, reflectors never do
+        return self.has_notch or self.name in ['Beta', 'Gamma']
+
+    @property
+    def carry_notch(self):
+        """The notch position that steps the next rotor, or None if this rotor never carries."""
+        return self.notch.position if self.name not in ['Beta', 'Gamma'] and self.has_notch else None
+
+    @property
+    def position_letter(self):
+        return ALPHABET[self.position]
+
     @property
     def get_relative_position(self):
         return self.position % ALPHABET_SIZE
@@ -141,41 +262,28 @@ class Rotor:
         self.next_rotor = next_rotor
         self.prev_rotor = prev_rotor
 
-    def encode_right_to_left(self, character):
-        pin_pos = string.ascii_uppercase.index(character)
-
-        pin_pos = (pin_pos + self.position - (self.ring_setting - 1)) % ALPHABET_SIZE
-        contact_char = self.mapping[pin_pos]
+    def encode_index_right_to_left(self, index):
+        position = self.position
+        return (self.forward[(index + position) % ALPHABET_SIZE] - position) % ALPHABET_SIZE
 
-        contact_pos = string.ascii_uppercase.index(contact_char)
-        contact_pos = (contact_pos + (self.ring_setting - 1)) % ALPHABET_SIZE
+    def encode_index_left_to_right(self, index):
+        position = self.position
+        return (self.inverse[(index + position) % ALPHABET_SIZE] - position) % ALPHABET_SIZE
 
-        contact_pos = (contact_pos - self.position) % ALPHABET_SIZE
-        return string.ascii_uppercase[contact_pos]
+    def encode_right_to_left(self, character):
+        return ALPHABET[self.encode_index_right_to_left(ALPHABET_INDEX[character])]
 
     def encode_left_to_right(self, character):
-        contact_pos = string.ascii_uppercase.index(character)
-        contact_pos = (contact_pos + self.position - (self.ring_setting - 1)) % ALPHABET_SIZE
-
-        char_in_alphabet = string.ascii_uppercase[contact_pos]
-        pin_pos = self.mapping.index(char_in_alphabet)
-
-        pin_pos = (pin_pos + (self.ring_setting - 1)) % ALPHABET_SIZE
-        pin_pos = (pin_pos - self.position) % ALPHABET_SIZE
-
-        return string.ascii_uppercase[pin_pos]
+        return ALPHABET[self.encode_index_left_to_right(ALPHABET_INDEX[character])]
 
     def rotate(self):
         """
         Rotates current within the machine depending on its position, type and notch.
         Don't rotate if this is a reflector (reflectors don't have notches)
         """
-        # TODO: implement this check using a property of the rotor
-        if not self.has_notch and self.name not in ['Beta', 'Gamma']:
+        if not self.can_rotate:
             return
 
-        # Store position before rotation for notch checking
-        self.initial_position = self.position
         if self.should_trigger_next_rotor and self.next_rotor:
             self.next_rotor.rotate()
         # Perform rotation
@@ -213,7 +321,13 @@ class Enigma:
     :type reflector: str
     :ivar plugboard: Plugboard instance representing the plugboard connections.
     :type plugboard: Plugboard
+    :ivar start_positions: Rotor positions the machine was configured with (offset 0).
+    :type start_positions: tuple
+    :ivar offset: Number of characters encoded since the start positions.
+    :type offset: int
     """
+    __slots__ = ("rotors", "positions", "reflector", "plugboard", "start_positions", "offset")
+    @metrics.timed("construct")
     def __init__(
             self,
             rotor_sequence: list,
@@ -223,13 +337,15 @@ class Enigma:
             plug_combinations: list = None,
     ):
         if ring_setting is None:
-            ring_setting = [1, 1, 1]
+            ring_setting = [1] * len(rotor_sequence)
 
         self.rotors = []
         self.positions = "".join(reversed(initial_positions))
         self.reflector = reflector
         self.init_rotors(rotor_sequence, list(reversed(ring_setting)))
         self.connect_rotors()
+        self.start_positions = self.rotor_positions
+        self.offset = 0
 
         self.plugboard = Plugboard(plug_combinations)
 
@@ -245,9 +361,85 @@ class Enigma:
     def rotor_positions(self) -> tuple[Any, ...]:
         return tuple(rotor.position for rotor in self.rotors)
 
+    @property
+    def position_letters(self) -> str:
+        """Rotor positions as letters, leftmost rotor first (the same layout as ``initial_positions``)."""
+        return "".join(rotor.position_letter for rotor in reversed(self.rotors[:-1]))
+
+    def advance(self, positions, steps):
+        """
+        Returns the rotor positions reached from ``positions`` after ``steps`` key presses, without stepping
+        the machine. See :func:`advance_positions`.
+        """
+        return tuple(advance_positions(positions, steps,
+                                       [rotor.can_rotate for rotor in self.rotors],
+                                       [rotor.carry_notch for rotor in self.rotors]))
+
+    def state_at(self, offset: int):
+        """
+        Computes the rotor positions used to encode the character at ``offset`` (0-based) of a message started
+        from :attr:`start_positions`, in constant time.
+
+        The rotors are stepped before each character is encoded, so this is the state after ``offset + 1``
+        calls to :meth:`rotate`.
+
+        :param offset: Index of the character in the message.
+        :returns: The rotor positions, in the same layout as :attr:`rotor_positions`.
+        :rtype: tuple
+        """
+        if offset < 0:
+            raise ValueError(f"Invalid offset: {offset}. Must be zero or positive.")
+        return self.advance(self.start_positions, offset + 1)
+
+    def seek(self, offset: int):
+        """
+        Moves the machine forwards or backwards so that the next encoded character is the one at ``offset``
+        of a message started from :attr:`start_positions`.
+
+        :param offset: Index of the next character to encode.
+        """
+        if offset < 0:
+            raise ValueError(f"Invalid offset: {offset}. Must be zero or positive.")
+        for rotor, position in zip(self.rotors, self.advance(self.start_positions, offset)):
+            rotor.position = position
+        self.offset = offset
+
     def reset(self):
         for rotor in self.rotors:
             rotor.position = rotor.initial_position
+        self.offset = 0
+
+    def snapshot(self) -> int:
+        """
+        Packs the machine state (rotor positions and offset) into a single int: the positions as base-26 digits,
+        fast rotor first, followed by the offset. Restore it with :meth:`restore` on a machine with the same
+        configuration.
+        """
+        state = self.offset
+        for rotor in reversed(self.rotors):
+            state = state * ALPHABET_SIZE + rotor.position
+        return state
+
+    def restore(self, state: int):
+        """
+        Restores a state returned by :meth:`snapshot`.
+        """
+        for rotor in self.rotors:
+            state, rotor.position = divmod(state, ALPHABET_SIZE)
+        self.offset = state
+
+    def checkpoint(self) -> bytes:
+        """
+        Serialises :meth:`snapshot` into a few bytes (little-endian), e.g. to resume a long message after a crash.
+        """
+        state = self.snapshot()
+        return state.to_bytes(max(1, (state.bit_length() + 7) // 8), "little")
+
+    def restore_checkpoint(self, checkpoint: bytes):
+        """
+        Restores a state returned by :meth:`checkpoint`.
+        """
+        self.restore(int.from_bytes(checkpoint, "little"))
 
     def init_rotors(self, rotor_sequence, ring_setting):
         for index, rotor_name in enumerate(reversed(rotor_sequence)):
@@ -281,22 +473,22 @@ class Enigma:
         self.validate_character(character)
 
         # Initial plugboard encoding
-        character = self.plugboard.encode(character)
+        permutation = self.plugboard.permutation
+        index = permutation[ALPHABET_INDEX[character]]
 
         # Rotate before encoding
         self.rotate()
 
         # Forward pass through rotors
         for rotor in self.rotors:
-            character = rotor.encode_right_to_left(character)
+            index = rotor.encode_index_right_to_left(index)
 
         # Backward pass through rotors (excluding reflector)
         for rotor in reversed(self.rotors[:-1]):
-            character = rotor.encode_left_to_right(character)
-
+            index = rotor.encode_index_left_to_right(index)
 
         # Final plugboard encoding
-        return self.plugboard.encode(character)
+        return ALPHABET[permutation[index]]
 
     def decode_character(self, character: str):
         """
@@ -304,6 +496,7 @@ class Enigma:
         """
         return self.encode_character(character)
 
+    @metrics.timed("encode")
     def encode(self, message: str):
         """
         Encodes a given message by converting each character to its respective encoded value.
@@ -313,10 +506,13 @@ class Enigma:
         :return: A string representing the encoded message.
         :rtype: str
         """
+        start_positions = self.rotor_positions if metrics.enabled else None
         encoded_message = ""
         for c in message:
-            encoded_message += str(self.encode_character(c.upper()))
+            encoded_message += self.encode_character(c)
 
+        if start_positions is not None:
+            metrics.record_encode(self, len(message), start_positions)
         return encoded_message
 
     def decode(self, message, reset_rotors: bool = False):
@@ -326,7 +522,7 @@ class Enigma:
         return self.encode(message)
 
     def validate_character(self, character):
-        if not character.isalpha() or not character.isupper():
+        if character not in ALPHABET_INDEX:
             raise ValueError(f"Invalid character: {character}. Must be an uppercase English letter.")
 
     def rotate(self):
@@ -344,6 +540,7 @@ class Enigma:
         # This will trigger cascading rotation through notches
         # Note: the Rotor.rotate() method contains a check if the rotor type is a rotating rotor (I-V)
         self.input_ring.rotate()
+        self.offset += 1
 
 
 if __name__ == "__main__":
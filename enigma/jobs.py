@@ -0,0 +1,437 @@
+"""
+Background jobs for work too long for a request: bulk encrypts and key searches.
+
+Every job is split into units that run on a process pool: encrypts into chunks of the input, each encoded from its
+own letter offset with :meth:`Enigma.seek`, and searches into the shards of :class:`enigma.search.KnownPlaintextSearch`
+or :class:`enigma.bombe.Bombe`. A scheduler thread keeps at most ``workers`` units in flight and takes them from the
+clients in turn, so a client submitting many jobs doesn't starve the others.
+
+Job state is kept in ``directory``: ``<id>.json`` holds the parameters, status, completed units (as a bitmap) and
+search results, and encrypts keep their input and output in ``<id>.in`` and ``<id>.out``. The state is written at
+most every ``persist_interval`` seconds and on every status change, and unfinished jobs are resumed from their
+completed units when a queue is opened on the same directory.
+
+A queue runs in one process only: it holds an exclusive lock on ``directory`` (``directory/.lock``) until
+:meth:`JobQueue.close`, and opening a second queue on the same directory raises :class:`QueueLocked`, so two
+processes never resume and run the same jobs.
+"""
+import glob
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import numpy as np
+
+from enigma.bombe import Bombe
+from enigma.enigma import ALPHABET_SIZE
+from enigma.search import KnownPlaintextSearch
+from enigma.service import machine_from, plug_pairs
+from enigma.stream import encode_into
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+DEFAULT_CHUNK_SIZE = 1 << 20
+DEFAULT_PERSIST_INTERVAL = 1.0
+FINISHED = ("done", "failed", "cancelled")
+SEARCHES = {"search": KnownPlaintextSearch, "bombe": Bombe}
+CONFIGURATION_KEYS = ("rotors", "reflector", "rings", "positions", "plugboard")
+LOCK_FILE = ".lock"
+
+
+class QueueLocked(RuntimeError):
+    """Raised when the job directory is already used by a queue, in this process or another one."""
+
+
+def lock_directory(directory):
+    """
+    Takes an exclusive lock on ``directory``.
+
+    :returns: The open lock file; closing it releases the lock.
+    :raises QueueLocked: If the directory is already locked.
+    """
+    lock = open(os.path.join(directory, LOCK_FILE), "a+b")
+    try:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            msvcrt.locking(lock.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        lock.close()
+        raise QueueLocked(f"The job directory {directory} is used by another queue.") from None
+    return lock
+
+
+def encrypt_unit(configuration, chunk, offset):
+    """Encodes one chunk of an encrypt job, starting ``offset`` letters into the message."""
+    machine = machine_from(configuration)
+    machine.seek(offset)
+    output = bytearray(len(chunk))
+    encode_into(machine, chunk, output)
+    return bytes(output)
+
+
+def search_unit(kind, arguments, shard):
+    """Searches one shard of a search job."""
+    return SEARCHES[kind](**arguments).search_shard(shard)
+
+
+def search_arguments(kind, data):
+    """
+    Keyword arguments of the search class of ``kind`` from a job request.
+
+    :raises ValueError: If the request is invalid.
+    """
+    arguments = {"ciphertext": data.get("ciphertext"), "crib": data.get("crib"),
+                 "crib_offset": data.get("crib_offset", 0)}
+    if not isinstance(arguments["ciphertext"], str) or not isinstance(arguments["crib"], str):
+        raise ValueError("Expected a 'ciphertext' and a 'crib'")
+    for key in ("rotor_orders", "reflectors", "ring_settings"):
+        if key in data:
+            arguments[key] = data[key]
+    if kind == "search" and data.get("plugboard"):
+        arguments["plug_combinations"] = plug_pairs(data["plugboard"])
+    try:
+        search = SEARCHES[kind](**arguments)
+    except (KeyError, IndexError, TypeError) as error:
+        raise ValueError(f"Invalid search: {error}") from None
+    return arguments, search.shard_count
+
+
+def letter_offsets(data, chunk_size: int):
+    """Number of letters before each chunk of ``data``."""
+    data = np.frombuffer(data, dtype=np.uint8)
+    is_letter = ((data | 0x20) - ord("a")) < ALPHABET_SIZE
+    counts = np.add.reduceat(is_letter, np.arange(0, data.size, chunk_size)) if data.size else np.zeros(0, int)
+    return np.concatenate([[0], np.cumsum(counts)[:-1]]).astype(int).tolist()
+
+
+class Job:
+    """
+    State of one job.
+
+    :ivar done: Bitmap of the completed units.
+    :type done: bytearray
+    :ivar results: Keys found so far, for searches.
+    :type results: list
+    :ivar version: Incremented on every change, to wait for progress.
+    :type version: int
+    """
+    __slots__ = ("id", "client", "kind", "params", "status", "total", "done", "completed", "results", "error",
+                 "created", "updated", "version", "cursor", "prefix", "in_flight", "offsets", "persisted")
+    def __init__(self, job_id, client, kind, params, total, status="queued", done=None, results=None, error=None,
+                 created=None, updated=None):
+        self.id = job_id
+        self.client = client
+        self.kind = kind
+        self.params = params
+        self.status = status
+        self.total = total
+        self.done = bytearray((total + 7) // 8) if done is None else done
+        self.completed = sum(bin(byte).count("1") for byte in self.done)
+        self.results = results or []
+        self.error = error
+        self.created = created or time.time()
+        self.updated = updated or self.created
+        self.version = 0
+        self.cursor = 0
+        self.prefix = 0
+        self.in_flight = {}
+        self.offsets = None
+        self.persisted = 0.0
+        self.advance_prefix()
+
+    def is_done(self, unit):
+        return self.done[unit >> 3] >> (unit & 7) & 1
+
+    def mark_done(self, unit):
+        if not self.is_done(unit):
+            self.done[unit >> 3] |= 1 << (unit & 7)
+            self.completed += 1
+            self.advance_prefix()
+
+    def advance_prefix(self):
+        # Number of leading completed units, i.e. how much encrypt output is final
+        while self.prefix < self.total and self.is_done(self.prefix):
+            self.prefix += 1
+
+    def next_unit(self):
+        """The next unit to run, or None if every unit is done or in flight."""
+        if self.status in FINISHED:
+            return None
+        while self.cursor < self.total and (self.is_done(self.cursor) or self.cursor in self.in_flight):
+            self.cursor += 1
+        if self.cursor == self.total:
+            return None
+        self.cursor += 1
+        return self.cursor - 1
+
+    def summary(self):
+        return {"job_id": self.id, "client": self.client, "kind": self.kind, "status": self.status,
+                "completed": self.completed, "total": self.total,
+                "progress": self.completed / self.total if self.total else 1.0,
+                "results": len(self.results), "error": self.error, "created": self.created, "updated": self.updated}
+
+    def to_dict(self):
+        return {"id": self.id, "client": self.client, "kind": self.kind, "params": self.params,
+                "status": self.status, "total": self.total, "done": self.done.hex(), "results": self.results,
+                "error": self.error, "created": self.created, "updated": self.updated}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["id"], data["client"], data["kind"], data["params"], data["total"], data["status"],
+                   bytearray.fromhex(data["done"]), data["results"], data["error"], data["created"], data["updated"])
+
+
+class JobQueue:
+    """
+    Persistent queue of background jobs running on a process pool. Only one queue can be open on a directory.
+
+    :ivar workers: Maximum number of units running at once.
+    :type workers: int
+    :ivar chunk_size: Bytes of input per encrypt unit.
+    :type chunk_size: int
+    """
+    def __init__(self, directory, workers: int = None, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 persist_interval: float = DEFAULT_PERSIST_INTERVAL, executor=None):
+        """:raises QueueLocked: If another queue is open on ``directory``."""
+        os.makedirs(directory, exist_ok=True)
+        self.lock = lock_directory(directory)
+        self.directory = directory
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.persist_interval = persist_interval
+        self.executor = executor or ProcessPoolExecutor(self.workers)
+        self.jobs = OrderedDict()
+        # Clients with units left to schedule, in round-robin order, each with its jobs in submission order
+        self.clients = OrderedDict()
+        self.running = 0
+        self.closed = False
+        self.condition = threading.Condition()
+
+        self.load()
+        self.scheduler = threading.Thread(target=self.schedule, name="enigma-jobs", daemon=True)
+        self.scheduler.start()
+
+    def path(self, job_id, extension):
+        return os.path.join(self.directory, f"{job_id}.{extension}")
+
+    def load(self):
+        for path in sorted(glob.glob(os.path.join(self.directory, "*.json"))):
+            with open(path) as state:
+                job = Job.from_dict(json.load(state))
+            if job.kind == "encrypt":
+                with open(self.path(job.id, "in"), "rb") as source:
+                    job.offsets = letter_offsets(source.read(), job.params["chunk_size"])
+            if job.status not in FINISHED:
+                job.status = "queued"
+                self.clients.setdefault(job.client, deque()).append(job.id)
+            self.jobs[job.id] = job
+
+    def persist(self, job, force=False):
+        now = time.monotonic()
+        if not force and now - job.persisted < self.persist_interval:
+            return
+        job.persisted = now
+        handle, temporary = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(handle, "w") as state:
+            json.dump(job.to_dict(), state)
+        os.replace(temporary, self.path(job.id, "json"))
+
+    def submit(self, data, client: str = "anonymous"):
+        """
+        Queues a job.
+
+        :param data: ``{"kind": "encrypt", "text": ..., <machine configuration as for /init>}`` or
+            ``{"kind": "search" | "bombe", "ciphertext": ..., "crib": ..., "crib_offset": ..., ...}`` with the
+            optional ``rotor_orders``, ``reflectors``, ``ring_settings`` and, for ``"search"``, ``plugboard``.
+        :param client: Identifies the submitter for fair scheduling.
+        :returns: The job summary.
+        :rtype: dict
+        :raises ValueError: If the request is invalid.
+        """
+        if not isinstance(data, dict):
+            raise ValueError("Expected a JSON object")
+        kind = data.get("kind")
+        job_id = uuid.uuid4().hex
+        if kind == "encrypt":
+            text = data.get("text")
+            if not isinstance(text, str):
+                raise ValueError("Expected a 'text' to encrypt")
+            configuration = {key: data[key] for key in CONFIGURATION_KEYS if key in data}
+            machine_from(configuration)
+            source = text.encode("utf-8")
+            with open(self.path(job_id, "in"), "wb") as input_file:
+                input_file.write(source)
+            with open(self.path(job_id, "out"), "wb") as output_file:
+                output_file.truncate(len(source))
+            params = {"configuration": configuration, "size": len(source), "chunk_size": self.chunk_size}
+            job = Job(job_id, client, kind, params, -(-len(source) // self.chunk_size))
+            job.offsets = letter_offsets(source, self.chunk_size)
+        elif kind in SEARCHES:
+            arguments, total = search_arguments(kind, data)
+            job = Job(job_id, client, kind, arguments, total)
+        else:
+            raise ValueError(f"Invalid job kind: {kind}. Must be one of {['encrypt', *SEARCHES]}.")
+
+        with self.condition:
+            if not job.total:
+                job.status = "done"
+            self.jobs[job_id] = job
+            self.persist(job, force=True)
+            if job.status == "queued":
+                self.clients.setdefault(client, deque()).append(job_id)
+                self.condition.notify_all()
+            return job.summary()
+
+    def next_unit(self):
+        # Take one unit from each client in turn; clients without schedulable units leave the rotation
+        while self.clients:
+            client, job_ids = next(iter(self.clients.items()))
+            self.clients.move_to_end(client)
+            while job_ids:
+                job = self.jobs[job_ids[0]]
+                unit = job.next_unit()
+                if unit is not None:
+                    return job, unit
+                job_ids.popleft()
+            del self.clients[client]
+        return None
+
+    def schedule(self):
+        with self.condition:
+            while not self.closed:
+                work = self.next_unit() if self.running < self.workers else None
+                if work is None:
+                    self.condition.wait()
+                    continue
+                job, unit = work
+                if job.kind == "encrypt":
+                    chunk_size = job.params["chunk_size"]
+                    with open(self.path(job.id, "in"), "rb") as source:
+                        source.seek(unit * chunk_size)
+                        chunk = source.read(chunk_size)
+                    future = self.executor.submit(encrypt_unit, job.params["configuration"], chunk, job.offsets[unit])
+                else:
+                    future = self.executor.submit(search_unit, job.kind, job.params, unit)
+                if job.status == "queued":
+                    job.status = "running"
+                    self.persist(job, force=True)
+                self.running += 1
+                job.in_flight[unit] = future
+                future.add_done_callback(partial(self.finish, job, unit))
+
+    def finish(self, job, unit, future):
+        with self.condition:
+            self.running -= 1
+            job.in_flight.pop(unit, None)
+            self.condition.notify_all()
+            if future.cancelled() or job.status in FINISHED:
+                return
+
+            error = future.exception()
+            if error is not None:
+                job.status, job.error = "failed", f"{type(error).__name__}: {error}"
+            elif job.kind == "encrypt":
+                with open(self.path(job.id, "out"), "r+b") as output_file:
+                    output_file.seek(unit * job.params["chunk_size"])
+                    output_file.write(future.result())
+                job.mark_done(unit)
+            else:
+                job.results.extend(future.result())
+                job.mark_done(unit)
+
+            if job.status not in FINISHED and job.completed == job.total:
+                job.status = "done"
+            job.updated = time.time()
+            job.version += 1
+            self.persist(job, force=job.status in FINISHED)
+
+    def get(self, job_id):
+        """:raises KeyError: If there is no such job."""
+        job = self.jobs.get(job_id)
+        if job is None:
+            raise KeyError(job_id)
+        return job
+
+    def status(self, job_id):
+        with self.condition:
+            return self.get(job_id).summary()
+
+    def cancel(self, job_id):
+        """Cancels a job: no more units are started and the results of the running ones are discarded."""
+        with self.condition:
+            job = self.get(job_id)
+            if job.status not in FINISHED:
+                job.status = "cancelled"
+                job.updated = time.time()
+                job.version += 1
+                for future in job.in_flight.values():
+                    future.cancel()
+                self.persist(job, force=True)
+                self.condition.notify_all()
+            return job.summary()
+
+    def results(self, job_id, cursor: int = 0):
+        """
+        Results available from ``cursor``: the keys found by a search from the ``cursor``-th, or the final part of
+        an encrypt's output from byte ``cursor``. Pass ``next`` back as ``cursor`` to get only newer results.
+
+        :returns: ``{"results": [...]}`` or ``{"output": "..."}``, with ``next``, ``status``, ``finished`` and the
+            job ``version`` to pass to :meth:`wait`.
+        :rtype: dict
+        """
+        with self.condition:
+            job = self.get(job_id)
+            payload = {"status": job.status, "finished": job.status in FINISHED, "version": job.version}
+            if job.kind != "encrypt":
+                payload.update(results=job.results[cursor:], next=max(cursor, len(job.results)))
+                return payload
+            end = min(job.prefix * job.params["chunk_size"], job.params["size"])
+
+        with open(self.path(job_id, "out"), "rb") as output_file:
+            output_file.seek(cursor)
+            output = output_file.read(max(end - cursor, 0))
+        # The final part may end inside a UTF-8 sequence whose last bytes are still being encoded
+        for cut in range(len(output), max(len(output) - 4, -1), -1):
+            try:
+                text = output[:cut].decode("utf-8")
+                break
+            except UnicodeDecodeError:
+                continue
+        else:
+            text, cut = output.decode("utf-8", errors="replace"), len(output)
+        payload.update(output=text, next=cursor + cut)
+        return payload
+
+    def wait(self, job_id, version: int, timeout: float = None):
+        """
+        Blocks until the job changes after ``version`` (see :attr:`Job.version`) or finishes.
+
+        :returns: The current version.
+        """
+        with self.condition:
+            job = self.get(job_id)
+            self.condition.wait_for(lambda: job.version != version or job.status in FINISHED or self.closed, timeout)
+            return job.version
+
+    def close(self):
+        """Stops scheduling, waits for the running units, saves every job and releases the directory."""
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        self.scheduler.join()
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        with self.condition:
+            for job in self.jobs.values():
+                self.persist(job, force=True)
+        self.lock.close()
@@ -0,0 +1,300 @@
+"""
+Compact binary machine keys.
+
+A full key (rotor order, reflector, ring settings, start positions and plugboard) packs into one fixed 40-byte
+:data:`RECORD`: rotors and reflector as indices into :data:`ROTOR_NAMES` and :data:`REFLECTOR_NAMES`, leftmost
+rotor first, unused slots set to :data:`UNUSED`, and the plugboard as a 26-byte permutation. Key sheets are files
+of such records after a 16-byte header (``MAGIC``, a ``<HH`` version and record size, 4 reserved bytes) and are
+memory-mapped by :func:`load`.
+
+:class:`KeyTables` turns an array of records into per-key indices into shared, precompiled wiring tables, so many
+keys encode their messages in one vectorized pass. :class:`KeySpace` numbers every key of a search space, so
+integer ranges can be handed out to workers and nodes as shards.
+"""
+import struct
+from functools import lru_cache
+
+import numpy as np
+
+from enigma.enigma import (ALPHABET, ALPHABET_SIZE, Plugboard, compile_wiring, mappings, notch_map, notch_passes,
+                           reflectors)
+
+ROTOR_NAMES = tuple(name for name in mappings if name not in reflectors)
+REFLECTOR_NAMES = tuple(reflectors)
+MAX_SLOTS = 4
+UNUSED = 0xFF
+
+RECORD = np.dtype([
+    ("rotors", "u1", MAX_SLOTS),
+    ("reflector", "u1"),
+    ("slots", "u1"),
+    ("rings", "u1", MAX_SLOTS),
+    ("positions", "u1", MAX_SLOTS),
+    ("plugboard", "u1", ALPHABET_SIZE),
+])
+
+MAGIC = b"ENIGKEYS"
+VERSION = 1
+HEADER = struct.Struct("<8sHH4x")
+
+
+def pack(key: dict):
+    """
+    Packs a key given as keyword arguments for :class:`Enigma` into a :data:`RECORD`.
+
+    :raises ValueError: If the key is invalid.
+    """
+    return pack_keys([key])[0]
+
+
+def pack_keys(keys):
+    """
+    Packs keys given as keyword arguments for :class:`Enigma` into an array of :data:`RECORD`.
+
+    :raises ValueError: If a key is invalid.
+    """
+    records = np.zeros(len(keys), dtype=RECORD)
+    for record, key in zip(records, keys):
+        rotors = list(key["rotor_sequence"])
+        slots = len(rotors)
+        rings = list(key.get("ring_setting") or [1] * slots)
+        positions = key.get("initial_positions") or "A" * slots
+        if not 0 < slots <= MAX_SLOTS or len(rings) != slots or len(positions) != slots:
+            raise ValueError(f"Invalid key: expected 1 to {MAX_SLOTS} rotors with one ring setting and position each.")
+        if any(name not in ROTOR_NAMES for name in rotors) or key["reflector"] not in REFLECTOR_NAMES:
+            raise ValueError(f"Invalid key: unknown rotor or reflector in {rotors}, {key['reflector']}.")
+        if any(not 1 <= ring <= ALPHABET_SIZE for ring in rings) or any(letter not in ALPHABET for letter in positions):
+            raise ValueError("Invalid key: ring settings must be 1-26 and positions letters.")
+
+        record["rotors"] = [ROTOR_NAMES.index(name) for name in rotors] + [UNUSED] * (MAX_SLOTS - slots)
+        record["reflector"] = REFLECTOR_NAMES.index(key["reflector"])
+        record["slots"] = slots
+        record["rings"] = rings + [0] * (MAX_SLOTS - slots)
+        record["positions"] = [ALPHABET.index(letter) for letter in positions] + [0] * (MAX_SLOTS - slots)
+        record["plugboard"] = np.frombuffer(Plugboard(key.get("plug_combinations")).permutation, dtype=np.uint8)
+    return records
+
+
+def unpack(record):
+    """
+    Unpacks a :data:`RECORD` into keyword arguments for :class:`Enigma`.
+    """
+    slots = int(record["slots"])
+    plugboard = record["plugboard"].tolist()
+    pairs = [ALPHABET[x] + ALPHABET[y] for x, y in enumerate(plugboard) if x < y]
+    return {
+        "rotor_sequence": [ROTOR_NAMES[index] for index in record["rotors"][:slots].tolist()],
+        "reflector": REFLECTOR_NAMES[int(record["reflector"])],
+        "ring_setting": record["rings"][:slots].tolist(),
+        "initial_positions": "".join(ALPHABET[index] for index in record["positions"][:slots].tolist()),
+        "plug_combinations": pairs or None,
+    }
+
+
+def save(path, records):
+    """Writes records to a key sheet file."""
+    with open(path, "wb") as sheet:
+        sheet.write(HEADER.pack(MAGIC, VERSION, RECORD.itemsize))
+        sheet.write(np.ascontiguousarray(records, dtype=RECORD).tobytes())
+
+
+def load(path):
+    """
+    Memory-maps a key sheet file read-only.
+
+    :returns: Array of :data:`RECORD`.
+    :rtype: numpy.ndarray
+    :raises ValueError: If the file isn't a key sheet.
+    """
+    with open(path, "rb") as sheet:
+        header = sheet.read(HEADER.size)
+        sheet.seek(0, 2)
+        size = sheet.tell() - HEADER.size
+    if len(header) < HEADER.size or HEADER.unpack(header)[0] != MAGIC:
+        raise ValueError("Not a key sheet.")
+    _, version, record_size = HEADER.unpack(header)
+    if version != VERSION or record_size != RECORD.itemsize:
+        raise ValueError(f"Unsupported key sheet version: {version}.")
+    if size % record_size:
+        raise ValueError("Truncated key sheet.")
+    if not size:
+        return np.zeros(0, dtype=RECORD)
+    return np.memmap(path, dtype=RECORD, mode="r", offset=HEADER.size, shape=(size // record_size,))
+
+
+@lru_cache(maxsize=None)
+def wiring_tables():
+    """
+    Compiled wiring of every rotor at every ring setting, and of every reflector.
+
+    :returns: ``(forward, inverse, reflector)``: rotor tables of shape ``(rotors * 26, 26)``, indexed by
+        ``rotor * 26 + ring - 1``, and reflector tables of shape ``(reflectors, 26)``.
+    """
+    forward, inverse = zip(*(compile_wiring(mappings[name], ring) for name in ROTOR_NAMES
+                             for ring in range(1, ALPHABET_SIZE + 1)))
+    reflector = [compile_wiring(mappings[name])[0] for name in REFLECTOR_NAMES]
+    return (np.array(forward, dtype=np.int16), np.array(inverse, dtype=np.int16),
+            np.array(reflector, dtype=np.uint8))
+
+
+# Stepping of every rotor, see Rotor.can_rotate and Rotor.carry_notch (-1 if it never carries)
+ROTATING = np.array([name in notch_map or name in ("Beta", "Gamma") for name in ROTOR_NAMES])
+NOTCHES = np.array([ALPHABET.index(notch_map[name]) if name in notch_map else -1 for name in ROTOR_NAMES])
+
+
+class KeyTables:
+    """
+    Many keys with the same number of rotors, ready to encode one message each in a single vectorized pass.
+
+    Nothing is copied per key but the indices of its rotors into :func:`wiring_tables`, its start positions and its
+    plugboard.
+
+    :ivar wirings: ``(keys, slots)`` indices into the rotor tables, fast rotor first.
+    :type wirings: numpy.ndarray
+    :ivar starts: ``(keys, slots)`` start positions, fast rotor first.
+    :type starts: numpy.ndarray
+    """
+    def __init__(self, records):
+        records = np.asarray(records, dtype=RECORD)
+        slots = np.unique(records["slots"])
+        if len(slots) != 1:
+            raise ValueError("All keys must have the same number of rotors.")
+        self.slots = int(slots[0])
+        rotors = records["rotors"][:, self.slots - 1::-1].astype(np.intp)
+        self.wirings = rotors * ALPHABET_SIZE + records["rings"][:, self.slots - 1::-1] - 1
+        self.rotating = ROTATING[rotors]
+        self.notches = NOTCHES[rotors]
+        self.starts = records["positions"][:, self.slots - 1::-1].astype(np.int64)
+        self.reflectors = records["reflector"].astype(np.intp)
+        self.plugboards = records["plugboard"]
+
+    def __len__(self):
+        return len(self.starts)
+
+    def positions(self, length: int):
+        """
+        Rotor positions of every key for each of the first ``length`` key presses, see
+        :func:`enigma.enigma.advance_positions`.
+
+        :returns: One ``(keys, length)`` array per rotor, fast rotor first.
+        :rtype: list
+        """
+        steps = np.arange(1, length + 1)[None, :]
+        positions = []
+        for slot in range(self.slots):
+            start = self.starts[:, slot, None]
+            rotating = self.rotating[:, slot, None]
+            notch = self.notches[:, slot, None]
+            positions.append(np.where(rotating, (start + steps) % ALPHABET_SIZE, start))
+            steps = np.where(rotating & (notch >= 0), notch_passes(start, steps, notch), 0)
+        return positions
+
+    def encode(self, letters):
+        """
+        Encodes row ``k`` of ``letters`` with key ``k`` from its start positions.
+
+        :param letters: ``(keys, length)`` array of letter indices.
+        :returns: ``(keys, length)`` array of encoded letter indices.
+        :rtype: numpy.ndarray
+        """
+        letters = np.asarray(letters, dtype=np.intp)
+        forward, inverse, reflector = wiring_tables()
+        # A rotor at position p maps x to (table[(x + p) % 26] - p) % 26
+        positions = self.positions(letters.shape[1])
+        rows = [self.wirings[:, slot, None] for slot in range(self.slots)]
+
+        letters = np.take_along_axis(self.plugboards, letters, axis=1).astype(np.intp)
+        for row, position in zip(rows, positions):
+            letters = (forward[row, (letters + position) % ALPHABET_SIZE] - position) % ALPHABET_SIZE
+        letters = reflector[self.reflectors[:, None], letters].astype(np.intp)
+        for row, position in zip(reversed(rows), reversed(positions)):
+            letters = (inverse[row, (letters + position) % ALPHABET_SIZE] - position) % ALPHABET_SIZE
+        return np.take_along_axis(self.plugboards, letters, axis=1)
+
+
+class KeySpace:
+    """
+    Numbering of every key of a search space: rotor orders, reflectors and ring settings (a *setting*), each with
+    every start position, and an optional fixed plugboard.
+
+    Key ``index`` has setting ``index // 26 ** slots`` and start positions ``index % 26 ** slots`` read as a base-26
+    number, leftmost rotor first. Settings are numbered in rotor order, then reflector, then ring setting order.
+
+    :ivar rotor_orders: Rotor orders, leftmost rotor first.
+    :type rotor_orders: list[tuple[str, ...]]
+    :ivar reflectors: Reflectors.
+    :type reflectors: list[str]
+    :ivar ring_settings: Ring settings, leftmost rotor first.
+    :type ring_settings: list[tuple[int, ...]]
+    :ivar plug_combinations: Plugboard shared by every key.
+    :type plug_combinations: list[str]
+    """
+    def __init__(self, rotor_orders, reflectors, ring_settings, plug_combinations=None):
+        self.rotor_orders = [tuple(order) for order in rotor_orders]
+        self.reflectors = list(reflectors)
+        self.ring_settings = [tuple(rings) for rings in ring_settings]
+        self.plug_combinations = plug_combinations
+        self.slots = len(self.rotor_orders[0])
+        self.positions = ALPHABET_SIZE ** self.slots
+
+    @property
+    def setting_count(self):
+        return len(self.rotor_orders) * len(self.reflectors) * len(self.ring_settings)
+
+    @property
+    def size(self):
+        return self.setting_count * self.positions
+
+    def __len__(self):
+        return self.size
+
+    def setting(self, index: int):
+        """
+        Maps a setting number to its ``(rotor_order, reflector, ring_setting)``.
+        """
+        if not 0 <= index < self.setting_count:
+            raise ValueError(f"Invalid shard: {index}. Must be between 0 and {self.setting_count - 1}.")
+        index, ring_index = divmod(index, len(self.ring_settings))
+        order_index, reflector_index = divmod(index, len(self.reflectors))
+        return self.rotor_orders[order_index], self.reflectors[reflector_index], self.ring_settings[ring_index]
+
+    def records(self, start: int, stop: int):
+        """
+        Keys ``start`` to ``stop - 1``, packed.
+
+        :rtype: numpy.ndarray
+        """
+        if not 0 <= start <= stop <= self.size:
+            raise ValueError(f"Invalid key range: {start}-{stop}. Must lie within 0-{self.size}.")
+        indices = np.arange(start, stop, dtype=np.int64)
+        settings, positions = np.divmod(indices, self.positions)
+        settings, rings = np.divmod(settings, len(self.ring_settings))
+        orders, reflector = np.divmod(settings, len(self.reflectors))
+
+        orders_table = np.full((len(self.rotor_orders), MAX_SLOTS), UNUSED, dtype=np.uint8)
+        orders_table[:, :self.slots] = [[ROTOR_NAMES.index(name) for name in order] for order in self.rotor_orders]
+        rings_table = np.zeros((len(self.ring_settings), MAX_SLOTS), dtype=np.uint8)
+        rings_table[:, :self.slots] = self.ring_settings
+
+        records = np.zeros(indices.size, dtype=RECORD)
+        records["rotors"] = orders_table[orders]
+        records["reflector"] = np.array([REFLECTOR_NAMES.index(name) for name in self.reflectors])[reflector]
+        records["slots"] = self.slots
+        records["rings"] = rings_table[rings]
+        for slot in range(self.slots - 1, -1, -1):
+            positions, records["positions"][:, slot] = np.divmod(positions, ALPHABET_SIZE)
+        records["plugboard"] = np.frombuffer(Plugboard(self.plug_combinations).permutation, dtype=np.uint8)
+        return records
+
+    def key(self, index: int):
+        """Key number ``index``, as keyword arguments for :class:`Enigma`."""
+        return unpack(self.records(index, index + 1)[0])
+
+    def shards(self, count: int):
+        """
+        Splits the key space into ``count`` contiguous ranges whose sizes differ by at most one.
+
+        :rtype: list[tuple[int, int]]
+        """
+        bounds = [self.size * shard // count for shard in range(count + 1)]
+        return list(zip(bounds[:-1], bounds[1:]))
@@ -0,0 +1,171 @@
+"""
+Low-overhead instrumentation of the engine and the web server, rendered in the Prometheus text format.
+
+Instrumentation is off unless :func:`enable` is called (``app.py`` enables it unless ``ENIGMA_METRICS=0``). While
+it is off, instrumented code only tests the module-level :data:`enabled` flag. While it is on, key presses are
+counted once per encode call (:meth:`Enigma.encode`, :func:`enigma.service.encode_keys`, the vectorized, cached and
+parallel encoders), never per character.
+
+Recorded figures:
+
+- ``enigma_characters_total``: characters encoded, by every encode path but single
+  :meth:`Enigma.encode_character` calls
+- ``enigma_steps_total``: key presses, i.e. steps of the fast rotor
+- ``enigma_turnovers_total{rotor}``: steps of the other rotors caused by a carry, by rotor slot (1 = middle)
+- ``enigma_phase_seconds{phase}``: time histograms for ``construct``, ``encode`` and, in the server, ``parse``,
+  ``serialize`` and ``request``
+- gauges registered with :func:`register_gauge`, e.g. the number of live sessions
+"""
+import cProfile
+import io
+import pstats
+import threading
+import time
+from functools import wraps
+
+import numpy as np
+
+BUCKETS = (1e-6, 5e-6, 1e-5, 5e-5, 1e-4, 5e-4, 1e-3, 5e-3, 1e-2, 5e-2, 0.1, 0.5, 1.0, 5.0)
+
+enabled = False
+
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+_gauges = {}
+
+
+def enable():
+    global enabled
+    enabled = True
+
+
+def disable():
+    global enabled
+    enabled = False
+
+
+def reset():
+    """Clears every recorded figure (gauges stay registered)."""
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+
+
+def increment(name, value=1, labels=()):
+    key = (name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(phase, seconds):
+    with _lock:
+        histogram = _histograms.get(phase)
+        if histogram is None:
+            histogram = _histograms[phase] = [[0] * len(BUCKETS), 0.0, 0]
+        for index, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                histogram[0][index] += 1
+        histogram[1] += seconds
+        histogram[2] += 1
+
+
+def register_gauge(name, description, callback):
+    """Registers a gauge whose value is read from ``callback()`` when the metrics are rendered."""
+    _gauges[name] = (description, callback)
+
+
+def timed(phase):
+    """
+    Decorator recording the duration of each call in the ``phase`` histogram while instrumentation is enabled.
+    """
+    def decorate(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return function(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                observe(phase, time.perf_counter() - start)
+        return wrapper
+    return decorate
+
+
+def record_encode(machine, characters, positions=None):
+    """
+    Counts ``characters`` key presses of ``machine`` and the carries they cause.
+
+    :param characters: Number of key presses, or an array of them, one per message of a batch.
+    :param positions: Rotor positions before the key presses, fast rotor first, as ints or as arrays broadcasting
+        against ``characters``. Defaults to the current positions, i.e. recording before the machine is stepped.
+    """
+    from enigma.enigma import notch_passes
+
+    if positions is None:
+        positions = machine.rotor_positions
+    steps = characters
+    turnovers = {}
+    for slot, (rotor, position) in enumerate(zip(machine.rotors[:-1], positions)):
+        if not rotor.can_rotate:
+            break
+        if slot:
+            turnovers[slot] = int(np.sum(steps))
+        if rotor.carry_notch is None:
+            break
+        steps = notch_passes(position, steps, rotor.carry_notch)
+    characters = int(np.sum(characters))
+
+    with _lock:
+        for name in ("enigma_characters_total", "enigma_steps_total"):
+            _counters[(name, ())] = _counters.get((name, ()), 0) + characters
+        for slot, count in turnovers.items():
+            key = ("enigma_turnovers_total", (("rotor", str(slot)),))
+            _counters[key] = _counters.get(key, 0) + count
+
+
+def profile(function, *args, limit=25, **kwargs):
+    """
+    Runs ``function`` under the profiler.
+
+    :returns: ``(result, report)``, the report being the ``limit`` most expensive functions by cumulative time.
+    """
+    profiler = cProfile.Profile()
+    result = profiler.runcall(function, *args, **kwargs)
+    report = io.StringIO()
+    pstats.Stats(profiler, stream=report).sort_stats("cumulative").print_stats(limit)
+    return result, report.getvalue()
+
+
+def format_labels(labels):
+    return "{" + ",".join(f'{name}="{value}"' for name, value in labels) + "}" if labels else ""
+
+
+def render():
+    """The current figures in the Prometheus text exposition format."""
+    lines = []
+    with _lock:
+        counters = dict(_counters)
+        histograms = {phase: ([*counts], total, count) for phase, (counts, total, count) in _histograms.items()}
+
+    for name in sorted({name for name, _ in counters}):
+        lines.append(f"# TYPE {name} counter")
+        for (counter, labels), value in sorted(counters.items()):
+            if counter == name:
+                lines.append(f"{name}{format_labels(labels)} {value}")
+
+    if histograms:
+        lines.append("# TYPE enigma_phase_seconds histogram")
+    for phase, (counts, total, count) in sorted(histograms.items()):
+        for bound, bucket in zip(BUCKETS, counts):
+            lines.append(f'enigma_phase_seconds_bucket{{phase="{phase}",le="{bound}"}} {bucket}')
+        lines.append(f'enigma_phase_seconds_bucket{{phase="{phase}",le="+Inf"}} {count}')
+        lines.append(f'enigma_phase_seconds_sum{{phase="{phase}"}} {total}')
+        lines.append(f'enigma_phase_seconds_count{{phase="{phase}"}} {count}')
+
+    for name, (description, callback) in sorted(_gauges.items()):
+        lines.append(f"# HELP {name} {description}")
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name} {callback()}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,209 @@
+"""
+Fitness measures for candidate decrypts.
+
+Every scorer works on arrays of letter indices along the last axis, so a batch of candidate decrypts of shape
+``(candidates, length)`` is scored in one call.
+
+N-gram tables can be compiled once from a corpus into a binary file (``MAGIC``, a ``<HH`` version and n-gram
+length, 4 reserved bytes, then ``26 ** n`` little-endian float32 log probabilities) and loaded with
+:meth:`NgramScorer.load`, which memory-maps the table so every worker process shares one copy::
+
+    python -m enigma.ngrams corpus.txt --output quadgrams.bin -n 4
+"""
+import argparse
+import struct
+
+import numpy as np
+
+from enigma.enigma import ALPHABET_SIZE
+
+MAGIC = b"ENIGNGRM"
+VERSION = 1
+HEADER = struct.Struct("<8sHH4x")
+CHUNK_SIZE = 1 << 20
+
+
+def count_ngrams(chunks, n: int):
+    """
+    Counts the n-grams of a corpus read in chunks, ignoring anything but ASCII letters (n-grams run across the
+    ignored characters and across chunk boundaries).
+
+    :param chunks: Iterable of ``str`` or bytes-like chunks.
+    :returns: Dense array of ``26 ** n`` counts, indexed by the base-26 value of the n-gram.
+    :rtype: numpy.ndarray
+    """
+    counts = np.zeros(ALPHABET_SIZE ** n, dtype=np.int64)
+    tail = np.zeros(0, dtype=np.uint8)
+    for chunk in chunks:
+        data = np.frombuffer(chunk.encode("utf-8") if isinstance(chunk, str) else chunk, dtype=np.uint8)
+        # Setting bit 0x20 lower-cases ASCII letters, everything outside a-z wraps above 25
+        letters = (data | 0x20) - ord("a")
+        letters = np.concatenate([tail, letters[letters < ALPHABET_SIZE]])
+        counts += np.bincount(NgramScorer.codes_of(letters, n), minlength=counts.size)
+        tail = letters[max(letters.size - n + 1, 0):]
+    return counts
+
+
+def index_of_coincidence(letters):
+    """
+    Index of coincidence of each row of ``letters`` (along the last axis).
+
+    :param letters: Array of letter indices, of shape ``(..., length)``.
+    :returns: Array of shape ``(...)``.
+    :rtype: numpy.ndarray
+    """
+    letters = np.asarray(letters)
+    length = letters.shape[-1]
+    rows = letters.reshape(-1, length)
+    # Offsetting each row by 26 * row number gives every row its own block of bins
+    bins = rows + (np.arange(rows.shape[0]) * ALPHABET_SIZE)[:, None]
+    counts = np.bincount(bins.ravel(), minlength=rows.shape[0] * ALPHABET_SIZE).reshape(-1, ALPHABET_SIZE)
+    coincidences = (counts * (counts - 1)).sum(axis=1) / (length * (length - 1))
+    return coincidences.reshape(letters.shape[:-1])
+
+
+class NgramScorer:
+    """
+    Scores text by the summed log probabilities of its overlapping n-grams.
+
+    :ivar n: Length of the n-grams.
+    :type n: int
+    :ivar log_probabilities: Dense table of ``26 ** n`` log10 probabilities, indexed by the base-26 value of the
+        n-gram.
+    :type log_probabilities: numpy.ndarray
+    """
+    def __init__(self, log_probabilities, n: int, path=None):
+        if len(log_probabilities) != ALPHABET_SIZE ** n:
+            raise ValueError(f"Invalid n-gram table: expected {ALPHABET_SIZE ** n} entries.")
+        self.n = n
+        self.log_probabilities = log_probabilities
+        self.path = path
+
+    def __reduce__(self):
+        # A memory-mapped table is reopened by path instead of being copied into every worker process
+        if self.path is not None:
+            return type(self).load, (self.path,)
+        return type(self), (self.log_probabilities, self.n)
+
+    @classmethod
+    def from_counts(cls, counts, n: int):
+        """Builds a scorer from raw n-gram counts, giving unseen n-grams a small floor probability."""
+        counts = np.asarray(counts, dtype=np.float64)
+        total = counts.sum()
+        if not total:
+            raise ValueError("Can't build an n-gram scorer from an empty corpus.")
+        log_probabilities = np.log10(np.maximum(counts, 0.01) / total).astype(np.float32)
+        return cls(log_probabilities, n)
+
+    @classmethod
+    def from_corpus(cls, text: str, n: int = 3):
+        """
+        Builds a scorer from a text corpus. Anything but letters is ignored.
+        """
+        return cls.from_counts(count_ngrams([text], n), n)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Memory-maps a table written by :meth:`save` (read-only, shared through the page cache).
+
+        :raises ValueError: If the file isn't an n-gram table.
+        """
+        with open(path, "rb") as table_file:
+            header = table_file.read(HEADER.size)
+        if len(header) < HEADER.size:
+            raise ValueError("Not an n-gram table.")
+        magic, version, n = HEADER.unpack(header)
+        if magic != MAGIC:
+            raise ValueError("Not an n-gram table.")
+        if version != VERSION:
+            raise ValueError(f"Unsupported n-gram table version: {version}.")
+        try:
+            table = np.memmap(path, dtype="<f4", mode="r", offset=HEADER.size, shape=(ALPHABET_SIZE ** n,))
+        except ValueError:
+            raise ValueError("Truncated n-gram table.") from None
+        return cls(table, n, path)
+
+    def save(self, path):
+        """Writes the table in the binary format read by :meth:`load`."""
+        with open(path, "wb") as table_file:
+            table_file.write(HEADER.pack(MAGIC, VERSION, self.n))
+            table_file.write(np.asarray(self.log_probabilities, dtype="<f4").tobytes())
+
+    @staticmethod
+    def codes_of(letters, n: int):
+        letters = np.asarray(letters, dtype=np.int64)
+        length = letters.shape[-1] - n + 1
+        codes = np.zeros(letters.shape[:-1] + (max(length, 0),), dtype=np.int64)
+        for index in range(n):
+            codes = codes * ALPHABET_SIZE + letters[..., index:index + length]
+        return codes
+
+    def codes(self, letters):
+        """Base-26 value of every n-gram of ``letters``, along the last axis."""
+        return self.codes_of(letters, self.n)
+
+    def score(self, letters):
+        """
+        Fitness of each row of ``letters``: the sum of the log probabilities of its n-grams.
+        """
+        return self.log_probabilities[self.codes(letters)].sum(axis=-1)
+
+    def rescore(self, score, old, new):
+        """
+        Updates ``score`` (the score of ``old``) for ``new`` by only looking at the n-grams that overlap a changed
+        letter, which is much cheaper than :meth:`score` when a plugboard change only touches a few positions.
+
+        :param score: Score of ``old``.
+        :param old: Letter indices the score was computed for, of shape ``(length,)``.
+        :param new: Changed letter indices, of shape ``(length,)`` or ``(candidates, length)``.
+        :returns: The score of each row of ``new``.
+        """
+        new = np.asarray(new)
+        rows = new.reshape(-1, new.shape[-1])
+        changed = rows != old
+        # An n-gram starting at i is affected if any of the letters i .. i + n - 1 changed
+        window_count = rows.shape[1] - self.n + 1
+        affected = np.zeros((rows.shape[0], window_count), dtype=bool)
+        for index in range(self.n):
+            affected |= changed[:, index:index + window_count]
+        row, start = np.nonzero(affected)
+
+        offsets = start[:, None] + np.arange(self.n)
+        old_codes = self.codes_of(np.asarray(old)[offsets], self.n)[:, 0]
+        new_codes = self.codes_of(rows[row[:, None], offsets], self.n)[:, 0]
+        delta = np.bincount(row, weights=self.log_probabilities[new_codes] - self.log_probabilities[old_codes],
+                            minlength=rows.shape[0])
+        return (score + delta).reshape(new.shape[:-1])
+
+
+def compile_corpus(paths, output, n: int = 4, chunk_size: int = CHUNK_SIZE):
+    """
+    Compiles text files into an n-gram table file, reading them in chunks so the corpus can be larger than memory.
+
+    :returns: The compiled scorer.
+    :rtype: NgramScorer
+    """
+    def chunks():
+        for path in paths:
+            with open(path, "rb") as corpus:
+                while chunk := corpus.read(chunk_size):
+                    yield chunk
+
+    scorer = NgramScorer.from_counts(count_ngrams(chunks(), n), n)
+    scorer.save(output)
+    return scorer
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m enigma.ngrams",
+                                     description="Compile text corpora into an n-gram log-probability table.")
+    parser.add_argument("corpus", nargs="+", help="text files")
+    parser.add_argument("--output", "-o", required=True, help="table file to write")
+    parser.add_argument("-n", type=int, default=4, help="n-gram length")
+    args = parser.parse_args(argv)
+    compile_corpus(args.corpus, args.output, args.n)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Multi-process encoding of a single large message.
+
+The rotor positions at any offset follow from the start positions in closed form (see :meth:`Enigma.advance`), so
+a message can be cut into chunks that are encoded independently. The machine tables are sent to each worker once,
+when the pool starts, and each task only carries its chunk and its start positions.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from enigma import metrics
+from enigma.enigma import Enigma
+from enigma.vectorized import MachineTables, encode_indices, to_indices, to_message
+
+CHUNKS_PER_WORKER = 4
+MIN_CHUNK_SIZE = 1 << 16
+
+_worker_tables = None
+
+
+def _init_worker(tables: MachineTables):
+    global _worker_tables
+    _worker_tables = tables
+
+
+def _encode_chunk(start_positions, chunk: bytes):
+    letters = np.frombuffer(chunk, dtype=np.uint8)
+    steps = np.arange(1, letters.size + 1, dtype=np.int32)
+    return _worker_tables.encode(letters, _worker_tables.positions(start_positions, steps)).tobytes()
+
+
+def parallel_encode(machine: Enigma, message: str, workers: int = None, chunk_size: int = None):
+    """
+    Encodes a message on several processes. The output and the final state of the machine are identical to
+    :meth:`Enigma.encode`.
+
+    :param machine: The machine to encode with. Its rotors are advanced past the message.
+    :param message: The message to encode. Lowercase letters are upper-cased, anything else is rejected.
+    :param workers: Number of worker processes, defaults to the number of CPUs.
+    :param chunk_size: Number of letters per task, defaults to splitting the message into a few chunks per worker.
+    :return: A string representing the encoded message.
+    :rtype: str
+    """
+    workers = workers or os.cpu_count() or 1
+    letters = to_indices(message)
+    if chunk_size is None:
+        chunk_size = max(MIN_CHUNK_SIZE, -(-letters.size // (workers * CHUNKS_PER_WORKER)))
+    tables = MachineTables(machine)
+    if workers == 1 or letters.size <= chunk_size:
+        return to_message(encode_indices(machine, letters, tables))
+
+    start_positions = machine.rotor_positions
+    if metrics.enabled:
+        metrics.record_encode(machine, letters.size)
+    offsets = range(0, letters.size, chunk_size)
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(tables,)) as pool:
+        chunks = pool.map(_encode_chunk,
+                          [machine.advance(start_positions, offset) for offset in offsets],
+                          [letters[offset:offset + chunk_size].tobytes() for offset in offsets])
+        encoded = np.frombuffer(b"".join(chunks), dtype=np.uint8)
+
+    for rotor, position in zip(machine.rotors, machine.advance(start_positions, letters.size)):
+        rotor.position = position
+    machine.offset += letters.size
+    return to_message(encoded)
@@ -0,0 +1,162 @@
+"""
+Known-plaintext key search.
+
+Given a ciphertext and a crib (known plaintext) at a known offset, :class:`KnownPlaintextSearch` enumerates rotor
+orders, reflectors and ring settings, and for each of these shards tests all start positions at once with the
+tables from :mod:`enigma.vectorized`. Candidates are dropped on the first crib letter they fail, so most of the
+work is a single gather over all 26^n start positions.
+
+The ring setting of the leftmost rotor only shifts its wiring relative to its position (its carry goes into the
+reflector, which never moves), so by default it is fixed at 1 and the matching keys are reported with the
+equivalent start position.
+"""
+import itertools
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+
+from enigma.enigma import ALPHABET, ALPHABET_SIZE, Enigma, notch_map, reflectors
+from enigma.keysheet import KeySpace
+from enigma.vectorized import MachineTables, to_indices
+
+DEFAULT_ROTORS = tuple(notch_map)
+DEFAULT_REFLECTORS = tuple(reflectors)
+
+
+class KnownPlaintextSearch:
+    """
+    Search space and crib for a known-plaintext attack.
+
+    The space is split into shards, one per (rotor order, reflector, ring setting), numbered from 0 to
+    :attr:`shard_count` - 1 in a fixed order, so a search can be split between machines or resumed by passing the
+    shard numbers that are still to do to :meth:`run`.
+
+    :ivar ciphertext: Ciphertext letter indices.
+    :type ciphertext: numpy.ndarray
+    :ivar crib: Known plaintext letter indices.
+    :type crib: numpy.ndarray
+    :ivar crib_offset: Offset of the crib in the ciphertext.
+    :type crib_offset: int
+    :ivar rotor_orders: Rotor orders to try, leftmost rotor first.
+    :type rotor_orders: list[tuple[str, ...]]
+    :ivar reflectors: Reflectors to try.
+    :type reflectors: list[str]
+    :ivar ring_settings: Ring settings to try, leftmost rotor first.
+    :type ring_settings: list[tuple[int, ...]]
+    :ivar plug_combinations: Known plugboard, if any.
+    :type plug_combinations: list[str]
+    :ivar key_space: Numbering of every key searched, one shard per setting.
+    :type key_space: KeySpace
+    """
+    def __init__(self, ciphertext: str, crib: str, crib_offset: int = 0, rotors=DEFAULT_ROTORS, slots: int = 3,
+                 rotor_orders=None, reflectors=DEFAULT_REFLECTORS, ring_settings=None, plug_combinations=None):
+        self.ciphertext = to_indices(ciphertext)
+        self.crib = to_indices(crib)
+        self.crib_offset = crib_offset
+        if not self.crib.size or crib_offset < 0 or crib_offset + self.crib.size > self.ciphertext.size:
+            raise ValueError("The crib must be non-empty and lie within the ciphertext.")
+
+        self.rotor_orders = [tuple(order) for order in rotor_orders or itertools.permutations(rotors, slots)]
+        slots = len(self.rotor_orders[0])
+        self.reflectors = list(reflectors)
+        if ring_settings is None:
+            ring_settings = [(1,) + rings for rings in itertools.product(range(1, ALPHABET_SIZE + 1),
+                                                                         repeat=slots - 1)]
+        self.ring_settings = [tuple(rings) for rings in ring_settings]
+        self.plug_combinations = plug_combinations
+        self.key_space = KeySpace(self.rotor_orders, self.reflectors, self.ring_settings, plug_combinations)
+
+    @property
+    def shard_count(self):
+        return self.key_space.setting_count
+
+    @property
+    def key_count(self):
+        return self.key_space.size
+
+    def shard(self, index: int):
+        """
+        Maps a shard number to its ``(rotor_order, reflector, ring_setting)``: shard ``i`` holds keys
+        ``i * 26 ** slots`` to ``(i + 1) * 26 ** slots - 1`` of :attr:`key_space`.
+        """
+        return self.key_space.setting(index)
+
+    def search_shard(self, index: int):
+        """
+        Tests every start position of one shard against the crib.
+
+        :param index: The shard number.
+        :returns: The matching keys, as keyword arguments for :class:`Enigma`.
+        :rtype: list[dict]
+        """
+        rotor_order, reflector, ring_setting = self.shard(index)
+        slots = len(rotor_order)
+        machine = Enigma(rotor_sequence=list(rotor_order), reflector=reflector, ring_setting=list(ring_setting),
+                         initial_positions="A" * slots, plug_combinations=self.plug_combinations)
+        tables = MachineTables(machine)
+
+        # One row per start position, fast rotor first as in Enigma.rotors; the reflector stays at 0
+        candidates = np.indices((ALPHABET_SIZE,) * slots).reshape(slots, -1)
+        for crib_index, letter in enumerate(self.crib):
+            offset = self.crib_offset + crib_index
+            positions = tables.positions([*candidates, 0], offset + 1)
+            encoded = tables.encode(np.full(candidates.shape[1], letter, dtype=np.uint8), positions)
+            candidates = candidates[:, encoded == self.ciphertext[offset]]
+            if not candidates.shape[1]:
+                return []
+
+        return [{
+            "rotor_sequence": list(rotor_order),
+            "reflector": reflector,
+            "ring_setting": list(ring_setting),
+            "initial_positions": "".join(ALPHABET[position] for position in reversed(start)),
+            "plug_combinations": self.plug_combinations,
+        } for start in candidates.T.tolist()]
+
+    def run(self, shards=None, workers: int = None, progress=None, cancel=None):
+        """
+        Searches the given shards, yielding ``(shard, keys)`` for each shard as soon as it is done (in completion
+        order), including shards without matches, so callers can record which shards are finished.
+
+        :param shards: Shard numbers to search, defaults to all of them.
+        :param workers: Number of worker processes, defaults to the number of CPUs. With 1 the search runs in this
+            process.
+        :param progress: Called as ``progress(done, total)`` after each shard.
+        :param cancel: Object with an ``is_set()`` method (e.g. ``threading.Event``); when set, no new shards are
+            started and the search stops after the ones in flight.
+        """
+        shards = list(range(self.shard_count) if shards is None else shards)
+        workers = workers or os.cpu_count() or 1
+        done = 0
+
+        if workers == 1:
+            for shard in shards:
+                if cancel is not None and cancel.is_set():
+                    return
+                keys = self.search_shard(shard)
+                done += 1
+                if progress:
+                    progress(done, len(shards))
+                yield shard, keys
+            return
+
+        pending = iter(shards)
+        with ProcessPoolExecutor(workers) as pool:
+            # Keep a bounded number of shards in flight so huge key spaces don't queue millions of futures
+            in_flight = {pool.submit(self.search_shard, shard): shard
+                         for shard in itertools.islice(pending, workers * 2)}
+            while in_flight:
+                finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    shard = in_flight.pop(future)
+                    done += 1
+                    if progress:
+                        progress(done, len(shards))
+                    yield shard, future.result()
+                if cancel is not None and cancel.is_set():
+                    for future in in_flight:
+                        future.cancel()
+                    return
+                for shard in itertools.islice(pending, len(finished)):
+                    in_flight[pool.submit(self.search_shard, shard)] = shard
@@ -0,0 +1,215 @@
+"""
+Request handling shared by the Flask app (``app.py``) and the ASGI server (``asgi.py``).
+
+Handlers take the decoded JSON body and return ``(payload, status)``. :meth:`EnigmaService.encode_batch` handles
+any number of ``/encode`` requests at once: requests for the same session are fused into one text, encoded in a
+single pass under one acquisition of the session lock, and split back into per-request responses in arrival order.
+"""
+import io
+from collections import defaultdict
+
+from enigma import metrics
+from enigma.enigma import ALPHABET, ALPHABET_SIZE, Enigma, mappings, reflectors
+from enigma.sessions import SessionRegistry
+from enigma.stream import NON_LETTER_POLICIES, encode_stream
+from enigma.vectorized import position_trace
+
+MAX_BATCH_SIZE = 1000
+# Below this many characters, encoding one by one is cheaper than building the vectorized tables
+SMALL_TEXT = 32
+
+UNKNOWN_SESSION = "Unknown or expired session, call /init first"
+ROTOR_NAMES = [name for name in mappings if name not in reflectors]
+
+
+def plug_pairs(plugboard):
+    # The frontend sends the plugboard as {"A": "B", "B": "A", ...}, API clients as ["AB", ...]
+    if isinstance(plugboard, dict):
+        return sorted({"".join(sorted(pair)) for pair in plugboard.items()})
+    return plugboard
+
+
+def is_letter(character):
+    return character.isascii() and character.isalpha()
+
+
+def encode_keys(machine, keys):
+    """Encodes letters one by one, echoing anything else without stepping the rotors."""
+    start_positions, start_offset = machine.rotor_positions, machine.offset
+    output = "".join(machine.encode_character(key) if is_letter(key) else key for key in keys)
+    if metrics.enabled:
+        metrics.record_encode(machine, machine.offset - start_offset, start_positions)
+    return output
+
+
+def encode_text(machine, text):
+    """Encodes a text on a machine, passing non-letters through."""
+    if len(text) < SMALL_TEXT:
+        return encode_keys(machine, text)
+    output = io.StringIO()
+    encode_stream(machine, io.StringIO(text), output)
+    return output.getvalue()
+
+
+def machine_from(data):
+    """
+    Builds a machine from an ``/init`` style configuration (``rotors``, ``reflector``, ``rings``, ``positions``
+    and ``plugboard``, all optional).
+
+    :raises ValueError: If the configuration is invalid.
+    """
+    if not isinstance(data, dict):
+        raise ValueError("Invalid machine configuration: expected a JSON object")
+    rotor_names = data.get('rotors', ['I', 'II', 'III'])
+    if not isinstance(rotor_names, list) or not rotor_names or any(name not in ROTOR_NAMES for name in rotor_names):
+        raise ValueError(f"Invalid machine configuration: 'rotors' must be a non-empty list of {ROTOR_NAMES}")
+    reflector = data.get('reflector', 'B')
+    if reflector not in reflectors:
+        raise ValueError(f"Invalid machine configuration: 'reflector' must be one of {list(reflectors)}")
+    ring_settings = data.get('rings', [1] * len(rotor_names))
+    if (not isinstance(ring_settings, list) or len(ring_settings) != len(rotor_names)
+            or any(type(ring) is not int or not 1 <= ring <= ALPHABET_SIZE for ring in ring_settings)):
+        raise ValueError("Invalid machine configuration: 'rings' must hold one setting from 1 to 26 per rotor")
+    positions = data.get('positions', 'A' * len(rotor_names))
+    if (not isinstance(positions, str) or len(positions) != len(rotor_names)
+            or any(letter not in ALPHABET for letter in positions)):
+        raise ValueError("Invalid machine configuration: 'positions' must hold one letter A-Z per rotor")
+    plugboard = data.get('plugboard', [])
+    if isinstance(plugboard, dict):
+        leads = [*plugboard.keys(), *plugboard.values()]
+    else:
+        leads = plugboard
+    if not isinstance(leads, list) or not all(isinstance(lead, str) for lead in leads):
+        raise ValueError("Invalid machine configuration: 'plugboard' must be a list of letter pairs or a letter map")
+    try:
+        return Enigma(rotor_names, reflector, ring_settings, positions, plug_pairs(plugboard))
+    except (KeyError, IndexError, TypeError, ValueError) as error:
+        raise ValueError(f"Invalid machine configuration: {error}") from None
+
+
+class EnigmaService:
+    """
+    The HTTP API of the Enigma server, independent of the web framework.
+
+    :ivar sessions: Registry of the machines of all clients.
+    :type sessions: SessionRegistry
+    """
+    def __init__(self, sessions: SessionRegistry):
+        self.sessions = sessions
+
+    def initialize(self, data):
+        try:
+            enigma_machine = machine_from(data)
+        except ValueError as error:
+            return {"error": str(error)}, 400
+
+        session_id = self.sessions.create(enigma_machine)
+        return {"status": "initialized", "session_id": session_id,
+                "rotorPositions": list(enigma_machine.position_letters)}, 200
+
+    @staticmethod
+    def pieces(data):
+        """
+        Validates an ``/encode`` request and returns the texts it encodes, with non-letters already removed where
+        the request asks to skip them.
+        """
+        non_letters = data.get('non_letters', 'passthrough')
+        if non_letters not in NON_LETTER_POLICIES:
+            raise ValueError(f"non_letters must be one of {list(NON_LETTER_POLICIES)}")
+        if 'texts' in data:
+            texts = data['texts']
+            if not isinstance(texts, list) or len(texts) > MAX_BATCH_SIZE:
+                raise ValueError(f"'texts' must be a list of at most {MAX_BATCH_SIZE} texts")
+        elif 'text' in data:
+            texts = [data['text']]
+        elif 'character' in data:
+            character = data['character']
+            if not isinstance(character, str) or len(character) != 1 or not is_letter(character):
+                raise ValueError(f"Invalid character: {character}. Must be an uppercase English letter.")
+            return [character.upper()]
+        else:
+            raise ValueError("Expected one of 'character', 'text' or 'texts'")
+
+        if not all(isinstance(text, str) for text in texts):
+            raise ValueError("Texts must be strings")
+        if non_letters == 'skip':
+            texts = ["".join(character for character in text if is_letter(character)) for text in texts]
+        elif non_letters == 'error':
+            for text in texts:
+                invalid = next((character for character in text if not is_letter(character)), None)
+                if invalid is not None:
+                    raise ValueError(f"Invalid character: {invalid!r}. Must be an English letter.")
+        return texts
+
+    @staticmethod
+    def response(data, outputs, traces, rotor_positions):
+        if 'texts' in data:
+            response = {"outputs": outputs}
+            if traces is not None:
+                response["traces"] = traces
+        else:
+            key = 'text' if 'text' in data else 'character'
+            response = {"input": data[key] if key == 'text' else data[key].upper(), "output": outputs[0]}
+            if traces is not None:
+                response["trace"] = traces[0]
+        response["rotorPositions"] = rotor_positions
+        return response
+
+    def encode(self, data):
+        """
+        Encodes a single ``character``, a whole ``text`` or a batch of ``texts`` (encoded one after the other) on
+        the session's machine. Non-letters in texts are passed through unless ``non_letters`` is ``"skip"``, and
+        ``trace: true`` adds the rotor positions used for every letter.
+        """
+        return self.encode_batch([data])[0]
+
+    def encode_batch(self, requests):
+        """
+        Handles several ``/encode`` requests, fusing those of each session into a single encode.
+
+        :param requests: Decoded request bodies, in arrival order.
+        :returns: ``(payload, status)`` for each request, in the same order.
+        :rtype: list[tuple[dict, int]]
+        """
+        results = [None] * len(requests)
+        by_session = defaultdict(list)
+        for index, data in enumerate(requests):
+            try:
+                session_id = data.get('session_id')
+                if not isinstance(session_id, str):
+                    raise ValueError("Expected a 'session_id' string, call /init first")
+                by_session[session_id].append((index, data, self.pieces(data)))
+            except (AttributeError, ValueError) as error:
+                results[index] = {"error": str(error)}, 400
+
+        for session_id, group in by_session.items():
+            try:
+                with self.sessions.use(session_id) as machine:
+                    start_positions, start_offset = machine.rotor_positions, machine.offset
+                    texts = [text for _, _, pieces in group for text in pieces]
+                    output = encode_text(machine, "".join(texts))
+                    trace = None
+                    if any(data.get('trace') for _, data, _ in group):
+                        trace = position_trace(machine, start_positions, machine.offset - start_offset)
+                    rotor_positions = list(machine.position_letters)
+            except KeyError:
+                for index, _, _ in group:
+                    results[index] = {"error": UNKNOWN_SESSION}, 404
+                continue
+
+            # Split the fused output (same length as its input) and trace (one entry per letter) back up
+            position = letter = 0
+            for index, data, pieces in group:
+                outputs, traces = [], []
+                for text in pieces:
+                    outputs.append(output[position:position + len(text)])
+                    letters = sum(1 for character in text if is_letter(character))
+                    traces.append(trace[letter:letter + letters] if trace is not None else None)
+                    position += len(text)
+                    letter += letters
+                results[index] = self.response(data, outputs, traces if data.get('trace') else None,
+                                               rotor_positions), 200
+        return results
+
+    def session_stats(self):
+        return self.sessions.stats()
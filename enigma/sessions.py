@@ -0,0 +1,111 @@
+"""
+Bounded registry of per-client Enigma machines for the web server.
+
+Each session owns its machine and a lock, so concurrent requests for the same session are serialised while
+different sessions run independently. The registry holds at most ``max_sessions`` machines, evicting the least
+recently used one when full and dropping sessions that have been idle for longer than ``ttl`` seconds.
+"""
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+
+DEFAULT_MAX_SESSIONS = 10000
+DEFAULT_TTL = 3600
+
+
+class Session:
+    """
+    A machine together with the lock guarding it and the time it was last used.
+    """
+    __slots__ = ("machine", "lock", "last_used")
+    def __init__(self, machine, now):
+        self.machine = machine
+        self.lock = threading.Lock()
+        self.last_used = now
+
+
+class SessionRegistry:
+    """
+    Thread-safe LRU/TTL registry mapping session ids to machines.
+
+    :ivar max_sessions: Maximum number of live sessions.
+    :type max_sessions: int
+    :ivar ttl: Idle time in seconds after which a session expires.
+    :type ttl: float
+    """
+    def __init__(self, max_sessions: int = DEFAULT_MAX_SESSIONS, ttl: float = DEFAULT_TTL, clock=time.monotonic):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.clock = clock
+        self.sessions = OrderedDict()
+        self.lock = threading.Lock()
+        self.counters = {"created": 0, "hits": 0, "misses": 0, "evicted_lru": 0, "evicted_ttl": 0, "removed": 0}
+
+    def __len__(self):
+        return len(self.sessions)
+
+    def _expire(self, now):
+        # Sessions are kept in order of last use, so the expired ones are all at the front
+        while self.sessions:
+            session_id, session = next(iter(self.sessions.items()))
+            if now - session.last_used <= self.ttl:
+                break
+            del self.sessions[session_id]
+            self.counters["evicted_ttl"] += 1
+
+    def create(self, machine):
+        """
+        Registers a machine under a new random session id, evicting the least recently used session if the
+        registry is full.
+
+        :returns: The new session id.
+        :rtype: str
+        """
+        session_id = uuid.uuid4().hex
+        with self.lock:
+            now = self.clock()
+            self._expire(now)
+            while len(self.sessions) >= self.max_sessions:
+                self.sessions.popitem(last=False)
+                self.counters["evicted_lru"] += 1
+            self.sessions[session_id] = Session(machine, now)
+            self.counters["created"] += 1
+        return session_id
+
+    @contextmanager
+    def use(self, session_id):
+        """
+        Context manager giving exclusive access to a session's machine.
+
+        :raises KeyError: If the session doesn't exist or has expired.
+        """
+        with self.lock:
+            now = self.clock()
+            self._expire(now)
+            session = self.sessions.get(session_id)
+            if session is None:
+                self.counters["misses"] += 1
+                raise KeyError(session_id)
+            self.counters["hits"] += 1
+            session.last_used = now
+            self.sessions.move_to_end(session_id)
+
+        with session.lock:
+            yield session.machine
+
+    def remove(self, session_id):
+        """Ends a session. Returns whether it existed."""
+        with self.lock:
+            if self.sessions.pop(session_id, None) is None:
+                return False
+            self.counters["removed"] += 1
+            return True
+
+    def stats(self):
+        """Occupancy and lifetime counters of the registry."""
+        with self.lock:
+            self._expire(self.clock())
+            return {"sessions": len(self.sessions), "max_sessions": self.max_sessions, "ttl": self.ttl,
+                    **self.counters}
@@ -0,0 +1,147 @@
+"""
+Buffer and stream encoding.
+
+:func:`encode_into` encodes ASCII from any buffer-protocol object into a caller-supplied buffer with
+:mod:`enigma.vectorized`. :func:`encode_stream` reads a stream in fixed-size chunks and encodes each of them into a
+reused output buffer, so memory use depends on the chunk size rather than on the input size. Rotor state is
+carried across chunks by the machine itself.
+"""
+import codecs
+import io
+import mmap
+
+import numpy as np
+
+from enigma.enigma import ALPHABET_SIZE, Enigma
+from enigma.vectorized import MachineTables, encode_indices
+
+DEFAULT_CHUNK_SIZE = 1 << 20
+NON_LETTER_POLICIES = ("passthrough", "skip", "error")
+CASE_POLICIES = ("upper", "lower", "preserve")
+
+
+def encode_into(machine: Enigma, src, dst, case: str = "upper", non_letters: str = "passthrough",
+                tables: MachineTables = None):
+    """
+    Encodes the ASCII bytes of ``src`` into ``dst`` without building intermediate strings.
+
+    Both buffers are viewed as ``uint8`` arrays, so ``src`` can be any buffer-protocol object (``bytes``,
+    ``bytearray``, ``memoryview``, ``mmap.mmap``, NumPy arrays) and ``dst`` any writable one, which can be reused
+    across calls. Letters of either case are encoded as :meth:`Enigma.encode` would encode their upper-case form.
+
+    :param machine: The machine to encode with. Its rotors are advanced past every encoded letter.
+    :param src: The bytes to encode.
+    :param dst: Writable buffer receiving the output from its start. It must hold at least ``len(src)`` bytes with
+        ``"passthrough"``, or the number of letters in ``src`` with ``"skip"``.
+    :param case: ``"upper"`` or ``"lower"`` to write the ciphertext in that case, ``"preserve"`` to give each
+        ciphertext letter the case of the letter it encodes.
+    :param non_letters: ``"passthrough"`` to copy non-letters unchanged, ``"skip"`` to leave them out or
+        ``"error"`` to reject the input. The machine is not advanced when the input is rejected.
+    :param tables: Precomputed tables for ``machine``, to avoid rebuilding them for every call.
+    :returns: The number of bytes written to ``dst``.
+    :rtype: int
+    :raises ValueError: If a policy is unknown, ``dst`` is too small, or ``src`` holds a non-letter under the
+        ``"error"`` policy.
+    :raises TypeError: If ``dst`` is read-only.
+    """
+    if non_letters not in NON_LETTER_POLICIES:
+        raise ValueError(f"Invalid non-letter policy: {non_letters}. Must be one of {NON_LETTER_POLICIES}.")
+    if case not in CASE_POLICIES:
+        raise ValueError(f"Invalid case policy: {case}. Must be one of {CASE_POLICIES}.")
+    if memoryview(dst).readonly:
+        raise TypeError("The destination buffer must be writable.")
+
+    data = np.frombuffer(src, dtype=np.uint8)
+    output = np.frombuffer(dst, dtype=np.uint8)
+
+    # Setting bit 0x20 lower-cases ASCII letters, everything outside a-z wraps above 25
+    letters = (data | 0x20) - ord("a")
+    is_letter = letters < ALPHABET_SIZE
+    if non_letters == "error" and not is_letter.all():
+        offset = int(np.argmin(is_letter))
+        raise ValueError(f"Invalid character at offset {offset}: {bytes(data[offset:offset + 1])!r}. "
+                         f"Must be an English letter.")
+    size = data.size if non_letters == "passthrough" else int(np.count_nonzero(is_letter))
+    if size > output.size:
+        raise ValueError(f"Destination buffer too small: {output.size} bytes, {size} needed.")
+
+    encoded = encode_indices(machine, letters[is_letter], tables) + ord("A")
+    if case == "lower":
+        encoded |= 0x20
+    elif case == "preserve":
+        encoded |= data[is_letter] & 0x20
+
+    if non_letters == "passthrough":
+        output[:size] = data
+        output[:size][is_letter] = encoded
+    else:
+        output[:size] = encoded
+    return size
+
+
+def encode_stream(machine: Enigma, reader, writer, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                  non_letters: str = "passthrough", case: str = "upper"):
+    """
+    Encodes everything ``reader`` produces and writes it to ``writer``.
+
+    Chunks are encoded with :func:`encode_into` through a reused output buffer. Text streams are handled as
+    UTF-8, so non-ASCII characters are never mistaken for letters.
+
+    :param machine: The machine to encode with. Its rotors are advanced past every encoded letter.
+    :param reader: Object with a ``read(size)`` method returning ``str`` or bytes-like chunks, e.g. an open file,
+        ``io.BytesIO`` or an ``mmap.mmap``.
+    :param writer: Object with a ``write`` method. Text writers (``io.TextIOBase``) receive ``str``, anything
+        else receives bytes. Output for text writers is decoded incrementally, so multibyte characters split
+        across chunks of a bytes reader are written once complete.
+    :param chunk_size: Number of characters (or bytes) read at a time.
+    :param non_letters: ``"passthrough"``, ``"skip"`` or ``"error"``, see :func:`encode_into`. With
+        ``"error"``, the chunks before the offending one have already been written.
+    :param case: ``"upper"``, ``"lower"`` or ``"preserve"``, see :func:`encode_into`.
+    :returns: The number of letters encoded.
+    :rtype: int
+    """
+    if non_letters not in NON_LETTER_POLICIES:
+        raise ValueError(f"Invalid non-letter policy: {non_letters}. Must be one of {NON_LETTER_POLICIES}.")
+
+    tables = MachineTables(machine)
+    decoder = codecs.getincrementaldecoder("utf-8")() if isinstance(writer, io.TextIOBase) else None
+    buffer = bytearray(chunk_size)
+    start_offset = machine.offset
+
+    while True:
+        chunk = reader.read(chunk_size)
+        if not chunk:
+            break
+        if isinstance(chunk, str):
+            chunk = chunk.encode("utf-8")
+        if len(chunk) > len(buffer):
+            buffer = bytearray(len(chunk))
+
+        size = encode_into(machine, chunk, buffer, case, non_letters, tables)
+        view = memoryview(buffer)[:size]
+        writer.write(decoder.decode(view) if decoder else view)
+        view.release()
+
+    if decoder:
+        writer.write(decoder.decode(b"", final=True))
+    return machine.offset - start_offset
+
+
+def encode_file(machine: Enigma, input_path, writer, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                non_letters: str = "passthrough", case: str = "upper"):
+    """
+    Encodes a file through a read-only memory map, so its pages are read on demand and can be dropped by the
+    operating system once they have been encoded.
+
+    See :func:`encode_stream` for the parameters.
+    """
+    with open(input_path, "rb") as input_file:
+        try:
+            mapped = mmap.mmap(input_file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty files can't be mapped
+            return encode_stream(machine, input_file, writer, chunk_size, non_letters, case)
+        with mapped:
+            if hasattr(mmap, "MADV_SEQUENTIAL"):
+                mapped.madvise(mmap.MADV_SEQUENTIAL)
+            return encode_stream(machine, mapped, writer, chunk_size, non_letters, case)
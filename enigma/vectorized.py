@@ -0,0 +1,201 @@
+"""
+NumPy implementation of the Enigma signal path for long messages.
+
+Instead of stepping the rotors one key press at a time, the rotor positions for every character of a message are
+computed at once with :func:`enigma.enigma.advance_positions`, and the plugboard, rotors, reflector and return path
+are applied as table gathers over the whole array. The results match :meth:`Enigma.encode_character` exactly.
+"""
+import numpy as np
+
+from enigma import metrics
+from enigma.enigma import ALPHABET_SIZE, Enigma, advance_positions
+
+
+def shifted_tables(table):
+    """
+    Expands a compiled wiring table into a ``(26, 26)`` array indexed by ``[position, pin]``, so a rotor at any
+    position becomes a single gather: ``shifted[p, x] == (table[(x + p) % 26] - p) % 26``.
+    """
+    table = np.asarray(table, dtype=np.int16)
+    position = np.arange(ALPHABET_SIZE)[:, None]
+    pin = np.arange(ALPHABET_SIZE)[None, :]
+    return ((table[(pin + position) % ALPHABET_SIZE] - position) % ALPHABET_SIZE).astype(np.uint8)
+
+
+class MachineTables:
+    """
+    Read-only NumPy copy of the wiring and stepping rules of an :class:`Enigma` machine.
+
+    The tables do not hold rotor positions, so one instance can encode from any state of the machine it was
+    built from, and it can be pickled to worker processes.
+
+    :ivar forward: ``(rotors, 26, 26)`` right-to-left tables indexed by ``[rotor, position, pin]``.
+    :type forward: numpy.ndarray
+    :ivar inverse: ``(rotors, 26, 26)`` left-to-right tables indexed by ``[rotor, position, pin]``.
+    :type inverse: numpy.ndarray
+    :ivar plugboard: 26 entry plugboard permutation.
+    :type plugboard: numpy.ndarray
+    """
+    def __init__(self, machine: Enigma):
+        self.rotating = [rotor.can_rotate for rotor in machine.rotors]
+        self.notches = [rotor.carry_notch for rotor in machine.rotors]
+        self.forward = np.stack([shifted_tables(rotor.forward) for rotor in machine.rotors])
+        self.inverse = np.stack([shifted_tables(rotor.inverse) for rotor in machine.rotors])
+        self.plugboard = np.frombuffer(machine.plugboard.permutation, dtype=np.uint8).copy()
+
+    def positions(self, start_positions, steps):
+        """
+        Rotor positions after ``steps`` key presses from ``start_positions``, one array (or int, for rotors
+        that never move) per rotor. See :func:`enigma.enigma.advance_positions`.
+        """
+        return advance_positions(start_positions, steps, self.rotating, self.notches)
+
+    def encode(self, letters, positions):
+        """
+        Runs the full signal path over an array of letter indices.
+
+        :param letters: Array of letter indices (0-25).
+        :param positions: Per-rotor positions for each letter, as returned by :meth:`positions`.
+        :returns: Array of encoded letter indices, with the same shape as ``letters``.
+        :rtype: numpy.ndarray
+        """
+        # Row offsets into the flattened (26 * 26) tables, shared by the forward and return paths
+        rows = [np.asarray(position, dtype=np.int32) * ALPHABET_SIZE for position in positions]
+        letters = self.plugboard[letters]
+        for rotor, row in enumerate(rows):
+            letters = np.take(self.forward[rotor].ravel(), row + letters)
+        for rotor in reversed(range(len(rows) - 1)):
+            letters = np.take(self.inverse[rotor].ravel(), rows[rotor] + letters)
+        return self.plugboard[letters]
+
+
+def to_indices(message: str):
+    """
+    Converts a message into a ``uint8`` array of letter indices, upper-casing it first.
+
+    :raises ValueError: If the message contains anything but English letters.
+    """
+    data = np.frombuffer(message.encode("ascii", errors="replace").upper(), dtype=np.uint8) - ord("A")
+    invalid = np.flatnonzero(data >= ALPHABET_SIZE)
+    if invalid.size:
+        character = message[invalid[0]]
+        raise ValueError(f"Invalid character: {character}. Must be an uppercase English letter.")
+    return data
+
+
+def to_message(indices):
+    """Converts an array of letter indices back into an uppercase string."""
+    return (np.asarray(indices, dtype=np.uint8) + ord("A")).tobytes().decode("ascii")
+
+
+@metrics.timed("encode")
+def encode_indices(machine: Enigma, letters, tables: MachineTables = None):
+    """
+    Encodes an array of letter indices from the machine's current rotor positions and advances the machine
+    past them, exactly as the same number of :meth:`Enigma.encode_character` calls would.
+
+    :param machine: The machine to encode with.
+    :param letters: Array of letter indices (0-25).
+    :param tables: Precomputed tables for ``machine``, to avoid rebuilding them for every call.
+    :returns: Array of encoded letter indices.
+    :rtype: numpy.ndarray
+    """
+    if tables is None:
+        tables = MachineTables(machine)
+    letters = np.asarray(letters, dtype=np.uint8)
+    if metrics.enabled:
+        metrics.record_encode(machine, letters.size)
+    start_positions = machine.rotor_positions
+    steps = np.arange(1, letters.size + 1, dtype=np.int32)
+    encoded = tables.encode(letters, tables.positions(start_positions, steps))
+
+    for rotor, position in zip(machine.rotors, machine.advance(start_positions, letters.size)):
+        rotor.position = position
+    machine.offset += letters.size
+    return encoded
+
+
+def encode(machine: Enigma, message: str, tables: MachineTables = None):
+    """
+    Vectorized equivalent of :meth:`Enigma.encode` for long messages.
+
+    :param machine: The machine to encode with. Its rotors are advanced past the message.
+    :param message: The message to encode. Lowercase letters are upper-cased, anything else is rejected.
+    :param tables: Precomputed tables for ``machine``.
+    :return: A string representing the encoded message.
+    :rtype: str
+    """
+    return to_message(encode_indices(machine, to_indices(message), tables))
+
+
+def key_positions(machine: Enigma, keys):
+    """
+    Converts message keys into start positions for the rotors of ``machine``.
+
+    :param keys: Message keys in the layout of ``initial_positions`` (leftmost rotor first), e.g. ``"AAZ"``.
+    :returns: One ``(len(keys), 1)`` array per rotor, fast rotor first, ready to broadcast against key presses.
+    :rtype: list
+    :raises ValueError: If a key has the wrong length or is not made of letters.
+    """
+    width = len(machine.rotors) - 1
+    if any(len(key) != width for key in keys):
+        raise ValueError(f"Invalid message key. Must be {width} letters, one per rotor.")
+    keys = to_indices("".join(keys)).reshape(len(keys), width)[:, ::-1].astype(np.int32)
+    reflector = machine.reflector_ring.position
+    return [keys[:, rotor, None] for rotor in range(width)] + [np.full((len(keys), 1), reflector, dtype=np.int32)]
+
+
+@metrics.timed("encode")
+def encode_batch(machine: Enigma, messages, keys, tables: MachineTables = None):
+    """
+    Encodes many messages under the daily setting of ``machine`` (rotors, rings, reflector and plugboard), each
+    from its own message key, as if each were encoded by a fresh :class:`Enigma` with ``initial_positions=key``.
+
+    The messages are laid out as a zero-padded ``(messages, longest)`` array and every machine is stepped at once,
+    so a batch costs a handful of gathers however many messages it holds. The machine itself is not advanced.
+
+    :param machine: The machine holding the daily setting.
+    :param messages: The messages to encode. Lowercase letters are upper-cased, anything else is rejected.
+    :param keys: One message key per message, leftmost rotor first.
+    :param tables: Precomputed tables for ``machine``.
+    :returns: The encoded messages, in order.
+    :rtype: list[str]
+    """
+    if len(messages) != len(keys):
+        raise ValueError("Expected one message key per message.")
+    if not messages:
+        return []
+    if tables is None:
+        tables = MachineTables(machine)
+
+    lengths = np.fromiter(map(len, messages), dtype=np.int64, count=len(messages))
+    letters = to_indices("".join(messages))
+
+    steps = np.arange(1, lengths.max() + 1, dtype=np.int32)
+    present = steps[None, :] <= lengths[:, None]
+    padded = np.zeros(present.shape, dtype=np.uint8)
+    padded[present] = letters
+
+    start_positions = key_positions(machine, keys)
+    if metrics.enabled:
+        metrics.record_encode(machine, lengths[:, None], start_positions)
+    encoded = tables.encode(padded, tables.positions(start_positions, steps[None, :]))
+    text = to_message(encoded[present])
+    ends = np.cumsum(lengths).tolist()
+    return [text[end - length:end] for end, length in zip(ends, lengths.tolist())]
+
+
+def position_trace(machine: Enigma, start_positions, length: int):
+    """
+    Rotor positions used for each of the next ``length`` characters from ``start_positions``, as strings in the
+    layout of :attr:`Enigma.position_letters`.
+
+    :rtype: list[str]
+    """
+    steps = np.arange(1, length + 1, dtype=np.int32)
+    columns = [np.broadcast_to(position, steps.shape) for position in reversed(machine.advance(start_positions,
+                                                                                                 steps)[:-1])]
+    letters = (np.stack(columns, axis=1) + ord("A")).astype(np.uint8)
+    width = len(columns)
+    text = letters.tobytes().decode("ascii")
+    return [text[index:index + width] for index in range(0, len(text), width)]
@@ -0,0 +1,145 @@
+import json
+import threading
+import unittest
+
+import simple_websocket
+from werkzeug.serving import make_server
+
+from app import app, service, sessions
+from enigma.enigma import Enigma
+
+CONFIGURATION = {"rotors": ["I", "II", "III"], "reflector": "B", "rings": [1, 1, 1], "positions": "AAZ",
+                 "plugboard": ["HL", "MO", "AJ", "CX", "BZ", "SR", "NI", "YW", "DG", "PK"]}
+
+
+class TestApp(unittest.TestCase):
+    def setUp(self):
+        self.client = app.test_client()
+
+    def init(self, configuration=CONFIGURATION):
+        response = self.client.post("/init", json=configuration)
+        self.assertEqual(response.status_code, 200)
+        return response.get_json()["session_id"]
+
+    def test_init_and_encode_character(self):
+        session_id = self.init()
+        response = self.client.post("/encode", json={"session_id": session_id, "character": "h"}).get_json()
+        self.assertEqual(response["output"], "R")
+        self.assertEqual(response["rotorPositions"], ["A", "A", "A"])
+
+    def test_init_with_frontend_plugboard(self):
+        session_id = self.init({**CONFIGURATION, "plugboard": {"H": "L", "L": "H", "M": "O", "O": "M"}})
+        with sessions.use(session_id) as machine:
+            self.assertEqual(machine.plugboard.encode("L"), "H")
+
+    def test_invalid_configuration(self):
+        response = self.client.post("/init", json={**CONFIGURATION, "plugboard": ["AB", "AC"]})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post("/init", json={**CONFIGURATION, "rotors": ["IX", "II", "III"]})
+        self.assertEqual(response.status_code, 400)
+        for body in ([], "x", 5):
+            self.assertEqual(self.client.post("/init", json=body).status_code, 400)
+        for invalid in ({"plugboard": [1, 2]}, {"plugboard": {"A": 1}}, {"plugboard": "AB"}, {"rotors": []},
+                        {"rotors": "I"}, {"rotors": ["I", "II", "B"]}, {"reflector": "I"}, {"rings": [0, 0, 0]},
+                        {"rings": [1, 1]}, {"rings": ["1", 1, 1]}, {"positions": "A1Z"}, {"positions": "AA"}):
+            with self.subTest(invalid=invalid):
+                self.assertEqual(self.client.post("/init", json={**CONFIGURATION, **invalid}).status_code, 400)
+
+    def test_non_letters_error(self):
+        session_id = self.init()
+        response = self.client.post("/encode", json={"session_id": session_id, "text": "Hello, World",
+                                                     "non_letters": "error"})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post("/encode", json={"session_id": session_id, "texts": ["Hello", "World"],
+                                                     "non_letters": "error"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual("".join(response.get_json()["outputs"]), "RFKTMBXVVW")
+
+    def test_encode_text(self):
+        session_id = self.init()
+        response = self.client.post("/encode", json={"session_id": session_id, "text": "Hello, World",
+                                                     "trace": True}).get_json()
+        self.assertEqual(response["output"], "RFKTM, BXVVW")
+        self.assertEqual(response["trace"][:3], ["AAA", "AAB", "AAC"])
+        self.assertEqual(len(response["trace"]), 10)
+        self.assertEqual(response["rotorPositions"], list(response["trace"][-1]))
+
+    def test_encode_batch(self):
+        session_id = self.init()
+        response = self.client.post("/encode", json={"session_id": session_id, "texts": ["HELLO", "WORLD"],
+                                                     "non_letters": "skip"}).get_json()
+        self.assertEqual(response["outputs"], ["RFKTM", "BXVVW"])
+        self.assertNotIn("traces", response)
+
+    def test_sessions_are_independent(self):
+        first, second = self.init(), self.init()
+        self.client.post("/encode", json={"session_id": first, "text": "HELLO"})
+        response = self.client.post("/encode", json={"session_id": second, "text": "HELLO"}).get_json()
+        self.assertEqual(response["output"], "RFKTM")
+
+    def test_errors(self):
+        session_id = self.init()
+        self.assertEqual(self.client.post("/encode", json={"session_id": "missing", "text": "A"}).status_code, 404)
+        self.assertEqual(self.client.post("/encode", json={"session_id": session_id}).status_code, 400)
+        for invalid in ([session_id], {"id": session_id}, None):
+            self.assertEqual(self.client.post("/encode", json={"session_id": invalid, "text": "A"}).status_code, 400)
+        # One malformed request doesn't fail the others of its batch
+        batch = [{"session_id": [session_id], "text": "A"}, {"session_id": session_id, "text": "A"}]
+        results = service.encode_batch(batch)
+        self.assertEqual([status for _, status in results], [400, 200])
+        self.assertEqual(self.client.post("/encode", json={"session_id": session_id, "character": "1"}).status_code,
+                         400)
+        self.assertEqual(self.client.post("/encode", json={"session_id": session_id, "text": "A",
+                                                           "non_letters": "drop"}).status_code, 400)
+
+    def test_session_stats(self):
+        self.init()
+        stats = self.client.get("/sessions").get_json()
+        self.assertGreaterEqual(stats["sessions"], 1)
+        self.assertIn("evicted_lru", stats)
+
+
+class TestPositionLetters(unittest.TestCase):
+    def test_layout_matches_initial_positions(self):
+        machine = Enigma(rotor_sequence=["IV", "V", "Beta", "I"], reflector="A", initial_positions="EZGP")
+        self.assertEqual(machine.position_letters, "EZGP")
+
+
+class TestKeystrokeChannel(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = make_server("127.0.0.1", 0, app, threaded=True)
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+
+    def connect(self, session_id):
+        return simple_websocket.Client.connect(f"ws://127.0.0.1:{self.server.port}/keystrokes?session_id={session_id}")
+
+    def test_keystrokes(self):
+        session_id = app.test_client().post("/init", json=CONFIGURATION).get_json()["session_id"]
+        ws = self.connect(session_id)
+        try:
+            outputs = ""
+            for key in "Hello world":
+                ws.send(key)
+            while len(outputs) < len("Hello world"):
+                frame = json.loads(ws.receive(timeout=5))
+                outputs += frame["output"]
+            self.assertEqual(outputs, "RFKTM BXVVW")
+            self.assertEqual(frame["rotorPositions"], ["A", "A", "J"])
+        finally:
+            ws.close()
+
+    def test_unknown_session(self):
+        ws = self.connect("missing")
+        with self.assertRaises(simple_websocket.ConnectionClosed) as closed:
+            ws.receive(timeout=5)
+        self.assertEqual(closed.exception.reason, 1008)
+
+
+if __name__ == '__main__':
+    unittest.main()
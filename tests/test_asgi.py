@@ -0,0 +1,123 @@
+import asyncio
+import json
+import unittest
+
+from asgi import create_app
+from enigma.enigma import Enigma
+
+CONFIGURATION = {"rotors": ["I", "II", "III"], "reflector": "B", "rings": [1, 1, 1], "positions": "AAZ",
+                 "plugboard": ["HL", "MO", "AJ", "CX", "BZ", "SR", "NI", "YW", "DG", "PK"]}
+
+
+async def request(app, method, path, payload=None):
+    body = json.dumps(payload).encode() if payload is not None else b""
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    await app({"type": "http", "method": method, "path": path, "query_string": b""}, receive, send)
+    status = sent[0]["status"]
+    return status, json.loads(sent[1]["body"]) if sent[1]["body"] else None
+
+
+class TestASGI(unittest.TestCase):
+    def run_async(self, coroutine):
+        return asyncio.run(coroutine)
+
+    def test_routes(self):
+        async def scenario():
+            app = create_app()
+            status, init = await request(app, "POST", "/init", CONFIGURATION)
+            self.assertEqual(status, 200)
+            status, encoded = await request(app, "POST", "/encode", {"session_id": init["session_id"],
+                                                                    "text": "Hello, World", "trace": True})
+            self.assertEqual(encoded["output"], "RFKTM, BXVVW")
+            self.assertEqual(len(encoded["trace"]), 10)
+            self.assertEqual((await request(app, "POST", "/encode", {"session_id": "missing", "text": "A"}))[0], 404)
+            self.assertEqual((await request(app, "GET", "/missing"))[0], 404)
+            self.assertEqual((await request(app, "OPTIONS", "/encode"))[0], 204)
+            await app.batcher.close()
+
+        self.run_async(scenario())
+
+    def test_micro_batching(self):
+        message = "THEQUICKBROWNFOXJUMPSOVERTHELAZYDOG" * 4
+
+        async def scenario():
+            app = create_app(max_batch_size=64, max_batch_delay=0.05)
+            sessions = [(await request(app, "POST", "/init", CONFIGURATION))[1]["session_id"] for _ in range(3)]
+            calls = [request(app, "POST", "/encode", {"session_id": session_id, "character": character})
+                     for character in message for session_id in sessions]
+            results = await asyncio.gather(*calls)
+            _, stats = await request(app, "GET", "/sessions")
+            await app.batcher.close()
+            return results, stats
+
+        results, stats = self.run_async(scenario())
+        expected = Enigma(rotor_sequence=["I", "II", "III"], reflector="B", initial_positions="AAZ",
+                          plug_combinations=CONFIGURATION["plugboard"]).encode(message)
+        for session in range(3):
+            outputs = "".join(payload["output"] for _, payload in results[session::3])
+            self.assertEqual(outputs, expected)
+        self.assertEqual(stats["batching"]["requests"], len(message) * 3)
+        self.assertLess(stats["batching"]["batches"], len(message) * 3)
+        self.assertLessEqual(stats["batching"]["largest_batch"], 64)
+
+    def test_keystrokes_percent_encoded_session(self):
+        async def scenario():
+            app = create_app()
+            session_id = (await request(app, "POST", "/init", CONFIGURATION))[1]["session_id"]
+            incoming = [{"type": "websocket.connect"}, {"type": "websocket.receive", "text": "H"},
+                        {"type": "websocket.disconnect"}]
+            sent = []
+
+            async def receive():
+                return incoming.pop(0)
+
+            async def send(message):
+                sent.append(message)
+
+            query = "session_id=" + "".join(f"%{byte:02X}" for byte in session_id.encode())
+            await app({"type": "websocket", "path": "/keystrokes", "query_string": query.encode()}, receive, send)
+            await app.batcher.close()
+            return sent
+
+        sent = self.run_async(scenario())
+        self.assertEqual([message["type"] for message in sent], ["websocket.accept", "websocket.send"])
+        self.assertEqual(json.loads(sent[1]["text"])["output"], "R")
+
+    def test_keystrokes(self):
+        async def scenario():
+            app = create_app()
+            session_id = (await request(app, "POST", "/init", CONFIGURATION))[1]["session_id"]
+            incoming = [{"type": "websocket.connect"}] + [{"type": "websocket.receive", "text": key} for key in "HI"]
+            incoming.append({"type": "websocket.disconnect"})
+            sent = []
+
+            async def receive():
+                return incoming.pop(0)
+
+            async def send(message):
+                sent.append(message)
+
+            await app({"type": "websocket", "path": "/keystrokes",
+                       "query_string": f"session_id={session_id}".encode()}, receive, send)
+            await app.batcher.close()
+            self.assertEqual(app.batcher.stats["requests"], 0)
+            return sent
+
+        sent = self.run_async(scenario())
+        self.assertEqual(sent[0]["type"], "websocket.accept")
+        self.assertEqual("".join(json.loads(message["text"])["output"] for message in sent[1:]), "RW")
+        # Both frames were waiting, so they were coalesced into one reply without going through the batcher
+        self.assertEqual(len(sent), 2)
+        self.assertEqual(json.loads(sent[1]["text"])["input"], "HI")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,44 @@
+import json
+import os
+import tempfile
+import unittest
+
+from benchmarks import bench
+
+
+class TestBenchmarks(unittest.TestCase):
+    def test_compare(self):
+        baseline = {"results": {"a": {"seconds_per_op": 1.0}, "b": {"seconds_per_op": 1.0}}}
+        results = {"results": {"a": {"seconds_per_op": 1.1}, "b": {"seconds_per_op": 1.5},
+                               "c": {"seconds_per_op": 9.0}}}
+        self.assertEqual(bench.compare(results, baseline, 0.2), [("b", 1.5)])
+
+    def test_regression_fails_run(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, "results.json")
+            self.assertEqual(bench.main(["--quick", "-k", "plugboard/0-leads", "--output", output]), 0)
+            with open(output) as results:
+                results = json.load(results)
+            self.assertEqual(list(results["results"]), ["plugboard/0-leads"])
+
+            results["results"]["plugboard/0-leads"]["seconds_per_op"] /= 100
+            baseline = os.path.join(directory, "baseline.json")
+            with open(baseline, "w") as baseline_file:
+                json.dump(results, baseline_file)
+            self.assertEqual(bench.main(["--quick", "-k", "plugboard/0-leads", "--baseline", baseline]), 1)
+
+    def test_http_load_restores_metrics(self):
+        from enigma import metrics
+
+        was_enabled = metrics.enabled
+        metrics.disable()
+        try:
+            result = bench.http_load({"character": "A"}, threads=1, requests_per_thread=2)
+            self.assertFalse(metrics.enabled)
+            self.assertIn("metrics", result)
+        finally:
+            (metrics.enable if was_enabled else metrics.disable)()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+import unittest
+
+from enigma.bombe import Bombe, menu, possible_offsets
+from enigma.enigma import Enigma
+
+KEY = dict(rotor_sequence=["II", "V", "III"], reflector="B", ring_setting=[1, 1, 1], initial_positions="KDQ",
+           plug_combinations=["AJ", "BZ", "CX", "DG", "HL", "IN", "KP", "MO", "RS", "WY"])
+PLAINTEXT = "WETTERVORHERSAGEFUERDIEREGIONHEUTEKLARUNDSONNIG"
+CRIB = "WETTERVORHERSAGEFUERDIEREGION"
+
+
+class TestMenu(unittest.TestCase):
+    def setUp(self):
+        self.ciphertext = Enigma(**KEY).encode(PLAINTEXT)
+
+    def test_menu(self):
+        edges = menu(self.ciphertext, CRIB, 0)
+        self.assertEqual(len(edges), len(CRIB))
+        self.assertEqual(edges[0], (ord("W") - ord("A"), ord(self.ciphertext[0]) - ord("A"), 1))
+        self.assertIn(0, possible_offsets(self.ciphertext, CRIB))
+        self.assertTrue(all(not any(a == b for a, b in zip(self.ciphertext[offset:], CRIB))
+                            for offset in possible_offsets(self.ciphertext, CRIB)))
+
+    def test_invalid_alignment(self):
+        offsets = set(possible_offsets(self.ciphertext, CRIB))
+        invalid = next(offset for offset in range(len(PLAINTEXT) - len(CRIB) + 1) if offset not in offsets)
+        with self.assertRaises(ValueError):
+            menu(self.ciphertext, CRIB, invalid)
+        with self.assertRaises(ValueError):
+            menu(self.ciphertext, CRIB, len(PLAINTEXT))
+
+
+class TestBombe(unittest.TestCase):
+    def test_finds_key_and_steckers(self):
+        ciphertext = Enigma(**KEY).encode(PLAINTEXT)
+        bombe = Bombe(ciphertext, CRIB, rotor_orders=[("I", "II", "III"), ("II", "V", "III")], reflectors=["B"])
+        results = dict(bombe.run(workers=1))
+        self.assertEqual(results[0], [])
+        self.assertEqual(results[1], [KEY])
+        self.assertEqual(Enigma(**results[1][0]).decode(ciphertext), PLAINTEXT)
+
+        stop = next(stop for stop in bombe.stops(1) if stop["verified"])
+        self.assertEqual(stop["steckers"]["E"], "E")
+        self.assertEqual(stop["steckers"]["W"], "Y")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import random
+import string
+import tempfile
+import unittest
+
+from enigma import cache
+from enigma.cache import KeystreamCache, carry_chain, configuration_key
+from enigma.enigma import Enigma
+
+CONFIGURATIONS = [
+    dict(rotor_sequence=["I", "II", "III"], reflector="B", ring_setting=[1, 1, 1], initial_positions="AAZ",
+         plug_combinations=["HL", "MO", "AJ", "CX", "BZ", "SR", "NI", "YW", "DG", "PK"]),
+    dict(rotor_sequence=["IV", "V", "Beta"], reflector="B", ring_setting=[14, 9, 24], initial_positions="QRS"),
+    dict(rotor_sequence=["I", "Gamma", "V"], reflector="C", ring_setting=[2, 3, 4], initial_positions="KLZ"),
+]
+
+
+class TestKeystreamCache(unittest.TestCase):
+    def setUp(self):
+        rng = random.Random(13)
+        self.message = "".join(rng.choice(string.ascii_uppercase) for _ in range(20000))
+
+    def test_matches_encode(self):
+        keystreams = KeystreamCache()
+        for configuration in CONFIGURATIONS:
+            with self.subTest(configuration=configuration):
+                machine = Enigma(**configuration)
+                self.assertEqual(cache.encode(machine, self.message, keystreams), Enigma(**configuration).encode(
+                    self.message))
+                self.assertEqual(machine.rotor_positions, machine.state_at(len(self.message) - 1))
+
+    def test_carry_chain(self):
+        self.assertEqual([carry_chain(Enigma(**configuration)) for configuration in CONFIGURATIONS], [3, 1, 2])
+
+    def test_shared_between_start_positions(self):
+        keystreams = KeystreamCache()
+        first = Enigma(**CONFIGURATIONS[0])
+        second = Enigma(**{**CONFIGURATIONS[0], "initial_positions": "QEV"})
+        self.assertEqual(configuration_key(first), configuration_key(second))
+        self.assertEqual(cache.encode(second, self.message[:500], keystreams),
+                         Enigma(**{**CONFIGURATIONS[0], "initial_positions": "QEV"}).encode(self.message[:500]))
+        cache.encode(first, "HELLO", keystreams)
+        self.assertEqual(keystreams.stats()["entries"], 1)
+        self.assertEqual(keystreams.stats()["hits"], 1)
+
+    def test_lru_eviction(self):
+        keystreams = KeystreamCache(max_bytes=1)
+        for configuration in CONFIGURATIONS:
+            keystreams.get(Enigma(**configuration))
+        stats = keystreams.stats()
+        self.assertEqual(stats["entries"], 1)
+        self.assertEqual(stats["evictions"], 2)
+
+    def test_memory_mapped_directory(self):
+        with tempfile.TemporaryDirectory() as directory:
+            KeystreamCache(directory=directory).get(Enigma(**CONFIGURATIONS[0]))
+            keystream = KeystreamCache(directory=directory).get(Enigma(**CONFIGURATIONS[0]))
+            self.assertFalse(keystream.table.flags.writeable)
+            machine = Enigma(**CONFIGURATIONS[0])
+            self.assertEqual(cache.encode(machine, "HELLOWORLD", KeystreamCache(directory=directory)), "RFKTMBXVVW")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import unittest
+
+import numpy as np
+
+from enigma.ciphertext_only import CiphertextOnlyAttack, plug_combinations, scrambler
+from enigma.enigma import Enigma
+from enigma.ngrams import NgramScorer, index_of_coincidence
+from enigma.vectorized import to_indices
+
+CORPUS = """
+It was the best of times, it was the worst of times, it was the age of wisdom, it was the age of foolishness, it was
+the epoch of belief, it was the epoch of incredulity, it was the season of Light, it was the season of Darkness, it
+was the spring of hope, it was the winter of despair, we had everything before us, we had nothing before us, we were
+all going direct to Heaven, we were all going direct the other way. In short, the period was so far like the present
+period, that some of its noisiest authorities insisted on its being received, for good or for evil, in the
+superlative degree of comparison only. There were a king with a large jaw and a queen with a plain face, on the
+throne of England; there were a king with a large jaw and a queen with a fair face, on the throne of France. In both
+countries it was clearer than crystal to the lords of the State preserves of loaves and fishes, that things in
+general were settled for ever.
+"""
+PLAINTEXT = "".join(character for character in CORPUS.upper() if character.isalpha())[:400]
+KEY = dict(rotor_sequence=["II", "IV", "I"], reflector="B", ring_setting=[1, 1, 4], initial_positions="RGM",
+           plug_combinations=["AT", "SW", "EK"])
+
+
+class TestScorers(unittest.TestCase):
+    def test_index_of_coincidence(self):
+        self.assertAlmostEqual(float(index_of_coincidence(to_indices("AABB"))), 4 / 12)
+        self.assertEqual(index_of_coincidence(np.zeros((3, 2, 10), dtype=np.uint8)).shape, (3, 2))
+
+    def test_rescore_matches_score(self):
+        scorer = NgramScorer.from_corpus(CORPUS, n=3)
+        rng = np.random.default_rng(8)
+        old = rng.integers(0, 26, 300)
+        new = np.tile(old, (4, 1))
+        new[1, 0] = 5
+        new[2, 299] = 7
+        new[3, [40, 41, 200]] = 1
+        np.testing.assert_allclose(scorer.rescore(scorer.score(old), old, new), scorer.score(new), rtol=1e-5)
+
+
+class TestCiphertextOnlyAttack(unittest.TestCase):
+    def setUp(self):
+        self.ciphertext = Enigma(**KEY).encode(PLAINTEXT)
+        self.attack = CiphertextOnlyAttack(self.ciphertext, NgramScorer.from_corpus(CORPUS, n=3),
+                                           rotor_orders=[("II", "IV", "I"), ("I", "II", "III")], reflectors=["B"])
+
+    def test_scrambler_matches_machine(self):
+        machine = Enigma(**KEY)
+        scramble = scrambler(KEY, len(self.ciphertext))
+        permutation = np.array(list(machine.plugboard.permutation))
+        self.assertEqual(self.attack.decrypt(scramble, permutation)[0].tolist(),
+                         to_indices(machine.decode(self.ciphertext)).tolist())
+        self.assertEqual(plug_combinations(permutation), ["AT", "EK", "SW"])
+
+    def test_recovers_plaintext(self):
+        ranked = self.attack.rank_start_positions(("II", "IV", "I"), "B", top=5)
+        reports = []
+        result = max((self.attack.climb(key, report=reports.append) for _, key in ranked),
+                     key=lambda candidate: candidate["score"])
+        self.assertEqual(result["plaintext"], PLAINTEXT)
+        self.assertEqual(sorted(result["key"]["plug_combinations"]), sorted(KEY["plug_combinations"]))
+        self.assertEqual(Enigma(**result["key"]).decode(self.ciphertext), PLAINTEXT)
+        self.assertTrue(reports)
+
+    def test_run(self):
+        reports = []
+        results = self.attack.run(workers=2, top=3, report=reports.append)
+        self.assertEqual(results[0]["plaintext"], PLAINTEXT)
+        self.assertEqual(reports[-1]["score"], results[0]["score"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import os
+import random
+import string
+import tempfile
+import unittest
+
+import numpy as np
+
+from enigma import cycles
+from enigma.enigma import Enigma
+
+KEY = dict(rotor_sequence=["II", "I", "III"], reflector="B", ring_setting=[1, 1, 1], initial_positions="KFQ",
+           plug_combinations=["AB", "CX", "MN", "TZ", "EQ", "GS"])
+
+
+def indicators(key, count=150, seed=1):
+    rng = random.Random(seed)
+    message_keys = ["".join(rng.choice(string.ascii_uppercase) for _ in range(3)) for _ in range(count)]
+    return [Enigma(**key).encode(message_key * 2) for message_key in message_keys]
+
+
+class TestCharacteristics(unittest.TestCase):
+    def test_partitions(self):
+        self.assertEqual(len(cycles.PARTITIONS), 101)
+        self.assertEqual(cycles.PARTITIONS[0], (13,))
+        # A single 26-cycle is not paired, two 13-cycles are
+        with self.assertRaises(ValueError):
+            cycles.partition_ids(np.array([np.roll(np.arange(26), 1)]))
+        halves = np.concatenate([np.roll(np.arange(13), 1), np.roll(np.arange(13, 26), 1)])
+        self.assertEqual(cycles.partition_ids(np.array([halves]))[0], cycles.PARTITION_IDS[(13,)])
+
+    def test_plugboard_does_not_change_characteristic(self):
+        characteristic = cycles.characteristic_from_indicators(indicators(KEY))
+        self.assertEqual(characteristic,
+                         cycles.characteristic_from_indicators(indicators({**KEY, "plug_combinations": None})))
+        self.assertTrue(all(sum(partition) == 13 for partition in characteristic))
+
+        keys = cycles.characteristics(KEY["rotor_sequence"], KEY["reflector"])
+        position = np.ravel_multi_index([cycles.ALPHABET.index(letter) for letter in reversed("KFQ")], (26,) * 3)
+        self.assertEqual(keys[position], cycles.characteristic_key(characteristic))
+        self.assertEqual(cycles.position_letters(position, 3), "KFQ")
+
+    def test_invalid_indicators(self):
+        with self.assertRaises(ValueError):
+            cycles.characteristic_from_indicators(indicators(KEY, count=3))
+        with self.assertRaises(ValueError):
+            cycles.characteristic_from_indicators(["ABCDEF", "AXCDEF"])
+        with self.assertRaises(ValueError):
+            cycles.characteristic_from_indicators(["ABCDE"])
+
+
+class TestCycleIndex(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "cycles.bin")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_lookup(self):
+        self.assertEqual(cycles.build_index(self.path, rotor_orders=[("II", "I", "III"), ("I", "II", "III")],
+                                            reflectors=["B"]),
+                         {"groups": 2, "built": 2, "reused": 0, "entries": 2 * 26 ** 3})
+        index = cycles.CycleIndex(self.path)
+        self.assertEqual(len(index), 2 * 26 ** 3)
+        self.assertTrue(np.all(np.diff(index.keys.astype(np.int64)) >= 0))
+
+        characteristic = cycles.characteristic_from_indicators(indicators(KEY))
+        matches = index.lookup(characteristic)
+        self.assertEqual(len(matches), index.count(characteristic))
+        self.assertIn({**KEY, "plug_combinations": None}, matches)
+
+    def test_incremental_rebuild(self):
+        cycles.build_index(self.path, rotor_orders=[("I", "II", "III")], reflectors=["B"])
+        stats = cycles.build_index(self.path, rotor_orders=[("I", "II", "III"), ("III", "II", "I")], reflectors=["B"])
+        self.assertEqual((stats["built"], stats["reused"]), (1, 1))
+        with open(self.path, "rb") as incremental:
+            incremental = incremental.read()
+
+        os.remove(self.path)
+        cycles.build_index(self.path, rotor_orders=[("I", "II", "III"), ("III", "II", "I")], reflectors=["B"])
+        with open(self.path, "rb") as full:
+            self.assertEqual(full.read(), incremental)
+
+    def test_invalid_file(self):
+        with open(self.path, "wb") as index_file:
+            index_file.write(b"not an index")
+        with self.assertRaises(ValueError):
+            cycles.CycleIndex(self.path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,199 @@
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from concurrent.futures import Future, ThreadPoolExecutor
+from unittest import mock
+
+from enigma.enigma import Enigma
+from enigma.jobs import JobQueue, QueueLocked
+from enigma.service import encode_text, machine_from
+
+CONFIGURATION = {"rotors": ["I", "II", "III"], "reflector": "B", "rings": [1, 1, 1], "positions": "AAZ",
+                 "plugboard": ["HL", "MO", "AJ"]}
+TEXT = "Grüße aus Berlin, the quick brown fox jumps over the lazy dog! " * 60
+KEY = dict(rotor_sequence=["II", "V", "III"], reflector="B", ring_setting=[1, 1, 1], initial_positions="KDQ",
+           plug_combinations=None)
+SEARCH = {"kind": "search", "ciphertext": Enigma(**KEY).encode("WETTERVORHERSAGE"), "crib": "WETTERVORHERSAGE",
+          "rotor_orders": [["I", "II", "III"], ["II", "V", "III"], ["III", "I", "II"]], "reflectors": ["B", "C"],
+          "ring_settings": [[1, 1, 1]]}
+
+
+class ManualExecutor:
+    """Executor whose units only run when the test releases them, recording the order they were submitted in."""
+    def __init__(self):
+        self.submitted = []
+        self.lock = threading.Lock()
+
+    def submit(self, function, *args):
+        future = Future()
+        with self.lock:
+            self.submitted.append((future, function, args))
+        return future
+
+    def wait_for(self, count):
+        deadline = time.monotonic() + 5
+        while len(self.submitted) < count and time.monotonic() < deadline:
+            time.sleep(0.001)
+        return self.submitted[count - 1][0]
+
+    def run(self, count):
+        future, function, args = self.submitted[count - 1]
+        future.set_result(function(*args))
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        pass
+
+
+def wait_until_finished(queue, job_id, timeout=30):
+    deadline = time.monotonic() + timeout
+    while not queue.results(job_id)["finished"]:
+        if time.monotonic() > deadline:
+            raise AssertionError("Job didn't finish")
+        queue.wait(job_id, queue.results(job_id)["version"], 0.1)
+    return queue.results(job_id)
+
+
+class TestJobQueue(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_encrypt_on_process_pool(self):
+        queue = JobQueue(self.directory.name, workers=2, chunk_size=1000)
+        try:
+            job = queue.submit({"kind": "encrypt", "text": TEXT, **CONFIGURATION}, "alice")
+            self.assertEqual(job["total"], -(-len(TEXT.encode()) // 1000))
+            output, cursor = "", 0
+            while True:
+                results = queue.results(job["job_id"], cursor)
+                output, cursor = output + results["output"], results["next"]
+                if results["finished"] and not results["output"]:
+                    break
+                queue.wait(job["job_id"], results["version"], 0.1)
+            self.assertEqual(output, encode_text(machine_from(CONFIGURATION), TEXT))
+            self.assertEqual(queue.status(job["job_id"])["progress"], 1.0)
+        finally:
+            queue.close()
+
+    def test_search_and_resume(self):
+        queue = JobQueue(self.directory.name, workers=1, executor=ManualExecutor())
+        job_id = queue.submit(SEARCH, "alice")["job_id"]
+        for unit in range(1, 4):
+            queue.executor.wait_for(unit)
+            queue.executor.run(unit)
+        queue.close()
+        with open(os.path.join(self.directory.name, f"{job_id}.json")) as state:
+            state = json.load(state)
+        self.assertEqual(state["status"], "running")
+        self.assertEqual(sum(bin(byte).count("1") for byte in bytes.fromhex(state["done"])), 3)
+
+        executor = ThreadPoolExecutor(2)
+        submit = executor.submit = mock.Mock(wraps=executor.submit)
+        queue = JobQueue(self.directory.name, workers=2, executor=executor)
+        try:
+            results = wait_until_finished(queue, job_id)
+            # Only the shards that weren't done before the restart are searched
+            self.assertEqual(submit.call_count, 3)
+            self.assertEqual(results["status"], "done")
+            self.assertEqual(results["results"], [KEY])
+        finally:
+            queue.close()
+
+    def test_fair_queuing(self):
+        executor = ManualExecutor()
+        queue = JobQueue(self.directory.name, workers=1, executor=executor)
+        try:
+            # Submit everything before the scheduler gets the lock
+            with queue.condition:
+                first = queue.submit(SEARCH, "alice")["job_id"]
+                queue.submit(SEARCH, "alice")
+                queue.submit(SEARCH, "bob")
+            owners = []
+            for unit in range(1, 6):
+                future = executor.wait_for(unit)
+                with queue.condition:
+                    owners.append(next(job for job in queue.jobs.values() if future in job.in_flight.values()))
+                executor.run(unit)
+            self.assertEqual([job.client for job in owners], ["alice", "bob", "alice", "bob", "alice"])
+            self.assertTrue(all(job.id == first for job in owners if job.client == "alice"))
+        finally:
+            queue.close()
+
+    def test_cancel_and_errors(self):
+        executor = ManualExecutor()
+        queue = JobQueue(self.directory.name, workers=1, executor=executor)
+        try:
+            job_id = queue.submit(SEARCH, "alice")["job_id"]
+            self.assertEqual(queue.cancel(job_id)["status"], "cancelled")
+            self.assertTrue(queue.results(job_id)["finished"])
+            with self.assertRaises(KeyError):
+                queue.status("missing")
+            with self.assertRaises(ValueError):
+                queue.submit({"kind": "mine"})
+            with self.assertRaises(ValueError):
+                queue.submit({"kind": "encrypt", "text": "A", "rotors": ["IX"]})
+            with self.assertRaises(ValueError):
+                queue.submit({"kind": "search", "ciphertext": "ABC"})
+            self.assertEqual(queue.submit({"kind": "encrypt", "text": ""})["status"], "done")
+            with self.assertRaises(ValueError):
+                queue.submit([])
+        finally:
+            queue.close()
+
+    def test_directory_lock(self):
+        queue = JobQueue(self.directory.name, workers=1, executor=ManualExecutor())
+        try:
+            with self.assertRaises(QueueLocked):
+                JobQueue(self.directory.name, workers=1, executor=ManualExecutor())
+        finally:
+            queue.close()
+        JobQueue(self.directory.name, workers=1, executor=ManualExecutor()).close()
+
+
+class TestJobEndpoints(unittest.TestCase):
+    def test_routes(self):
+        import app as server
+
+        directory = tempfile.TemporaryDirectory()
+        queue = JobQueue(directory.name, workers=1, executor=ThreadPoolExecutor(1), chunk_size=500)
+        try:
+            with mock.patch.object(server, "jobs", queue):
+                client = server.app.test_client()
+                response = client.post("/jobs", json={"kind": "encrypt", "text": TEXT, **CONFIGURATION},
+                                       headers={"X-Client-Id": "alice"})
+                self.assertEqual(response.status_code, 202)
+                job_id = response.get_json()["job_id"]
+
+                lines = client.get(f"/jobs/{job_id}/results?stream=1").get_data(as_text=True).splitlines()
+                events = [json.loads(line) for line in lines]
+                self.assertTrue(events[-1]["finished"])
+                self.assertEqual("".join(event["output"] for event in events),
+                                 encode_text(machine_from(CONFIGURATION), TEXT))
+
+                status = client.get(f"/jobs/{job_id}").get_json()
+                self.assertEqual((status["status"], status["client"]), ("done", "alice"))
+                # Cursors count bytes of the UTF-8 output
+                self.assertEqual(client.get(f"/jobs/{job_id}/results?cursor=10").get_json()["output"],
+                                 encode_text(machine_from(CONFIGURATION), TEXT).encode()[10:].decode())
+                self.assertEqual(client.post(f"/jobs/{job_id}/cancel").get_json()["status"], "done")
+                self.assertEqual(client.get("/jobs/missing").status_code, 404)
+                self.assertEqual(client.post("/jobs", json={"kind": "mine"}).status_code, 400)
+                self.assertEqual(client.post("/jobs", json=[]).status_code, 400)
+
+            # The queue is only opened on the first job request, and only by one process
+            with mock.patch.object(server, "jobs", None), \
+                    mock.patch.dict(os.environ, {"ENIGMA_JOBS_DIR": directory.name}):
+                self.assertEqual(server.app.test_client().get("/jobs/missing").status_code, 503)
+                self.assertIsNone(server.jobs)
+        finally:
+            queue.close()
+            directory.cleanup()
+
+
+if __name__ == '__main__':
+    unittest.main()
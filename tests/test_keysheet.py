@@ -0,0 +1,155 @@
+import os
+import random
+import string
+import tempfile
+import unittest
+
+import numpy as np
+
+from enigma import keysheet
+from enigma.enigma import Enigma
+from enigma.search import KnownPlaintextSearch
+from enigma.vectorized import to_indices
+
+
+def random_key(rng, slots=3):
+    if slots == 4:
+        rotors = [rng.choice(["Beta", "Gamma"])] + rng.sample(["I", "II", "III", "IV", "V"], 3)
+    else:
+        rotors = rng.sample(["I", "II", "III", "IV", "V"], slots)
+    reflector = rng.choice(["A", "B", "C"])
+    letters = rng.sample(string.ascii_uppercase, 2 * rng.randrange(11))
+    return {
+        "rotor_sequence": rotors,
+        "reflector": reflector,
+        "ring_setting": [rng.randint(1, 26) for _ in range(slots)],
+        "initial_positions": "".join(rng.choice(string.ascii_uppercase) for _ in range(slots)),
+        "plug_combinations": [letters[i] + letters[i + 1] for i in range(0, len(letters), 2)] or None,
+    }
+
+
+class TestPacking(unittest.TestCase):
+    def test_roundtrip(self):
+        rng = random.Random(1)
+        keys = [random_key(rng, slots) for slots in (3, 4) for _ in range(50)]
+        records = keysheet.pack_keys(keys)
+        self.assertEqual(keysheet.RECORD.itemsize, 40)
+        for key, record in zip(keys, records):
+            unpacked = keysheet.unpack(record)
+            self.assertEqual(unpacked["rotor_sequence"], key["rotor_sequence"])
+            self.assertEqual(unpacked["reflector"], key["reflector"])
+            self.assertEqual(unpacked["ring_setting"], key["ring_setting"])
+            self.assertEqual(unpacked["initial_positions"], key["initial_positions"])
+            self.assertEqual(sorted(unpacked["plug_combinations"] or []),
+                             sorted("".join(sorted(pair)) for pair in key["plug_combinations"] or []))
+
+    def test_invalid_keys(self):
+        key = random_key(random.Random(2))
+        for invalid in ({"rotor_sequence": ["I", "II", "X"]}, {"reflector": "Z"}, {"ring_setting": [1, 27, 1]},
+                        {"ring_setting": [1, 1]}, {"initial_positions": "A1B"}, {"plug_combinations": ["AB", "BC"]},
+                        {"rotor_sequence": ["I"] * 5, "ring_setting": [1] * 5, "initial_positions": "A" * 5}):
+            with self.subTest(invalid=invalid), self.assertRaises(ValueError):
+                keysheet.pack({**key, **invalid})
+
+
+class TestFile(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "keys.bin")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_save_load(self):
+        rng = random.Random(3)
+        records = keysheet.pack_keys([random_key(rng) for _ in range(20)])
+        keysheet.save(self.path, records)
+        self.assertEqual(os.path.getsize(self.path), keysheet.HEADER.size + 20 * keysheet.RECORD.itemsize)
+        loaded = keysheet.load(self.path)
+        self.assertIsInstance(loaded, np.memmap)
+        self.assertEqual(loaded.tobytes(), records.tobytes())
+
+        keysheet.save(self.path, records[:0])
+        self.assertEqual(len(keysheet.load(self.path)), 0)
+
+    def test_invalid_file(self):
+        with open(self.path, "wb") as sheet:
+            sheet.write(b"not a key sheet at all")
+        with self.assertRaises(ValueError):
+            keysheet.load(self.path)
+
+        keysheet.save(self.path, keysheet.pack_keys([random_key(random.Random(4))]))
+        with open(self.path, "ab") as sheet:
+            sheet.write(b"\0")
+        with self.assertRaises(ValueError):
+            keysheet.load(self.path)
+
+
+class TestKeyTables(unittest.TestCase):
+    def check(self, slots):
+        rng = random.Random(slots)
+        keys = [random_key(rng, slots) for _ in range(40)]
+        messages = ["".join(rng.choice(string.ascii_uppercase) for _ in range(300)) for _ in keys]
+        tables = keysheet.KeyTables(keysheet.pack_keys(keys))
+        self.assertEqual(len(tables), len(keys))
+        encoded = tables.encode(np.array([to_indices(message) for message in messages]))
+        for key, message, row in zip(keys, messages, encoded):
+            self.assertEqual("".join(string.ascii_uppercase[letter] for letter in row.tolist()),
+                             Enigma(**key).encode(message))
+
+    def test_three_rotors(self):
+        self.check(3)
+
+    def test_four_rotors(self):
+        self.check(4)
+
+    def test_mixed_slots(self):
+        rng = random.Random(5)
+        with self.assertRaises(ValueError):
+            keysheet.KeyTables(keysheet.pack_keys([random_key(rng, 3), random_key(rng, 4)]))
+
+
+class TestKeySpace(unittest.TestCase):
+    def setUp(self):
+        self.space = keysheet.KeySpace([("I", "II", "III"), ("III", "II", "I")], ["B", "C"],
+                                       [(1, 1, 1), (2, 3, 4)], ["AB", "CD"])
+
+    def test_numbering(self):
+        self.assertEqual(self.space.setting_count, 8)
+        self.assertEqual(len(self.space), 8 * 26 ** 3)
+        self.assertEqual(self.space.setting(5), (("III", "II", "I"), "B", (2, 3, 4)))
+        key = self.space.key(5 * 26 ** 3 + 26 ** 2 + 2 * 26 + 3)
+        self.assertEqual(key, {"rotor_sequence": ["III", "II", "I"], "reflector": "B", "ring_setting": [2, 3, 4],
+                               "initial_positions": "BCD", "plug_combinations": ["AB", "CD"]})
+
+        records = self.space.records(100, 110)
+        self.assertEqual([keysheet.unpack(record) for record in records],
+                         [self.space.key(index) for index in range(100, 110)])
+
+    def test_shards(self):
+        shards = self.space.shards(7)
+        self.assertEqual(shards[0][0], 0)
+        self.assertEqual(shards[-1][1], self.space.size)
+        self.assertTrue(all(stop == start for (_, stop), (start, _) in zip(shards, shards[1:])))
+        self.assertLessEqual(max(stop - start for start, stop in shards) - min(stop - start for start, stop in shards),
+                             1)
+
+    def test_invalid(self):
+        for index in (-1, 8):
+            with self.assertRaises(ValueError):
+                self.space.setting(index)
+        with self.assertRaises(ValueError):
+            self.space.records(0, self.space.size + 1)
+
+    def test_search_shards(self):
+        search = KnownPlaintextSearch("ABCDEFGHIJ", "QWERTYUIOP", rotors=("I", "II", "III"), reflectors=["B"],
+                                      ring_settings=[(1, 1, 1), (1, 2, 3)])
+        self.assertEqual(search.shard_count, 12)
+        self.assertEqual(search.key_count, 12 * 26 ** 3)
+        self.assertEqual(search.shard(3), (("I", "III", "II"), "B", (1, 2, 3)))
+        with self.assertRaises(ValueError):
+            search.shard(12)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,121 @@
+import asyncio
+import unittest
+
+from enigma import metrics, vectorized
+from enigma.enigma import Enigma
+from enigma.parallel import parallel_encode
+from enigma.service import encode_keys
+
+
+def machine():
+    return Enigma(["I", "II", "III"], "B", [1, 1, 1], "AAZ")
+
+
+class MetricsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.was_enabled = metrics.enabled
+        metrics.reset()
+        metrics.enable()
+
+    def tearDown(self):
+        metrics.reset()
+        if not self.was_enabled:
+            metrics.disable()
+
+    def counter(self, name, labels=()):
+        return metrics._counters.get((name, labels), 0)
+
+
+class TestMetrics(MetricsTestCase):
+    def test_disabled_records_nothing(self):
+        metrics.disable()
+        machine().encode("HELLOWORLD")
+        self.assertEqual(metrics.render(), metrics.render())
+        self.assertEqual(self.counter("enigma_characters_total"), 0)
+
+    def test_steps_and_turnovers(self):
+        message = "A" * 700
+        machine().encode(message)
+        middle = self.counter("enigma_turnovers_total", (("rotor", "1"),))
+        left = self.counter("enigma_turnovers_total", (("rotor", "2"),))
+        self.assertEqual(self.counter("enigma_characters_total"), 700)
+        self.assertEqual(self.counter("enigma_steps_total"), 700)
+        # III turns over at V->W; from Z the first carry comes after 23 key presses, then every 26
+        self.assertEqual(middle, 27)
+        self.assertEqual(left, 1)
+
+        for encode in (vectorized.encode, lambda machine, message: parallel_encode(machine, message, 2, 100),
+                       encode_keys):
+            metrics.reset()
+            encode(machine(), message)
+            self.assertEqual(self.counter("enigma_characters_total"), 700)
+            self.assertEqual(self.counter("enigma_turnovers_total", (("rotor", "1"),)), middle)
+            self.assertEqual(self.counter("enigma_turnovers_total", (("rotor", "2"),)), left)
+
+    def test_batch_turnovers(self):
+        messages, keys = ["A" * 700, "A" * 30, "A"], ["AAZ", "AAA", "ZZZ"]
+        vectorized.encode_batch(machine(), messages, keys)
+        batch = dict(metrics._counters)
+
+        metrics.reset()
+        for message, key in zip(messages, keys):
+            Enigma(["I", "II", "III"], "B", [1, 1, 1], key).encode(message)
+        self.assertEqual(metrics._counters, batch)
+        self.assertEqual(self.counter("enigma_characters_total"), 731)
+
+    def test_render(self):
+        machine().encode("HELLO")
+        metrics.register_gauge("enigma_test_gauge", "Test gauge.", lambda: 3)
+        try:
+            text = metrics.render()
+        finally:
+            del metrics._gauges["enigma_test_gauge"]
+        self.assertIn("enigma_characters_total 5\n", text)
+        self.assertIn('enigma_phase_seconds_count{phase="construct"} 1\n', text)
+        self.assertIn('enigma_phase_seconds_bucket{phase="encode",le="+Inf"} 1\n', text)
+        self.assertIn("# TYPE enigma_test_gauge gauge\nenigma_test_gauge 3\n", text)
+
+    def test_profile(self):
+        result, report = metrics.profile(machine().encode, "HELLO")
+        self.assertEqual(result, machine().encode("HELLO"))
+        self.assertIn("encode_character", report)
+
+
+class TestMetricsEndpoints(MetricsTestCase):
+    CONFIGURATION = {"rotors": ["I", "II", "III"], "reflector": "B", "rings": [1, 1, 1], "positions": "AAZ"}
+
+    def test_flask(self):
+        from app import app
+
+        client = app.test_client()
+        session_id = client.post("/init", json=self.CONFIGURATION).get_json()["session_id"]
+        response = client.post("/encode", json={"session_id": session_id, "text": "HELLO"},
+                               headers={"X-Enigma-Profile": "1"}).get_json()
+        self.assertIn("profile", response)
+        self.assertNotIn("profile", client.post("/encode", json={"session_id": session_id, "text": "A"}).get_json())
+
+        text = client.get("/metrics").get_data(as_text=True)
+        self.assertIn("enigma_characters_total 6\n", text)
+        self.assertIn('enigma_phase_seconds_count{phase="request"} 3\n', text)
+        self.assertIn("enigma_sessions ", text)
+
+    def test_asgi(self):
+        from asgi import create_app
+
+        async def scenario():
+            app = create_app()
+            sent = []
+
+            async def receive():
+                return {"type": "http.request", "body": b"", "more_body": False}
+
+            async def send(message):
+                sent.append(message)
+
+            await app({"type": "http", "method": "GET", "path": "/metrics", "query_string": b""}, receive, send)
+            await app.batcher.close()
+            return sent
+
+        sent = asyncio.run(scenario())
+        self.assertEqual(sent[0]["status"], 200)
+        self.assertIn(b"enigma_sessions 0", sent[1]["body"])
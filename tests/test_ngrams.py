@@ -0,0 +1,65 @@
+import os
+import pickle
+import tempfile
+import unittest
+
+import numpy as np
+
+from enigma import ngrams
+from enigma.ngrams import NgramScorer
+from enigma.vectorized import to_indices
+
+CORPUS = ("Wetterbericht fuer heute: klar, spaeter leichter Regen. Keine besonderen Vorkommnisse. "
+          "Grüße an die Flotte; the quick brown fox jumps over the lazy dog.\n") * 20
+
+
+class TestNgramStore(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.corpus = os.path.join(self.directory.name, "corpus.txt")
+        self.table = os.path.join(self.directory.name, "quadgrams.bin")
+        with open(self.corpus, "w", encoding="utf-8") as corpus:
+            corpus.write(CORPUS)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_count_across_chunks(self):
+        whole = ngrams.count_ngrams([CORPUS], 4)
+        data = CORPUS.encode()
+        chunked = ngrams.count_ngrams([data[index:index + 7] for index in range(0, len(data), 7)], 4)
+        np.testing.assert_array_equal(whole, chunked)
+        letters = "".join(character for character in CORPUS if character.isascii() and character.isalpha())
+        self.assertEqual(whole.sum(), len(letters) - 3)
+
+    def test_compile_and_load(self):
+        ngrams.main([self.corpus, "--output", self.table])
+        self.assertEqual(os.path.getsize(self.table), ngrams.HEADER.size + 4 * 26 ** 4)
+
+        scorer = NgramScorer.load(self.table)
+        self.assertIsInstance(scorer.log_probabilities, np.memmap)
+        expected = NgramScorer.from_corpus(CORPUS, n=4)
+        np.testing.assert_array_equal(scorer.log_probabilities, expected.log_probabilities)
+
+        letters = to_indices("WETTERBERICHTFUERHEUTE")
+        self.assertEqual(scorer.score(letters), expected.score(letters))
+        self.assertGreater(scorer.score(letters), scorer.score(letters[::-1]))
+
+        copy = pickle.loads(pickle.dumps(scorer))
+        self.assertIsInstance(copy.log_probabilities, np.memmap)
+        self.assertEqual(copy.path, self.table)
+
+    def test_invalid_file(self):
+        with open(self.table, "wb") as table:
+            table.write(b"quadgrams")
+        with self.assertRaises(ValueError):
+            NgramScorer.load(self.table)
+        NgramScorer.from_corpus(CORPUS, n=2).save(self.table)
+        with open(self.table, "r+b") as table:
+            table.truncate(100)
+        with self.assertRaises(ValueError):
+            NgramScorer.load(self.table)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,35 @@
+import random
+import string
+import unittest
+
+from enigma.enigma import Enigma
+from enigma.parallel import parallel_encode
+
+CONFIGURATION = dict(rotor_sequence=["IV", "V", "Beta", "I"], reflector="A", ring_setting=[18, 24, 3, 5],
+                     initial_positions="EZGP",
+                     plug_combinations=["PC", "XZ", "FM", "QA", "ST", "NB", "HY", "OR", "EV", "IU"])
+
+
+class TestParallelEncode(unittest.TestCase):
+    def test_matches_sequential_encode(self):
+        rng = random.Random(6)
+        message = "".join(rng.choice(string.ascii_uppercase) for _ in range(30000))
+        sequential = Enigma(**CONFIGURATION)
+        expected = sequential.encode(message)
+
+        machine = Enigma(**CONFIGURATION)
+        self.assertEqual(parallel_encode(machine, message, workers=2, chunk_size=4097), expected)
+        self.assertEqual(machine.rotor_positions, sequential.rotor_positions)
+        self.assertEqual(machine.offset, len(message))
+
+    def test_small_message_in_process(self):
+        machine = Enigma(**CONFIGURATION)
+        self.assertEqual(parallel_encode(machine, "hello", workers=4), Enigma(**CONFIGURATION).encode("HELLO"))
+
+    def test_invalid_input(self):
+        with self.assertRaises(ValueError):
+            parallel_encode(Enigma(**CONFIGURATION), "HELLO WORLD", workers=2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import threading
+import unittest
+
+from enigma.enigma import Enigma
+from enigma.search import KnownPlaintextSearch
+
+KEY = dict(rotor_sequence=["II", "V", "III"], reflector="B", ring_setting=[1, 7, 20], initial_positions="KDQ",
+           plug_combinations=["HL", "MO", "AJ"])
+PLAINTEXT = "WETTERVORHERSAGEFUERDIEREGIONHEUTEKLAR"
+CRIB = "WETTERVORHERSAGE"
+
+
+class TestKnownPlaintextSearch(unittest.TestCase):
+    def setUp(self):
+        self.ciphertext = Enigma(**KEY).encode(PLAINTEXT)
+        self.search = KnownPlaintextSearch(self.ciphertext, CRIB, rotor_orders=[("I", "II", "III"), ("II", "V", "III")],
+                                           reflectors=["B", "C"], ring_settings=[(1, 7, 20), (1, 1, 1)],
+                                           plug_combinations=KEY["plug_combinations"])
+
+    def assert_finds_key(self, results):
+        keys = [key for _, shard_keys in results for key in shard_keys]
+        self.assertIn(KEY, keys)
+        for key in keys:
+            self.assertEqual(Enigma(**key).decode(self.ciphertext)[:len(CRIB)], CRIB)
+
+    def test_shards(self):
+        self.assertEqual(self.search.shard_count, 8)
+        self.assertEqual(self.search.shard(7), (("II", "V", "III"), "C", (1, 1, 1)))
+        with self.assertRaises(ValueError):
+            self.search.shard(8)
+
+    def test_in_process(self):
+        progress = []
+        results = list(self.search.run(workers=1, progress=lambda done, total: progress.append((done, total))))
+        self.assertEqual(sorted(shard for shard, _ in results), list(range(8)))
+        self.assertEqual(progress[-1], (8, 8))
+        self.assert_finds_key(results)
+
+    def test_process_pool_and_resume(self):
+        first = list(self.search.run(shards=range(0, 4), workers=2))
+        rest = list(self.search.run(shards=range(4, 8), workers=2))
+        self.assertEqual(sorted(shard for shard, _ in first + rest), list(range(8)))
+        self.assert_finds_key(first + rest)
+
+    def test_crib_at_offset(self):
+        search = KnownPlaintextSearch(self.ciphertext, "HEUTEKLAR", crib_offset=len(PLAINTEXT) - 9,
+                                      rotor_orders=[("II", "V", "III")], reflectors=["B"],
+                                      ring_settings=[(1, 7, 20)], plug_combinations=KEY["plug_combinations"])
+        self.assertIn(KEY, search.search_shard(0))
+
+    def test_cancel(self):
+        cancel = threading.Event()
+        cancel.set()
+        self.assertEqual(list(self.search.run(workers=1, cancel=cancel)), [])
+
+    def test_default_ring_settings_fix_leftmost_ring(self):
+        search = KnownPlaintextSearch(self.ciphertext, CRIB, rotors=["I", "II", "III"], reflectors=["B"])
+        self.assertEqual(search.shard_count, 6 * 26 * 26)
+        self.assertTrue(all(rings[0] == 1 for rings in search.ring_settings))
+
+    def test_invalid_crib(self):
+        with self.assertRaises(ValueError):
+            KnownPlaintextSearch(self.ciphertext, CRIB, crib_offset=len(PLAINTEXT))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import threading
+import unittest
+
+from enigma.enigma import Enigma
+from enigma.sessions import SessionRegistry
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def machine():
+    return Enigma(rotor_sequence=["I", "II", "III"], reflector="B", initial_positions="AAZ")
+
+
+class TestSessionRegistry(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.registry = SessionRegistry(max_sessions=2, ttl=10, clock=self.clock)
+
+    def test_sessions_are_isolated(self):
+        first = self.registry.create(machine())
+        second = self.registry.create(machine())
+        with self.registry.use(first) as enigma:
+            self.assertEqual(enigma.encode("A"), "U")
+        with self.registry.use(first) as enigma:
+            self.assertEqual(enigma.offset, 1)
+        with self.registry.use(second) as enigma:
+            self.assertEqual(enigma.encode("A"), "U")
+
+    def test_lru_eviction(self):
+        first = self.registry.create(machine())
+        second = self.registry.create(machine())
+        with self.registry.use(first):
+            pass
+        self.registry.create(machine())
+        with self.assertRaises(KeyError):
+            with self.registry.use(second):
+                pass
+        stats = self.registry.stats()
+        self.assertEqual(stats["sessions"], 2)
+        self.assertEqual(stats["evicted_lru"], 1)
+        self.assertEqual(stats["misses"], 1)
+
+    def test_ttl_expiry(self):
+        first = self.registry.create(machine())
+        self.clock.now = 5
+        second = self.registry.create(machine())
+        self.clock.now = 12
+        with self.registry.use(second):
+            pass
+        with self.assertRaises(KeyError):
+            with self.registry.use(first):
+                pass
+        self.assertEqual(self.registry.stats()["evicted_ttl"], 1)
+
+    def test_remove(self):
+        session_id = self.registry.create(machine())
+        self.assertTrue(self.registry.remove(session_id))
+        self.assertFalse(self.registry.remove(session_id))
+        self.assertEqual(len(self.registry), 0)
+
+    def test_concurrent_use(self):
+        registry = SessionRegistry()
+        session_id = registry.create(machine())
+
+        def encode():
+            for _ in range(200):
+                with registry.use(session_id) as enigma:
+                    enigma.encode_character("A")
+
+        threads = [threading.Thread(target=encode) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        with registry.use(session_id) as enigma:
+            self.assertEqual(enigma.offset, 800)
+            self.assertEqual(enigma.rotor_positions, enigma.state_at(799))
+
+
+if __name__ == '__main__':
+    unittest.main()
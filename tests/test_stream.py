@@ -0,0 +1,130 @@
+import io
+import os
+import string
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from enigma.enigma import Enigma
+from enigma.stream import encode_file, encode_into, encode_stream
+
+CONFIGURATION = dict(rotor_sequence=["IV", "V", "Beta", "I"], reflector="A", ring_setting=[18, 24, 3, 5],
+                     initial_positions="EZGP",
+                     plug_combinations=["PC", "XZ", "FM", "QA", "ST", "NB", "HY", "OR", "EV", "IU"])
+PLAINTEXT = "Congratulations on producing your working Enigma machine simulator! Grüße, 1945.\n" * 40
+
+
+def expected_letters():
+    letters = "".join(character.upper() for character in PLAINTEXT if character in string.ascii_letters)
+    return Enigma(**CONFIGURATION).encode(letters)
+
+
+class TestEncodeStream(unittest.TestCase):
+    def test_skip_non_letters(self):
+        writer = io.BytesIO()
+        count = encode_stream(Enigma(**CONFIGURATION), io.BytesIO(PLAINTEXT.encode("utf-8")), writer,
+                              chunk_size=7, non_letters="skip")
+        self.assertEqual(writer.getvalue().decode("ascii"), expected_letters())
+        self.assertEqual(count, len(expected_letters()))
+
+    def test_passthrough_text_stream(self):
+        writer = io.StringIO()
+        encode_stream(Enigma(**CONFIGURATION), io.StringIO(PLAINTEXT), writer, chunk_size=13)
+        output = writer.getvalue()
+        self.assertEqual(len(output), len(PLAINTEXT))
+        self.assertEqual(output.count("ü"), PLAINTEXT.count("ü"))
+        self.assertEqual("".join(character for character in output if "A" <= character <= "Z"), expected_letters())
+
+    def test_bytes_reader_text_writer(self):
+        # Chunks of 2 bytes split every "é" (2 bytes in UTF-8) of "aéb" in turn
+        plaintext = "aéb" * 3
+        writer = io.StringIO()
+        encode_stream(Enigma(**CONFIGURATION), io.BytesIO(plaintext.encode("utf-8")), writer, chunk_size=2)
+        letters = Enigma(**CONFIGURATION).encode("AB" * 3)
+        self.assertEqual(writer.getvalue(), "".join(f"{letters[i]}é{letters[i + 1]}" for i in range(0, 6, 2)))
+
+    def test_round_trip(self):
+        ciphertext = io.BytesIO()
+        encode_stream(Enigma(**CONFIGURATION), io.BytesIO(PLAINTEXT.encode("utf-8")), ciphertext, chunk_size=64)
+        plaintext = io.BytesIO()
+        encode_stream(Enigma(**CONFIGURATION), io.BytesIO(ciphertext.getvalue()), plaintext, chunk_size=100)
+        self.assertEqual(plaintext.getvalue().decode("utf-8"),
+                         PLAINTEXT.translate(str.maketrans(string.ascii_lowercase, string.ascii_uppercase)))
+
+    def test_invalid_policy(self):
+        with self.assertRaises(ValueError):
+            encode_stream(Enigma(**CONFIGURATION), io.BytesIO(b""), io.BytesIO(), non_letters="drop")
+
+
+class TestEncodeInto(unittest.TestCase):
+    def test_buffer_types(self):
+        source = PLAINTEXT.encode("utf-8")
+        expected = io.BytesIO()
+        encode_stream(Enigma(**CONFIGURATION), io.BytesIO(source), expected)
+        for src in (source, bytearray(source), memoryview(source)):
+            with self.subTest(src=type(src)):
+                dst = bytearray(len(source) + 10)
+                machine = Enigma(**CONFIGURATION)
+                self.assertEqual(encode_into(machine, src, dst), len(source))
+                self.assertEqual(bytes(dst[:len(source)]), expected.getvalue())
+                self.assertEqual(machine.offset, len(expected_letters()))
+
+    def test_skip_and_case(self):
+        source = b"Hello, World"
+        dst = memoryview(bytearray(10))
+        self.assertEqual(encode_into(Enigma(**CONFIGURATION), source, dst, non_letters="skip"), 10)
+        upper = bytes(dst)
+        self.assertEqual(upper.decode(), Enigma(**CONFIGURATION).encode("HELLOWORLD"))
+        encode_into(Enigma(**CONFIGURATION), source, dst, case="lower", non_letters="skip")
+        self.assertEqual(bytes(dst), upper.lower())
+        encode_into(Enigma(**CONFIGURATION), source, dst, case="preserve", non_letters="skip")
+        self.assertEqual(bytes(dst), upper[:1] + upper[1:5].lower() + upper[5:6] + upper[6:].lower())
+
+    def test_errors(self):
+        machine = Enigma(**CONFIGURATION)
+        with self.assertRaises(ValueError):
+            encode_into(machine, b"HELLO WORLD", bytearray(11), non_letters="error")
+        self.assertEqual(machine.offset, 0)
+        with self.assertRaises(ValueError):
+            encode_into(machine, b"HELLO", bytearray(4))
+        with self.assertRaises(ValueError):
+            encode_into(machine, b"HELLO", bytearray(5), case="title")
+        with self.assertRaises(TypeError):
+            encode_into(machine, b"HELLO", bytes(5))
+        self.assertEqual(encode_into(machine, b"HELLO", bytearray(5), non_letters="error"), 5)
+
+
+class TestEncodeFile(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "plaintext.txt")
+        with open(self.path, "wb") as plaintext:
+            plaintext.write(PLAINTEXT.encode("utf-8"))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_memory_mapped_file(self):
+        writer = io.BytesIO()
+        encode_file(Enigma(**CONFIGURATION), self.path, writer, chunk_size=50, non_letters="skip")
+        self.assertEqual(writer.getvalue().decode("ascii"), expected_letters())
+
+    def test_empty_file(self):
+        empty = os.path.join(self.directory.name, "empty.txt")
+        open(empty, "wb").close()
+        writer = io.BytesIO()
+        self.assertEqual(encode_file(Enigma(**CONFIGURATION), empty, writer), 0)
+        self.assertEqual(writer.getvalue(), b"")
+
+    def test_command_line(self):
+        output = os.path.join(self.directory.name, "ciphertext.txt")
+        subprocess.run([sys.executable, "-m", "enigma", "--rotors", "IV", "V", "Beta", "I", "--reflector", "A",
+                        "--rings", "18", "24", "3", "5", "--positions", "EZGP", "--plugs", "PC", "XZ", "FM", "QA",
+                        "ST", "NB", "HY", "OR", "EV", "IU", "--skip-non-letters", self.path, output], check=True)
+        with open(output) as ciphertext:
+            self.assertEqual(ciphertext.read(), expected_letters())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import random
+import string
+import unittest
+
+from enigma.enigma import Enigma
+from enigma import vectorized
+
+CONFIGURATIONS = [
+    dict(rotor_sequence=["I", "II", "III"], reflector="B", ring_setting=[1, 1, 1], initial_positions="AAZ",
+         plug_combinations=["HL", "MO", "AJ", "CX", "BZ", "SR", "NI", "YW", "DG", "PK"]),
+    dict(rotor_sequence=["IV", "V", "Beta"], reflector="B", ring_setting=[14, 9, 24], initial_positions="AAA"),
+    dict(rotor_sequence=["IV", "V", "Beta", "I"], reflector="A", ring_setting=[18, 24, 3, 5],
+         initial_positions="EZGP", plug_combinations=["PC", "XZ", "FM", "QA", "ST", "NB", "HY", "OR", "EV", "IU"]),
+    dict(rotor_sequence=["Gamma", "II", "IV", "I"], reflector="C", ring_setting=[3, 1, 26, 7],
+         initial_positions="MQDP"),
+]
+
+
+class TestVectorizedEncode(unittest.TestCase):
+    def setUp(self):
+        rng = random.Random(3)
+        self.message = "".join(rng.choice(string.ascii_letters) for _ in range(20000))
+
+    def test_matches_encode_character(self):
+        for configuration in CONFIGURATIONS:
+            with self.subTest(configuration=configuration):
+                expected = Enigma(**configuration).encode(self.message)
+                machine = Enigma(**configuration)
+                self.assertEqual(vectorized.encode(machine, self.message), expected)
+                self.assertEqual(machine.offset, len(self.message))
+
+    def test_continues_from_current_state(self):
+        configuration = CONFIGURATIONS[2]
+        expected = Enigma(**configuration).encode(self.message[:3000])
+        machine = Enigma(**configuration)
+        tables = vectorized.MachineTables(machine)
+        head = machine.encode(self.message[:1000])
+        tail = vectorized.encode(machine, self.message[1000:3000], tables)
+        self.assertEqual(head + tail, expected)
+        self.assertEqual(machine.rotor_positions, machine.state_at(2999))
+
+    def test_invalid_input(self):
+        machine = Enigma(**CONFIGURATIONS[0])
+        with self.assertRaises(ValueError):
+            vectorized.encode(machine, "HELLO WORLD")
+        with self.assertRaises(ValueError):
+            vectorized.encode(machine, "STRAßE")
+
+
+class TestEncodeBatch(unittest.TestCase):
+    def test_matches_per_message_encode(self):
+        rng = random.Random(5)
+        for configuration in CONFIGURATIONS:
+            width = len(configuration["rotor_sequence"])
+            messages = ["".join(rng.choice(string.ascii_letters) for _ in range(rng.randint(0, 700)))
+                        for _ in range(50)]
+            keys = ["".join(rng.choice(string.ascii_uppercase) for _ in range(width)) for _ in messages]
+            with self.subTest(configuration=configuration):
+                machine = Enigma(**configuration)
+                expected = [Enigma(**{**configuration, "initial_positions": key}).encode(message)
+                            for message, key in zip(messages, keys)]
+                self.assertEqual(vectorized.encode_batch(machine, messages, keys), expected)
+                self.assertEqual(machine.offset, 0)
+
+    def test_invalid_input(self):
+        machine = Enigma(**CONFIGURATIONS[0])
+        self.assertEqual(vectorized.encode_batch(machine, [], []), [])
+        with self.assertRaises(ValueError):
+            vectorized.encode_batch(machine, ["HELLO"], [])
+        with self.assertRaises(ValueError):
+            vectorized.encode_batch(machine, ["HELLO"], ["AAAA"])
+        with self.assertRaises(ValueError):
+            vectorized.encode_batch(machine, ["HELLO WORLD"], ["AAA"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,7 @@
+import random
+import string
 import unittest
-from enigma.enigma import Enigma, rotor_from_name, Plugboard, PlugLead
+from enigma.enigma import Enigma, rotor_from_name, Plugboard, PlugLead, mappings, translation_table
 
 ENIGMA_TEST_CASES = [
     {
@@ -136,6 +138,153 @@ class TestEnigma(unittest.TestCase):
         self.assertNotEqual(result[1], result[2])
 
 
+class TestCompiledRotor(unittest.TestCase):
+    @staticmethod
+    def reference_right_to_left(rotor, character):
+        pin_pos = (string.ascii_uppercase.index(character) + rotor.position - (rotor.ring_setting - 1)) % 26
+        contact_pos = string.ascii_uppercase.index(rotor.mapping[pin_pos])
+        return string.ascii_uppercase[(contact_pos + (rotor.ring_setting - 1) - rotor.position) % 26]
+
+    @staticmethod
+    def reference_left_to_right(rotor, character):
+        contact_pos = (string.ascii_uppercase.index(character) + rotor.position - (rotor.ring_setting - 1)) % 26
+        pin_pos = rotor.mapping.index(string.ascii_uppercase[contact_pos])
+        return string.ascii_uppercase[(pin_pos + (rotor.ring_setting - 1) - rotor.position) % 26]
+
+    def test_tables_match_string_wiring(self):
+        for name in mappings:
+            for ring_setting in (1, 2, 14, 26):
+                rotor = rotor_from_name(name, ring_setting=ring_setting)
+                for position in range(26):
+                    rotor.position = position
+                    for character in string.ascii_uppercase:
+                        self.assertEqual(rotor.encode_right_to_left(character),
+                                         self.reference_right_to_left(rotor, character))
+                        self.assertEqual(rotor.encode_left_to_right(character),
+                                         self.reference_left_to_right(rotor, character))
+
+    def test_known_messages(self):
+        machine = Enigma(rotor_sequence=["I", "II", "III"], reflector="B", ring_setting=[1, 1, 1],
+                         initial_positions="AAZ",
+                         plug_combinations=["HL", "MO", "AJ", "CX", "BZ", "SR", "NI", "YW", "DG", "PK"])
+        self.assertEqual(machine.encode("HELLOWORLD"), "RFKTMBXVVW")
+
+        machine = Enigma(rotor_sequence=["IV", "V", "Beta", "I"], reflector="A", ring_setting=[18, 24, 3, 5],
+                         initial_positions="EZGP",
+                         plug_combinations=["PC", "XZ", "FM", "QA", "ST", "NB", "HY", "OR", "EV", "IU"])
+        self.assertEqual(machine.decode("BUPXWJCDPFASXBDHLBBIBSRNWCSZXQOLBNXYAXVHOGCUUIBCVMPUZYUUKHI"),
+                         "CONGRATULATIONSONPRODUCINGYOURWORKINGENIGMAMACHINESIMULATOR")
+
+
+class TestPlugboardPermutation(unittest.TestCase):
+    def test_permutation(self):
+        plugboard = Plugboard(["SZ", "GT", "dv"])
+        self.assertEqual(plugboard.encode("Z"), "S")
+        self.assertEqual(plugboard.encode("D"), "V")
+        self.assertEqual(plugboard.encode("A"), "A")
+        self.assertEqual(plugboard.encode_index(6), 19)
+        self.assertEqual(sorted(plugboard.permutation), list(range(26)))
+        self.assertTrue(all(plugboard.permutation[plugboard.permutation[x]] == x for x in range(26)))
+
+    def test_keeps_only_the_permutation(self):
+        leads = ["AB", "CD", "EF", "GH", "IJ", "KL", "MN", "OP", "QR", "ST"]
+        first, second = Plugboard(leads), Plugboard(reversed(leads))
+        self.assertEqual(Plugboard.__slots__, ("permutation",))
+        self.assertIs(type(first.permutation), bytes)
+        self.assertEqual(len(first.plugs), 10)
+        self.assertEqual(first.plugs[0].map_dict, {"A": "B", "B": "A"})
+        self.assertEqual(first.encode("ABCXYZ"), "BADXYZ")
+        self.assertIs(translation_table(first.permutation), translation_table(second.permutation))
+
+    def test_rejects_reused_letter(self):
+        plugboard = Plugboard(["SZ"])
+        with self.assertRaises(ValueError):
+            plugboard.add(PlugLead("AS"))
+        self.assertEqual(plugboard.encode("A"), "A")
+        self.assertEqual(len(plugboard.plugs), 1)
+
+    def test_rejects_malformed_leads(self):
+        for mapping in ("A", "ABC", "AA", "A1", "A B"):
+            with self.assertRaises(ValueError):
+                PlugLead(mapping)
+
+
+class TestSeek(unittest.TestCase):
+    CONFIGURATIONS = [
+        (["I", "II", "III"], [1, 1, 1], "ADU"),
+        (["III", "II", "I"], [15, 23, 4], "QEV"),
+        (["IV", "V", "Beta"], [14, 9, 24], "AAA"),
+        (["I", "Gamma", "V"], [1, 1, 1], "ZZZ"),
+        (["IV", "V", "Beta", "I"], [18, 24, 3, 5], "EZGP"),
+        (["Beta", "I", "II", "III"], [1, 2, 3, 4], "AQEV"),
+    ]
+
+    def test_state_at_matches_rotate(self):
+        for rotors, rings, positions in self.CONFIGURATIONS:
+            with self.subTest(rotors=rotors, positions=positions):
+                machine = Enigma(rotor_sequence=rotors, reflector="B", ring_setting=rings,
+                                 initial_positions=positions)
+                for offset in range(26 * 26 * 2):
+                    machine.rotate()
+                    self.assertEqual(machine.state_at(offset), machine.rotor_positions)
+
+    def test_seek_forwards_and_backwards(self):
+        rng = random.Random(2)
+        message = "".join(rng.choice(string.ascii_uppercase) for _ in range(800))
+        for rotors, rings, positions in self.CONFIGURATIONS:
+            with self.subTest(rotors=rotors, positions=positions):
+                machine = Enigma(rotor_sequence=rotors, reflector="C", ring_setting=rings,
+                                 initial_positions=positions)
+                encoded = machine.encode(message)
+                self.assertEqual(machine.offset, len(message))
+                for offset in (700, 3, 0, 412):
+                    machine.seek(offset)
+                    self.assertEqual(machine.encode(message[offset:offset + 50]), encoded[offset:offset + 50])
+
+    def test_negative_offset(self):
+        machine = Enigma(rotor_sequence=["I", "II", "III"], reflector="B")
+        with self.assertRaises(ValueError):
+            machine.seek(-1)
+
+
+class TestSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.machine = Enigma(rotor_sequence=["IV", "V", "Beta", "I"], reflector="A", ring_setting=[18, 24, 3, 5],
+                              initial_positions="EZGP",
+                              plug_combinations=["PC", "XZ", "FM", "QA", "ST", "NB", "HY", "OR", "EV", "IU"])
+
+    def test_reset_after_encoding(self):
+        first = self.machine.encode("THEQUICKBROWNFOX" * 50)
+        self.machine.reset()
+        self.assertEqual(self.machine.rotor_positions, self.machine.start_positions)
+        self.assertEqual(self.machine.offset, 0)
+        self.assertEqual(self.machine.encode("THEQUICKBROWNFOX" * 50), first)
+
+    def test_snapshot_and_restore(self):
+        self.machine.encode("HELLO" * 100)
+        state = self.machine.snapshot()
+        rest = self.machine.encode("WORLD" * 100)
+        self.machine.restore(state)
+        self.assertEqual(self.machine.offset, 500)
+        self.assertEqual(self.machine.encode("WORLD" * 100), rest)
+
+    def test_checkpoint(self):
+        self.machine.encode("HELLO" * 1000)
+        checkpoint = self.machine.checkpoint()
+        self.assertLessEqual(len(checkpoint), 8)
+        restored = Enigma(rotor_sequence=["IV", "V", "Beta", "I"], reflector="A", ring_setting=[18, 24, 3, 5],
+                          initial_positions="EZGP",
+                          plug_combinations=["PC", "XZ", "FM", "QA", "ST", "NB", "HY", "OR", "EV", "IU"])
+        restored.restore_checkpoint(checkpoint)
+        self.assertEqual(restored.rotor_positions, self.machine.rotor_positions)
+        self.assertEqual(restored.encode("WORLD"), self.machine.encode("WORLD"))
+
+    def test_slots(self):
+        with self.assertRaises(AttributeError):
+            self.machine.unknown = 1
+        self.assertIs(self.machine.rotors[0].forward, rotor_from_name("I", ring_setting=5).forward)
+
+
 def test_specific_enigma_configurations(self):
     """Test specific historical or known Enigma configurations"""
     for test_case in ENIGMA_TEST_CASES: